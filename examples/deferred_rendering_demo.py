@@ -11,29 +11,85 @@ stars.position.xyz = 0, 0, -2
 stars.scale.xyz = 1.2
 
 monkey = reader.get_mesh('Monkey', position=(0, 0.1, -2))
-monkey.uniforms['flat_shading'] = True
-monkey.uniforms['diffuse'] = 1., 1., 1.
-monkey.uniforms['spec_weight'] = 0.
+monkey.uniforms['diffuse'] = 1., .8, .6
+
+# The scene is drawn once per frame into the G-buffer; each pass below only reads its textures.
+gbuffer = rc.GBuffer(width=win.width, height=win.height)
+quad = rc.gen_fullscreen_quad()
+quad.uniforms['lamp_position'] = 2., 2., 0.
+
+quad_vert = """
+ #version 330
+ layout(location = 0) in vec3 vertexPosition;
+ layout(location = 2) in vec2 uvTexturePosition;
+ out vec2 texCoord;
+
+ void main()
+ {
+     gl_Position = vec4(vertexPosition.xy, 0., 1.);
+     texCoord = uvTexturePosition;
+ }
+ """
+
+lighting_frag = """
+ #version 330
+ uniform sampler2D PositionMap, NormalMap, AlbedoMap;
+ uniform vec3 lamp_position;
+ in vec2 texCoord;
+ out vec4 final_color;
+
+ void main()
+ {
+     vec4 albedo = texture(AlbedoMap, texCoord);
+     vec3 position = texture(PositionMap, texCoord).xyz;
+     vec3 normal = texture(NormalMap, texCoord).xyz;
+     float lambert = max(dot(normal, normalize(lamp_position - position)), 0.);
+     final_color = vec4(albedo.rgb * (.2 + .8 * lambert), 1.);
+ }
+ """
+
+normals_frag = """
+ #version 330
+ uniform sampler2D NormalMap;
+ in vec2 texCoord;
+ out vec4 final_color;
+
+ void main()
+ {
+     final_color = vec4(texture(NormalMap, texCoord).xyz * .5 + .5, 1.);
+ }
+ """
+
+lighting_shader = rc.Shader(vert=quad_vert, frag=lighting_frag)
+normals_shader = rc.Shader(vert=quad_vert, frag=normals_frag)
+show_normals = False
 
-fbo = rc.FBO(texture=rc.Texture(width=win.width, height=win.height))
 
 def update(dt):
     stars.rotation.z += 10. * dt
+    monkey.rotation.y += 20. * dt
 pyglet.clock.schedule(update)
 
 
+@win.event
+def on_key_press(symbol, modifiers):
+    global show_normals
+    if symbol == pyglet.window.key.N:
+        show_normals = not show_normals
+
+
 @win.event
 def on_draw():
 
-    with rc.default_shader:
-        with fbo:
-            rc.clear_color(0, 0, 0)
-            win.clear()
-            stars.draw()
-        with fbo.texture:
-            rc.clear_color(.5, .5, .5)
-            win.clear()
-            monkey.draw()
+    with rc.resources.gbuffer_shader, gbuffer:
+        rc.clear_color(0, 0, 0)
+        win.clear()
+        stars.draw()
+        monkey.draw()
+
+    win.clear()
+    with normals_shader if show_normals else lighting_shader, gbuffer.bind_textures():
+        quad.draw()
 
 
-pyglet.app.run()
\ No newline at end of file
+pyglet.app.run()
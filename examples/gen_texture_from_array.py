@@ -11,8 +11,8 @@ arr = np.random.randint(0, 255, size=(128, 128, 4))
 arr = np.zeros_like(arr)# + 255
 arr[:, :, 0] = 255
 
-tex2 = rc.Texture(values=arr)
-tex2.values = np.random.randint(0, 255, size=(128, 128, 4))
+tex2 = rc.StreamingTexture(width=128, height=128)
+tex2.write(arr)
 
 cube.textures.append(tex2)
 
@@ -24,7 +24,7 @@ def on_draw():
 
 
 def randomize_texture(dt):
-    tex2.values = np.random.randint(0, 255, size=(128, 128, 4))
+    tex2.write(np.random.randint(0, 255, size=(128, 128, 4)))  # Uploaded when the cube is next drawn.
 pyglet.clock.schedule(randomize_texture)
 
 pyglet.app.run()
\ No newline at end of file
@@ -34,8 +34,8 @@ def animation_sequence(mesh, nframes=50):
     for t in itertools.cycle(itertools.chain(np.linspace(0, 1, nframes), np.ones(nframes), np.linspace(0, 1, nframes)[::-1], np.zeros(nframes))):
         vv = lerp(verts_orig, verts_normed, t)
         nn = lerp(norms_orig, norms_normed, t)
-        mesh.arrays[0][:, :3] = vv
-        mesh.arrays[1][:, :3] = nn
+        mesh.vertices[:, :3] = vv
+        mesh.normals[:, :3] = nn
         yield
 
 
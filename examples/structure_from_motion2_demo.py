@@ -44,9 +44,7 @@ pyglet.clock.schedule(update)
 def randomize_points(dt):
     theta = random(n_points) * np.pi * 2
     verts = np.vstack((np.sin(theta) * width, (random(n_points) - .5) * height, np.cos(theta) * width)).T
-    cylinder.vertices = verts
-    cyl2.vertices = verts
-    cyl3.vertices = verts
+    cylinder.geometry.vertices = verts  # The copies share cylinder's Geometry, so this updates all three.
 pyglet.clock.schedule_interval(randomize_points, 1/10.)
 
 pyglet.app.run()
\ No newline at end of file
@@ -1,29 +1,55 @@
 from . import utils
 from .utils import gl as gl
 from .utils.gl import clear_color, GL_POINTS, GL_TRIANGLES
+_resources_error = None
 try:
     from . import resources
-    from .resources import default_shader, default_camera, default_light
-except ImportError:
-    pass
+except ImportError as error:
+    _resources_error = error
 from .coordinates import RotationEulerDegrees, RotationQuaternion, RotationEulerRadians, Translation, Scale
 from .camera import Camera, PerspectiveProjection, OrthoProjection, CameraGroup, StereoCameraGroup
 from .collision import ColliderSphere, ColliderCube, ColliderCylinder
-from .fbo import FBO
+from .fbo import FBO, GBuffer
+from .recorder import FrameRecorder
 from .gl_states import GLStateManager, default_states
 from .light import Light
 from .materials import Material
 from .mesh import Mesh, EmptyEntity, gen_fullscreen_quad
 from .physical import Physical, PhysicalGraph
 from .scene import Scene
-from .shader import Shader, UniformCollection
-from .texture import Texture, TextureCube, DepthTexture
+from .shader import Shader, UniformCollection, UniformBlock, ShaderError, ShaderCompileError, ShaderLinkError, \
+    compile_shaders
+from .shader_cache import ProgramBinaryCache
+from .texture import Texture, TextureCube, DepthTexture, StreamingTexture, TextureArray
+from .atlas import TextureAtlas
+from .compressed import CompressedTexture
+from .texture_cache import TextureCache
 from .scenegraph import SceneGraph
 from . import experimental
 from .wavefront import WavefrontReader
-from .vertex import VertexBuffer
+from .loader import AssetLoader
+from . import batching
+from . import bounds
+from .vertex import VertexBuffer, Geometry
 
-
-import pkg_resources
-__version__ = pkg_resources.get_distribution('ratcave').version
 __all__ = ['Camera', 'Mesh', 'Material', 'Physical', 'Scene', 'Light', 'WavefrontReader']
+
+
+_lazy_resources = ('default_shader', 'default_camera', 'default_light')
+
+
+def __getattr__(name):
+    """Looks up the version and the default resources when they're first used, which keeps 'import ratcave' fast."""
+    if name in _lazy_resources:
+        if 'resources' not in globals():
+            raise AttributeError("module '{}' has no attribute '{}', because ratcave.resources couldn't be "
+                                 "imported".format(__name__, name)) from _resources_error
+        return getattr(resources, name)
+    if name == '__version__':
+        try:
+            from importlib.metadata import version
+        except ImportError:  # Python < 3.8
+            import pkg_resources
+            return pkg_resources.get_distribution('ratcave').version
+        return version('ratcave')
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
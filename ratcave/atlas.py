@@ -0,0 +1,90 @@
+"""
+This module packs many small images into one texture atlas, so Meshes with different images can share a Texture (and
+be batched together, see ratcave.batching) instead of each binding their own.
+"""
+
+from collections import OrderedDict, namedtuple
+import numpy as np
+from .texture import Texture
+
+AtlasRegion = namedtuple('AtlasRegion', 'x y width height')
+
+
+def pack_rectangles(sizes, width=None):
+    """
+    Packs (width, height) rectangles into rows ("shelves"), tallest first.
+
+    Args:
+        sizes (list): (width, height) of each rectangle.
+        width (int): The width to pack them into.  By default, the smallest power of two that's at least as wide as the
+            widest rectangle and the square root of their total area.
+
+    Returns:
+        ((width, height) of the packed area, list of (x, y) positions in the same order as the sizes)
+    """
+    sizes = [(int(w), int(h)) for w, h in sizes]
+    if width is None:
+        area = sum(w * h for w, h in sizes)
+        width = 1
+        while width < max([w for w, _ in sizes] + [np.sqrt(area)]):
+            width *= 2
+    positions = [None] * len(sizes)
+    x, y, shelf_height = 0, 0, 0
+    for idx in sorted(range(len(sizes)), key=lambda idx: -sizes[idx][1]):
+        w, h = sizes[idx]
+        if w > width:
+            raise ValueError("A {}-pixel-wide rectangle doesn't fit in a {}-pixel-wide atlas.".format(w, width))
+        if x + w > width:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        positions[idx] = x, y
+        x += w
+        shelf_height = max(shelf_height, h)
+    return (width, y + shelf_height), positions
+
+
+class TextureAtlas(object):
+
+    def __init__(self, images, padding=2, name='TextureMap', **kwargs):
+        """
+        One Texture holding many images, each surrounded by copies of its edge pixels so filtering doesn't blend in
+        its neighbours.  Meshes use an image by remapping their texture coordinates into its region (see
+        remap_texcoords()), which only works for coordinates from 0 to 1, not for repeating textures.
+
+        Args:
+            images (dict): (height x width x 4) image arrays, by key (e.g. their filename).
+            padding (int): Number of edge pixels copied around each image.
+
+        Other keyword arguments are passed to the Texture.
+        """
+        images = OrderedDict((key, np.asarray(image)) for key, image in images.items())
+        (width, height), positions = pack_rectangles([(image.shape[1] + 2 * padding, image.shape[0] + 2 * padding)
+                                                      for image in images.values()])
+        channels = set(image.shape[2] for image in images.values())
+        if len(channels) > 1:
+            raise ValueError("All images in an atlas must have the same number of channels, not {}".format(channels))
+        values = np.zeros((height, width, channels.pop()), dtype=np.uint8)
+
+        self.regions = OrderedDict()
+        for (key, image), (x, y) in zip(images.items(), positions):
+            rows, cols = image.shape[:2]
+            values[y:y + rows + 2 * padding, x:x + cols + 2 * padding] = np.pad(
+                image, ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+            self.regions[key] = AtlasRegion(x + padding, y + padding, cols, rows)
+        self.texture = Texture(values=values, name=name, **kwargs)
+
+    @classmethod
+    def from_images(cls, filenames, **kwargs):
+        """Makes an atlas of image files, keyed by filename."""
+        return cls(OrderedDict((filename, Texture.load_image(filename)) for filename in filenames), **kwargs)
+
+    def __contains__(self, key):
+        return key in self.regions
+
+    def remap_texcoords(self, texcoords, key):
+        """Returns (N x 2) texture coordinates of an image, moved into its region of the atlas."""
+        region = self.regions[key]
+        texcoords = np.asarray(texcoords, dtype=np.float32)
+        offset = np.array([region.x, region.y], dtype=np.float32)
+        scale = np.array([region.width, region.height], dtype=np.float32)
+        size = np.array([self.texture.width, self.texture.height], dtype=np.float32)
+        return (offset + texcoords * scale) / size
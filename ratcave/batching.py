@@ -0,0 +1,106 @@
+"""
+This module merges static Meshes into batches that are each drawn with a single draw call.
+"""
+
+from collections import OrderedDict
+import numpy as np
+from .mesh import Mesh
+from .vertex import Geometry
+
+# Uniforms set per-Mesh by ratcave itself, which don't need to match for Meshes to be batched.
+transform_uniforms = ('model_matrix', 'normal_matrix', 'position_dequantization')
+
+
+def batch_key(mesh):
+    """Returns a hashable key that is equal for Meshes that can be drawn together (same textures, draw mode,
+    array layout, and material uniforms)."""
+    uniforms = tuple((name, tuple(np.asarray(value).ravel().tolist())) for name, value in sorted(mesh.uniforms.items())
+                     if name not in transform_uniforms)
+    layout = tuple(array.shape[1] for array in mesh.arrays)
+    return (tuple(id(texture) for texture in mesh.textures), mesh.drawmode, mesh.point_size, mesh.geometry.formats,
+            layout, uniforms)
+
+
+def merge_static(meshes):
+    """
+    Merges Meshes that don't move into as few StaticBatches as possible, each drawn with a single draw call.
+
+    Meshes with the same textures, draw mode, and material uniforms are merged together, with their current world
+    transforms baked into the vertices.  Draw the returned batches instead of the original Meshes; toggling an original
+    Mesh's 'visible' attribute still shows or hides it in its batch.
+
+    Returns:
+        list of StaticBatch
+    """
+    groups = OrderedDict()
+    for mesh in meshes:
+        groups.setdefault(batch_key(mesh), []).append(mesh)
+    return [StaticBatch(group) for group in groups.values()]
+
+
+class StaticBatch(Mesh):
+
+    def __init__(self, meshes, **kwargs):
+        """
+        A Mesh made of other, compatible Meshes (see merge_static()), whose vertices are baked into world coordinates
+        and share one vertex array and index buffer.  Only the source Meshes that are visible are drawn.
+
+        Args:
+            meshes (list): the source Meshes.  Their positions are read once; moving them later has no effect.
+        """
+        self.meshes = tuple(meshes)
+        first = self.meshes[0]
+
+        arrays, indices, starts, counts = [[] for _ in first.arrays], [], [], []
+        n_vertices, n_indices = 0, 0
+        for mesh in self.meshes:
+            model, normal = mesh.model_matrix_global, mesh.normal_matrix_global
+            vertices = np.asarray(mesh.arrays[0])
+            arrays[0].append(vertices.dot(model[:3, :3].T) + model[:3, 3])
+            if len(arrays) > 1:
+                normals = np.asarray(mesh.arrays[1]).dot(normal[:3, :3].T)
+                arrays[1].append(normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12))
+            for merged, array in zip(arrays[2:], mesh.arrays[2:]):
+                merged.append(np.asarray(array))
+
+            mesh_indices = np.asarray(mesh.indices) if mesh.indices is not None else np.arange(vertices.shape[0])
+            indices.append(mesh_indices + n_vertices)
+            starts.append(n_indices)
+            counts.append(len(mesh_indices))
+            n_vertices += vertices.shape[0]
+            n_indices += len(mesh_indices)
+
+        geometry = Geometry(arrays=[np.vstack(merged) for merged in arrays], indices=np.concatenate(indices),
+                            drawmode=first.drawmode, formats=first.geometry.formats)
+        kwargs.setdefault('name', 'StaticBatch')
+        super(StaticBatch, self).__init__(geometry=geometry, textures=first.textures, drawmode=first.drawmode,
+                                          point_size=first.point_size, mean_center=False, **kwargs)
+        for name, value in first.uniforms.items():
+            if name not in transform_uniforms:
+                self.uniforms[name] = np.array(value).tolist()
+
+        self.starts = np.array(starts, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self._visibility = None
+        self._ranges = None
+
+    def _visible_ranges(self):
+        """Returns (starts, counts) of the visible source Meshes' indices, merging neighbouring ranges."""
+        visibility = np.array([mesh.visible for mesh in self.meshes], dtype=bool)
+        if self._visibility is None or not np.array_equal(visibility, self._visibility):
+            if not visibility.any():
+                self._ranges = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            else:
+                starts, counts = self.starts[visibility], self.counts[visibility]
+                ends = starts + counts
+                run_begins = np.ones(len(starts), dtype=bool)
+                run_begins[1:] = starts[1:] != ends[:-1]
+                run_ends = np.append(run_begins[1:], True)
+                self._ranges = starts[run_begins], ends[run_ends] - starts[run_begins]
+            self._visibility = visibility
+        return self._ranges
+
+    def _draw_geometry(self):
+        starts, counts = self._visible_ranges()
+        if len(starts):
+            self.geometry.draw_ranges(starts, counts, drawmode=self.drawmode)
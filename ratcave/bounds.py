@@ -0,0 +1,80 @@
+"""
+This module calculates bounding volumes (axis-aligned boxes, spheres, and oriented boxes) and moves them into world
+coordinates, for culling and collision checks that don't need to look at every vertex.
+
+Axis-aligned bounding boxes (AABBs) are (2 x 3) arrays of the box's minimum and maximum corners.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+BoundingSphere = namedtuple('BoundingSphere', 'center radius')
+OrientedBox = namedtuple('OrientedBox', 'center axes half_extents')
+
+
+def aabb_from_points(points):
+    """Returns the (2 x 3) axis-aligned bounding box of an (N x 3) array of points."""
+    points = np.asarray(points)
+    return np.array([points.min(axis=0), points.max(axis=0)], dtype=np.float32)
+
+
+def sphere_from_points(points, aabb=None):
+    """Returns a BoundingSphere around the points, centered on their bounding box."""
+    aabb = aabb_from_points(points) if aabb is None else aabb
+    center = aabb.mean(axis=0)
+    radius = np.sqrt(((np.asarray(points) - center) ** 2).sum(axis=1).max())
+    return BoundingSphere(center=center, radius=float(radius))
+
+
+def obb_from_points(points):
+    """Returns an OrientedBox around the points, aligned to their principal axes (the columns of 'axes')."""
+    points = np.asarray(points, dtype=np.float64)
+    mean = points.mean(axis=0)
+    _, axes = np.linalg.eigh(np.cov(points - mean, rowvar=False))
+    projected = (points - mean).dot(axes)
+    low, high = projected.min(axis=0), projected.max(axis=0)
+    center = mean + axes.dot((low + high) / 2.)
+    return OrientedBox(center=center.astype(np.float32), axes=axes.astype(np.float32),
+                       half_extents=((high - low) / 2.).astype(np.float32))
+
+
+def transform_aabbs(matrices, aabbs):
+    """
+    Returns the axis-aligned boxes around transformed boxes, without transforming their corners.
+
+    Args:
+        matrices (array): (4 x 4) model matrix, or an (N x 4 x 4) array of them.
+        aabbs (array): (2 x 3) bounding box, or an (N x 2 x 3) array of them.
+    """
+    matrices, aabbs = np.asarray(matrices), np.asarray(aabbs)
+    rotations, translations = matrices[..., :3, :3], matrices[..., :3, 3]
+    centers = (aabbs[..., 0, :] + aabbs[..., 1, :]) / 2.
+    half_extents = (aabbs[..., 1, :] - aabbs[..., 0, :]) / 2.
+    new_centers = np.einsum('...ij,...j->...i', rotations, centers) + translations
+    new_half_extents = np.einsum('...ij,...j->...i', np.abs(rotations), half_extents)
+    return np.stack([new_centers - new_half_extents, new_centers + new_half_extents], axis=-2)
+
+
+def transform_spheres(matrices, centers, radii):
+    """Returns the (centers, radii) of bounding spheres moved by (N x 4 x 4) model matrices.  Radii are multiplied by
+    each matrix's largest scale factor, so they still contain the transformed points."""
+    matrices = np.asarray(matrices)
+    new_centers = np.einsum('...ij,...j->...i', matrices[..., :3, :3], centers) + matrices[..., :3, 3]
+    scales = np.linalg.norm(matrices[..., :3, :3], axis=-2).max(axis=-1)
+    return new_centers, np.asarray(radii) * scales
+
+
+def world_aabbs(meshes):
+    """Returns an (N x 2 x 3) array of the Meshes' bounding boxes in world coordinates, calculated in one pass."""
+    matrices = np.array([mesh.model_matrix_global for mesh in meshes])
+    aabbs = np.array([mesh.geometry.aabb for mesh in meshes])
+    return transform_aabbs(matrices, aabbs).reshape(-1, 2, 3)
+
+
+def world_bounding_spheres(meshes):
+    """Returns the (N x 3) centers and (N,) radii of the Meshes' bounding spheres in world coordinates."""
+    matrices = np.array([mesh.model_matrix_global for mesh in meshes])
+    spheres = [mesh.geometry.bounding_sphere for mesh in meshes]
+    centers = np.array([sphere.center for sphere in spheres]).reshape(-1, 3)
+    radii = np.array([sphere.radius for sphere in spheres])
+    return transform_spheres(matrices.reshape(-1, 4, 4), centers, radii)
@@ -3,7 +3,7 @@ import abc
 import numpy as np
 from .physical import PhysicalGraph
 from collections import namedtuple
-from .shader import HasUniformsUpdater
+from .shader import HasUniformsUpdater, Shader, UniformBlock
 from .utils import NameLabelMixin, get_viewport
 
 Viewport = namedtuple('Viewport', 'x y width height')
@@ -245,6 +245,9 @@ class PerspectiveProjection(ProjectionBase):
 
 class Camera(PhysicalGraph, HasUniformsUpdater, NameLabelMixin):
 
+    uniform_block_name = 'CameraBlock'
+    uniform_block_fields = (('projection_matrix', 'mat4'), ('view_matrix', 'mat4'), ('camera_position', 'vec3'))
+
     def __init__(self, projection=None, orientation0=(0, 0, -1), **kwargs):
         """Returns a camera object
 
@@ -259,13 +262,16 @@ class Camera(PhysicalGraph, HasUniformsUpdater, NameLabelMixin):
         super(Camera, self).__init__(**kwargs)
         self.projection = PerspectiveProjection() if not projection else projection
         self.reset_uniforms()
+        self.uniform_block = UniformBlock(self.uniform_block_name, self.uniform_block_fields)
 
     def __repr__(self):
         return "<Camera(name='{self.name}', position_rel={self.position}, position_glob={self.position_global}, rotation={self.rotation})".format(self=self)
 
     def __enter__(self):
         self.update()
-        self.uniforms.send()
+        self.uniform_block.send(self.uniforms)  # Read by every Shader that declares the block, so it's sent only once.
+        if Shader._bound is not None:  # For Shaders that declare the uniforms individually instead.
+            Shader._bound.share_uniforms(self.uniforms)
         return self
 
     def __exit__(self, *args):
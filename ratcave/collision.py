@@ -35,7 +35,8 @@ class ColliderBase(Mesh):
     @parent.setter
     def parent(self, value):
         Mesh.parent.__set__(self, value)
-        self.scale.xyz = self._fit_to_parent_vertices(value.vertices)
+        # The corners of the parent's (cached) bounding box have the same extent as all of its vertices.
+        self.scale.xyz = self._fit_to_parent_vertices(value.geometry.aabb)
 
 
     @staticmethod
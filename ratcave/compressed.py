@@ -0,0 +1,340 @@
+"""
+Loads textures that were compressed ahead of time (BC1 to BC7, also known as S3TC/DXT, RGTC, and BPTC, and ETC2) from
+DDS and KTX2 files.  They're uploaded to the graphics card as they are, along with their mipmaps, so they take 4 to 8
+times less memory than the RGBA images of Texture.from_image(), and don't need to be decoded at startup.  BC1 to BC5
+images are decoded on the CPU instead if the graphics driver doesn't support their format.
+
+Example::
+
+    floor.textures.append(ratcave.CompressedTexture.from_file('floor.ktx2'))
+"""
+
+import struct
+from collections import namedtuple
+from functools import partial
+import numpy as np
+from . import gl
+from .texture import Texture
+
+CompressedImage = namedtuple('CompressedImage', 'format width height levels')
+CompressedFormat = namedtuple('CompressedFormat', 'internal_fmt block_bytes decoder extension version')
+
+# Compressed formats that pyglet has no constants for (core since OpenGL 4.2 and 4.3).
+GL_COMPRESSED_RGBA_BPTC_UNORM = 0x8E8C
+GL_COMPRESSED_SRGB_ALPHA_BPTC_UNORM = 0x8E8D
+GL_COMPRESSED_RGB8_ETC2 = 0x9274
+GL_COMPRESSED_SRGB8_ETC2 = 0x9275
+GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2 = 0x9276
+GL_COMPRESSED_SRGB8_PUNCHTHROUGH_ALPHA1_ETC2 = 0x9277
+GL_COMPRESSED_RGBA8_ETC2_EAC = 0x9278
+GL_COMPRESSED_SRGB8_ALPHA8_ETC2_EAC = 0x9279
+
+
+def _blocks(data, width, height, block_bytes):
+    """Returns a compressed image's 4x4-texel blocks, as a (block rows x block columns x block_bytes) array."""
+    rows, cols = (height + 3) // 4, (width + 3) // 4
+    return np.frombuffer(data, dtype=np.uint8, count=rows * cols * block_bytes).reshape(rows, cols, block_bytes)
+
+
+def _untile(texels, width, height):
+    """Arranges (block rows x block columns x 16 x channels) texels into a (height x width x channels) uint8 image."""
+    rows, cols, _, channels = texels.shape
+    image = texels.reshape(rows, cols, 4, 4, channels).transpose(0, 2, 1, 3, 4).reshape(rows * 4, cols * 4, channels)
+    return np.ascontiguousarray(image[:height, :width], dtype=np.uint8)
+
+
+def _indices(blocks, bits):
+    """Unpacks the 16 little-endian, 'bits'-bit texel indices stored in the bytes of each block."""
+    packed = np.zeros(blocks.shape[:-1], dtype=np.uint64)
+    for byte in range(blocks.shape[-1]):
+        packed |= blocks[..., byte].astype(np.uint64) << np.uint64(8 * byte)
+    shifts = np.arange(16, dtype=np.uint64) * np.uint64(bits)
+    return ((packed[..., np.newaxis] >> shifts) & np.uint64((1 << bits) - 1)).astype(np.intp)
+
+
+def _rgb565(color):
+    red, green, blue = (color >> 11) & 31, (color >> 5) & 63, color & 31
+    return np.stack([(red << 3) | (red >> 2), (green << 2) | (green >> 4), (blue << 3) | (blue >> 2)], axis=-1)
+
+
+def _decode_colors(blocks, punchthrough):
+    """Decodes 8-byte BC1 color blocks to (block rows x block columns x 16 x 4) RGBA texels.  If 'punchthrough',
+    blocks whose first color isn't greater than their second have three colors and transparent black, as in BC1 (but
+    not in BC2 and BC3)."""
+    color0 = blocks[..., 0].astype(np.int32) | blocks[..., 1].astype(np.int32) << 8
+    color1 = blocks[..., 2].astype(np.int32) | blocks[..., 3].astype(np.int32) << 8
+    rgb0, rgb1 = _rgb565(color0), _rgb565(color1)
+    three_colors = (color0 <= color1) & punchthrough
+
+    palette = np.full(color0.shape + (4, 4), 255, dtype=np.uint8)
+    palette[..., 0, :3], palette[..., 1, :3] = rgb0, rgb1
+    palette[..., 2, :3] = np.where(three_colors[..., np.newaxis], (rgb0 + rgb1) // 2, (2 * rgb0 + rgb1) // 3)
+    palette[..., 3, :3] = np.where(three_colors[..., np.newaxis], 0, (rgb0 + 2 * rgb1) // 3)
+    palette[..., 3, 3] = np.where(three_colors, 0, 255)
+    colors = palette.view(np.uint32)[..., 0]  # Each RGBA color as one 32-bit value, so they're gathered at once.
+    return np.take_along_axis(colors, _indices(blocks[..., 4:8], 2), axis=2).view(np.uint8).reshape(
+        color0.shape + (16, 4))
+
+
+def _decode_channel(blocks):
+    """Decodes 8-byte BC4 blocks (also BC3's alpha and BC5's channels) to (block rows x block columns x 16) values."""
+    value0, value1 = blocks[..., :1].astype(np.int32), blocks[..., 1:2].astype(np.int32)
+    steps = np.arange(1, 7)
+    eight_values = ((7 - steps) * value0 + steps * value1) // 7
+    six_values = np.concatenate([((5 - steps[:4]) * value0 + steps[:4] * value1) // 5,
+                                 np.zeros_like(value0), np.full_like(value0, 255)], axis=-1)
+    palette = np.concatenate([value0, value1, np.where(value0 > value1, eight_values, six_values)], axis=-1).astype(
+        np.uint8)
+    return np.take_along_axis(palette, _indices(blocks[..., 2:8], 3), axis=-1)
+
+
+def decode_bc1(data, width, height, alpha=True):
+    """Decodes a BC1 (DXT1) image to a (height x width x 4) uint8 array.  If not 'alpha', it's opaque."""
+    texels = _decode_colors(_blocks(data, width, height, 8), punchthrough=True)
+    if not alpha:
+        texels[..., 3] = 255
+    return _untile(texels, width, height)
+
+
+def decode_bc2(data, width, height):
+    """Decodes a BC2 (DXT3) image to a (height x width x 4) uint8 array."""
+    blocks = _blocks(data, width, height, 16)
+    texels = _decode_colors(blocks[..., 8:], punchthrough=False)
+    texels[..., 3] = _indices(blocks[..., :8], 4) * 17
+    return _untile(texels, width, height)
+
+
+def decode_bc3(data, width, height):
+    """Decodes a BC3 (DXT5) image to a (height x width x 4) uint8 array."""
+    blocks = _blocks(data, width, height, 16)
+    texels = _decode_colors(blocks[..., 8:], punchthrough=False)
+    texels[..., 3] = _decode_channel(blocks[..., :8])
+    return _untile(texels, width, height)
+
+
+def decode_bc4(data, width, height):
+    """Decodes a BC4 (RGTC1) image to a (height x width x 4) uint8 array, with green and blue at 0 like OpenGL reads
+    it."""
+    blocks = _blocks(data, width, height, 8)
+    texels = np.zeros(blocks.shape[:2] + (16, 4), dtype=np.int32)
+    texels[..., 0], texels[..., 3] = _decode_channel(blocks), 255
+    return _untile(texels, width, height)
+
+
+def decode_bc5(data, width, height):
+    """Decodes a BC5 (RGTC2) image to a (height x width x 4) uint8 array, with blue at 0 like OpenGL reads it."""
+    blocks = _blocks(data, width, height, 16)
+    texels = np.zeros(blocks.shape[:2] + (16, 4), dtype=np.int32)
+    texels[..., 0], texels[..., 1] = _decode_channel(blocks[..., :8]), _decode_channel(blocks[..., 8:])
+    texels[..., 3] = 255
+    return _untile(texels, width, height)
+
+
+_s3tc, _rgtc = 'GL_EXT_texture_compression_s3tc', ('GL_ARB_texture_compression_rgtc', (3, 0))
+_bptc, _etc2 = ('GL_ARB_texture_compression_bptc', (4, 2)), ('GL_ARB_ES3_compatibility', (4, 3))
+
+# The compressed formats, by name.  Formats without a decoder can only be used if the graphics driver supports them.
+formats = {
+    'BC1_RGB': CompressedFormat(gl.GL_COMPRESSED_RGB_S3TC_DXT1_EXT, 8, partial(decode_bc1, alpha=False), _s3tc, None),
+    'BC1_RGB_SRGB': CompressedFormat(gl.GL_COMPRESSED_SRGB_S3TC_DXT1_EXT, 8, partial(decode_bc1, alpha=False), _s3tc,
+                                     None),
+    'BC1': CompressedFormat(gl.GL_COMPRESSED_RGBA_S3TC_DXT1_EXT, 8, decode_bc1, _s3tc, None),
+    'BC1_SRGB': CompressedFormat(gl.GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT1_EXT, 8, decode_bc1, _s3tc, None),
+    'BC2': CompressedFormat(gl.GL_COMPRESSED_RGBA_S3TC_DXT3_EXT, 16, decode_bc2, _s3tc, None),
+    'BC2_SRGB': CompressedFormat(gl.GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT3_EXT, 16, decode_bc2, _s3tc, None),
+    'BC3': CompressedFormat(gl.GL_COMPRESSED_RGBA_S3TC_DXT5_EXT, 16, decode_bc3, _s3tc, None),
+    'BC3_SRGB': CompressedFormat(gl.GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT5_EXT, 16, decode_bc3, _s3tc, None),
+    'BC4': CompressedFormat(gl.GL_COMPRESSED_RED_RGTC1, 8, decode_bc4, *_rgtc),
+    'BC4_SNORM': CompressedFormat(gl.GL_COMPRESSED_SIGNED_RED_RGTC1, 8, None, *_rgtc),
+    'BC5': CompressedFormat(gl.GL_COMPRESSED_RG_RGTC2, 16, decode_bc5, *_rgtc),
+    'BC5_SNORM': CompressedFormat(gl.GL_COMPRESSED_SIGNED_RG_RGTC2, 16, None, *_rgtc),
+    'BC7': CompressedFormat(GL_COMPRESSED_RGBA_BPTC_UNORM, 16, None, *_bptc),
+    'BC7_SRGB': CompressedFormat(GL_COMPRESSED_SRGB_ALPHA_BPTC_UNORM, 16, None, *_bptc),
+    'ETC2_RGB8': CompressedFormat(GL_COMPRESSED_RGB8_ETC2, 8, None, *_etc2),
+    'ETC2_RGB8_SRGB': CompressedFormat(GL_COMPRESSED_SRGB8_ETC2, 8, None, *_etc2),
+    'ETC2_RGB8A1': CompressedFormat(GL_COMPRESSED_RGB8_PUNCHTHROUGH_ALPHA1_ETC2, 8, None, *_etc2),
+    'ETC2_RGB8A1_SRGB': CompressedFormat(GL_COMPRESSED_SRGB8_PUNCHTHROUGH_ALPHA1_ETC2, 8, None, *_etc2),
+    'ETC2_RGBA8': CompressedFormat(GL_COMPRESSED_RGBA8_ETC2_EAC, 16, None, *_etc2),
+    'ETC2_RGBA8_SRGB': CompressedFormat(GL_COMPRESSED_SRGB8_ALPHA8_ETC2_EAC, 16, None, *_etc2),
+}
+
+_dds_magic = b'DDS '
+_dds_fourccs = {b'DXT1': 'BC1', b'DXT2': 'BC2', b'DXT3': 'BC2', b'DXT4': 'BC3', b'DXT5': 'BC3', b'ATI1': 'BC4',
+                b'BC4U': 'BC4', b'BC4S': 'BC4_SNORM', b'ATI2': 'BC5', b'BC5U': 'BC5', b'BC5S': 'BC5_SNORM'}
+_dxgi_formats = {71: 'BC1', 72: 'BC1_SRGB', 74: 'BC2', 75: 'BC2_SRGB', 77: 'BC3', 78: 'BC3_SRGB', 80: 'BC4',
+                 81: 'BC4_SNORM', 83: 'BC5', 84: 'BC5_SNORM', 98: 'BC7', 99: 'BC7_SRGB'}
+
+_ktx2_identifier = b'\xabKTX 20\xbb\r\n\x1a\n'
+_ktx2_formats = {131: 'BC1_RGB', 132: 'BC1_RGB_SRGB', 133: 'BC1', 134: 'BC1_SRGB', 135: 'BC2', 136: 'BC2_SRGB',
+                 137: 'BC3', 138: 'BC3_SRGB', 139: 'BC4', 140: 'BC4_SNORM', 141: 'BC5', 142: 'BC5_SNORM', 145: 'BC7',
+                 146: 'BC7_SRGB', 147: 'ETC2_RGB8', 148: 'ETC2_RGB8_SRGB', 149: 'ETC2_RGB8A1',
+                 150: 'ETC2_RGB8A1_SRGB', 151: 'ETC2_RGBA8', 152: 'ETC2_RGBA8_SRGB'}  # By Vulkan format number.
+
+
+def level_size(fmt, width, height):
+    """Returns the number of bytes of a width x height image in the named compressed format."""
+    return max(1, (width + 3) // 4) * max(1, (height + 3) // 4) * formats[fmt].block_bytes
+
+
+def _level_shape(width, height, level):
+    return max(1, width >> level), max(1, height >> level)
+
+
+def _check_level(fmt, width, height, level, data):
+    expected = level_size(fmt, *_level_shape(width, height, level))
+    if len(data) < expected:
+        raise ValueError("Mipmap level {} has {} bytes, not the {} a {}x{} {} image needs; the file may be "
+                         "truncated.".format(level, len(data), expected, width, height, fmt))
+    return data[:expected]
+
+
+def parse_dds(data):
+    """Returns the CompressedImage of a DDS file's contents.  Only 2D textures in a compressed format are supported."""
+    if data[:4] != _dds_magic:
+        raise ValueError("Not a DDS file.")
+    flags, height, width, _, _, mipmap_count = struct.unpack_from('<6I', data, 8)
+    pixel_flags, fourcc = struct.unpack_from('<I4s', data, 80)
+    caps2, = struct.unpack_from('<I', data, 112)
+    offset = 128
+    if not pixel_flags & 0x4:  # DDPF_FOURCC
+        raise ValueError("Uncompressed DDS files aren't supported; load them with Texture.from_image().")
+    if fourcc == b'DX10':
+        dxgi_format, dimension, misc_flags, array_size = struct.unpack_from('<4I', data, 128)
+        offset = 148
+        if dimension != 3 or misc_flags & 0x4 or array_size > 1:  # Not a single 2D texture.
+            raise ValueError("Only 2D DDS textures are supported, not arrays, cube maps, or volumes.")
+        if dxgi_format not in _dxgi_formats:
+            raise ValueError("DDS files with DXGI format {} aren't supported.".format(dxgi_format))
+        fmt = _dxgi_formats[dxgi_format]
+    elif fourcc in _dds_fourccs:
+        fmt = _dds_fourccs[fourcc]
+    else:
+        raise ValueError("DDS files with format '{}' aren't supported.".format(fourcc.decode('latin1')))
+    if caps2 & 0x200200:  # DDSCAPS2_CUBEMAP, DDSCAPS2_VOLUME
+        raise ValueError("Only 2D DDS textures are supported, not cube maps or volumes.")
+
+    levels = []
+    for level in range(max(1, mipmap_count) if flags & 0x20000 else 1):  # DDSD_MIPMAPCOUNT
+        levels.append(_check_level(fmt, width, height, level, data[offset:offset + level_size(
+            fmt, *_level_shape(width, height, level))]))
+        offset += len(levels[-1])
+    return CompressedImage(fmt, width, height, levels)
+
+
+def parse_ktx2(data):
+    """Returns the CompressedImage of a KTX2 file's contents.  Only 2D textures in a compressed format, without
+    supercompression, are supported."""
+    if data[:12] != _ktx2_identifier:
+        raise ValueError("Not a KTX2 file.")
+    vk_format, _, width, height, depth, layers, faces, level_count, supercompression = struct.unpack_from(
+        '<9I', data, 12)
+    if supercompression:
+        raise ValueError("Supercompressed KTX2 files (scheme {}) aren't supported.".format(supercompression))
+    if depth or layers or faces != 1:
+        raise ValueError("Only 2D KTX2 textures are supported, not arrays, cube maps, or volumes.")
+    if vk_format not in _ktx2_formats:
+        raise ValueError("KTX2 files with Vulkan format {} aren't supported.".format(vk_format))
+    fmt = _ktx2_formats[vk_format]
+
+    levels = []
+    for level in range(max(1, level_count)):
+        offset, length, _ = struct.unpack_from('<3Q', data, 80 + 24 * level)
+        levels.append(_check_level(fmt, width, height, level, data[offset:offset + length]))
+    return CompressedImage(fmt, width, height, levels)
+
+
+def parse_compressed_image(data):
+    """Returns the CompressedImage of a DDS or KTX2 file's contents."""
+    if data.startswith(_dds_magic):
+        return parse_dds(data)
+    if data.startswith(_ktx2_identifier):
+        return parse_ktx2(data)
+    raise ValueError("Not a DDS or a KTX2 file.")
+
+
+def load_compressed_image(filename):
+    """Returns the CompressedImage of a DDS or KTX2 file.  Doesn't need an OpenGL context, so it can run in a
+    background thread."""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    try:
+        return parse_compressed_image(data)
+    except ValueError as error:
+        raise ValueError("'{}': {}".format(filename, error))
+
+
+def format_supported(fmt):
+    """Returns True if the current OpenGL context can use textures in the named compressed format."""
+    from pyglet.gl import gl_info
+    if not gl_info.have_context():
+        return False
+    extension, version = formats[fmt].extension, formats[fmt].version
+    return gl_info.have_extension(extension) or (version is not None and gl_info.have_version(*version))
+
+
+class CompressedTexture(Texture):
+
+    def __init__(self, image, name='TextureMap', decode=None, **kwargs):
+        """
+        A Texture of a CompressedImage, with all of its mipmaps.  The image is uploaded compressed if the graphics
+        driver supports its format, and is otherwise decoded to RGBA first (which only BC1 to BC5 images can be).
+
+        Its rows are in the order the file stores them, from top to bottom, so most texture tools' "flip vertically"
+        option is needed to export images that face the same way as with Texture.from_image().  Compressed textures
+        can't be changed after they're made.
+
+        Args:
+          - image (CompressedImage): The image (see load_compressed_image()).
+          - decode (bool): Whether to decode the image on the CPU.  By default, only if the driver can't use its format.
+        """
+        self.image = image
+        self.format = formats[image.format]
+        self.decoded = not format_supported(image.format) if decode is None else decode
+        if self.decoded and self.format.decoder is None:
+            raise ValueError("The graphics driver doesn't support {} textures, which can't be decoded on the "
+                             "CPU.".format(image.format))
+        srgb = image.format.endswith('_SRGB')
+        self.internal_fmt = (gl.GL_SRGB8_ALPHA8 if srgb else gl.GL_RGBA) if self.decoded else self.format.internal_fmt
+        super(CompressedTexture, self).__init__(name=name, width=image.width, height=image.height,
+                                                mipmap=len(image.levels) > 1, **kwargs)
+
+    @classmethod
+    def from_file(cls, filename, **kwargs):
+        """Makes a CompressedTexture of a DDS or KTX2 file."""
+        return cls(load_compressed_image(filename), **kwargs)
+
+    @property
+    def nbytes(self):
+        """The size of the texture and its mipmaps on the graphics card, in bytes."""
+        if not self.decoded:
+            return sum(len(data) for data in self.image.levels)
+        return sum(np.prod(_level_shape(self.width, self.height, level)) * 4 for level in range(len(self.image.levels)))
+
+    @property
+    def values(self):
+        """The image, decoded to a read-only (height x width x 4) uint8 array."""
+        if self.format.decoder is None:
+            raise ValueError("{} images can't be decoded on the CPU.".format(self.image.format))
+        values = self.format.decoder(self.image.levels[0], self.width, self.height)
+        values.setflags(write=False)
+        return values
+
+    @values.setter
+    def values(self, values):
+        raise TypeError("CompressedTextures can't be changed; make a Texture of the new values instead.")
+
+    def update(self, region, values):
+        raise TypeError("CompressedTextures can't be changed; make a Texture of the new values instead.")
+
+    def _genTex2D(self):
+        """Uploads the image and all of its mipmaps, decoding them first if needed."""
+        gl.glTexParameteri(self.target, gl.GL_TEXTURE_MAX_LEVEL, len(self.image.levels) - 1)
+        for level, data in enumerate(self.image.levels):
+            width, height = _level_shape(self.width, self.height, level)
+            if self.decoded:
+                pixels = self.format.decoder(data, width, height)
+                gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 4)
+                gl.glTexImage2D(self.target0, level, self.internal_fmt, width, height, 0, gl.GL_RGBA,
+                                gl.GL_UNSIGNED_BYTE, pixels.ctypes.data)
+            else:
+                gl.glCompressedTexImage2D(self.target0, level, self.internal_fmt, width, height, 0, len(data), data)
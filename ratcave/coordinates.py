@@ -3,7 +3,13 @@ from abc import ABCMeta, abstractmethod
 from ratcave.utils.observers import IterObservable
 import itertools
 from operator import setitem
-from scipy.spatial.transform import Rotation as R
+
+
+def _scipy_rotation():
+    """Returns scipy's Rotation class, imported when first needed because scipy.spatial is slow to import."""
+    from scipy.spatial.transform import Rotation
+    return Rotation
+
 
 class Coordinates(IterObservable):
 
@@ -88,11 +94,11 @@ class RotationEulerRadians(RotationEuler):
         return RotationEulerDegrees(*np.degrees(self._array), axes=self.axes)
 
     def to_quaternion(self):
-        return RotationQuaternion(*R.from_euler(self._axes[1:],self._array,degrees=False).as_quat())
+        return RotationQuaternion(*_scipy_rotation().from_euler(self._axes[1:],self._array,degrees=False).as_quat())
 
     def to_matrix(self):
         mat = np.eye(4)
-        mat[:3, :3] = R.from_euler(self.axes[1:],self._array,degrees=False).as_dcm() # scipy as_matrix() not available
+        mat[:3, :3] = _scipy_rotation().from_euler(self.axes[1:],self._array,degrees=False).as_dcm() # scipy as_matrix() not available
         return mat
 
     def to_euler(self, units='rad'):
@@ -104,7 +110,7 @@ class RotationEulerRadians(RotationEuler):
 
     @classmethod
     def from_matrix(cls, matrix, axes='rxyz'):
-        coords = R.from_matrix(matrix[:3, :3]).as_euler(axes[1:], degrees=False)
+        coords = _scipy_rotation().from_matrix(matrix[:3, :3]).as_euler(axes[1:], degrees=False)
         return cls(*coords)
 
 
@@ -127,7 +133,7 @@ class RotationEulerDegrees(RotationEuler):
 
     @classmethod
     def from_matrix(cls, matrix, axes='rxyz'):
-        coords = R.from_matrix(matrix[:3, :3]).as_euler(axes[1:], degrees=True)
+        coords = _scipy_rotation().from_matrix(matrix[:3, :3]).as_euler(axes[1:], degrees=True)
         return cls(*coords)
 
 class RotationQuaternion(RotationBase, Coordinates):
@@ -146,11 +152,11 @@ class RotationQuaternion(RotationBase, Coordinates):
 
     def to_matrix(self):
         mat = np.eye(4, 4)
-        mat[:3, :3] = R.from_quat(self).as_matrix()
+        mat[:3, :3] = _scipy_rotation().from_quat(self).as_matrix()
         return mat
 
     def to_euler(self, units='rad'):
-        euler_data = R.from_quat(self).as_euler(axes='xyz',degrees=False)
+        euler_data = _scipy_rotation().from_quat(self).as_euler(axes='xyz',degrees=False)
         assert units.lower() in ['rad', 'deg']
         if units.lower() == 'rad':
             return RotationEulerRadians(*euler_data)
@@ -159,7 +165,7 @@ class RotationQuaternion(RotationBase, Coordinates):
 
     @classmethod
     def from_matrix(cls, matrix):
-        return cls(*R.from_matrix(matrix[:3, :3]).as_quat())
+        return cls(*_scipy_rotation().from_matrix(matrix[:3, :3]).as_quat())
 
 class Translation(Coordinates):
 
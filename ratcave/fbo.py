@@ -1,42 +1,91 @@
-from .utils import BindingContextMixin, create_opengl_object, get_viewport, Viewport
-from .texture import DepthTexture, RenderBuffer
+import time
+from contextlib import ExitStack, contextmanager
+from functools import partial
+import numpy as np
+from .utils import BindingContextMixin, GLResourceMixin, create_opengl_object, delete_opengl_object, get_viewport, Viewport
+from .texture import Texture, DepthTexture, RenderBuffer, PixelPackBuffer, row_alignment
 
 from . import gl
 
 
-class FBO(BindingContextMixin):
+class FBO(BindingContextMixin, GLResourceMixin):
 
     target = gl.GL_FRAMEBUFFER_EXT
 
-    def __init__(self, texture, *args, **kwargs):
-        """A Framebuffer object, which when bound redirects draws to its texture.  This is useful for deferred rendering."""
+    def __init__(self, texture=None, *args, color=None, depth=None, **kwargs):
+        """
+        A Framebuffer object, which when bound redirects draws to its textures.  This is useful for deferred rendering.
+
+        Either give a single texture (a color Texture, which gets a depth RenderBuffer, or a DepthTexture alone), or
+        several color textures that are all drawn to at once (multiple render targets), each from the fragment
+        shader's output of the same index (gl_FragData[index]).
+
+        Args:
+          - texture (Texture): The texture to draw to.
+          - color (list): Color Textures to draw to, in attachment order (up to GL_MAX_DRAW_BUFFERS, at least 8).
+          - depth (DepthTexture): The depth texture, which can then be read by later passes.  If None, color textures
+            get a depth RenderBuffer.
+        """
 
         super(FBO, self).__init__(*args, **kwargs)
+        if texture is not None:
+            if color is not None or depth is not None:
+                raise ValueError("Give either a texture, or color and depth textures, not both.")
+            color, depth = ([], texture) if isinstance(texture, DepthTexture) else ([texture], None)
+        self.textures = list(color or [])
+        self.depth_texture = depth
+        if not self.textures and depth is None:
+            raise ValueError("An FBO needs at least one texture to draw to.")
+        if any(isinstance(tex, DepthTexture) for tex in self.textures):
+            raise ValueError("DepthTextures can't be color attachments; give them as the depth texture.")
+        self.texture = self.textures[0] if self.textures else depth
+        if any((tex.width, tex.height) != (self.texture.width, self.texture.height) for tex in self.textures + [depth]
+               if tex is not None):
+            raise ValueError("All of an FBO's textures must be the same size.")
+
         self.id = create_opengl_object(gl.glGenFramebuffersEXT)
+        self._track_gl_object(partial(delete_opengl_object, gl.glDeleteFramebuffersEXT, self.id))
+        self._add_to_scopes()
         self._old_viewport = get_viewport()
-        self.texture = texture
-        self.renderbuffer = RenderBuffer(texture.width, texture.height) if not isinstance(texture, DepthTexture) else None
+        self._readback_buffers = []  # PixelPackBuffers not in use by a ReadbackFuture.
+        self.renderbuffer = RenderBuffer(self.texture.width, self.texture.height) if depth is None else None
 
         with self:
 
             # Attach the textures to the FBO
-            self.texture.attach_to_fbo()
+            for index, tex in enumerate(self.textures):
+                tex.attach_to_fbo(index)
+            if depth is not None:
+                depth.attach_to_fbo()
             if self.renderbuffer:
                 self.renderbuffer.attach_to_fbo()
 
-            # Set Draw and Read locations for the FBO (currently, just turn it off if not doing any color stuff)
-            if isinstance(texture, DepthTexture):
+            # Set Draw and Read locations for the FBO (turned off if not doing any color stuff)
+            if not self.textures:
                 gl.glDrawBuffer(gl.GL_NONE)  # No color in this buffer
                 gl.glReadBuffer(gl.GL_NONE)
+            elif len(self.textures) > 1:
+                attachments = [gl.GL_COLOR_ATTACHMENT0_EXT + index for index in range(len(self.textures))]
+                gl.glDrawBuffers(len(attachments), (gl.GLenum * len(attachments))(*attachments))
 
         # check FBO status (warning appears for debugging)
         FBOstatus = gl.glCheckFramebufferStatusEXT(gl.GL_FRAMEBUFFER_EXT)
         if FBOstatus != gl.GL_FRAMEBUFFER_COMPLETE_EXT:
             raise BufferError("GL_FRAMEBUFFER_COMPLETE failed, CANNOT use FBO.\n{0}\n".format(FBOstatus))
 
+    def release(self):
+        """Deletes the framebuffer (and its depth renderbuffer) from the graphics card.  The texture is not released."""
+        super(FBO, self).release()
+        if self.renderbuffer:
+            self.renderbuffer.release()
+        for buffer in self._readback_buffers:
+            buffer.release()
+
     def bind(self):
         """Bind the FBO.  Anything drawn afterward will be stored in the FBO's texture."""
         # This is called simply to deal with anything that might be currently bound (for example, Pyglet objects),
+        # on unit 0, which texture_units never gives to a Texture, so it still knows what's bound on the others.
+        gl.glActiveTexture(gl.GL_TEXTURE0)
         gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
 
         # Store current viewport size for later
@@ -49,11 +98,171 @@ class FBO(BindingContextMixin):
     def unbind(self):
         """Unbind the FBO."""
         # Unbind the FBO
-        if self.texture.mipmap:
-            with self.texture:
-                self.texture.generate_mipmap()
+        for texture in self.textures or [self.texture]:
+            if texture.mipmap:
+                with texture:
+                    texture.generate_mipmap()
 
         gl.glBindFramebufferEXT(gl.GL_FRAMEBUFFER_EXT, 0)
 
         # Restore the old viewport size
-        gl.glViewport(*self._old_viewport)
\ No newline at end of file
+        gl.glViewport(*self._old_viewport)
+
+    def read_async(self, index=0):
+        """
+        Starts copying the FBO's texture (or its index'th color texture) into a pixel buffer, without waiting for
+        drawing to finish.  Must be called from the OpenGL thread, after drawing.
+
+        Returns:
+            ReadbackFuture, whose result() is a (height x width x channels) array, with rows from bottom to top like
+            Texture.values.  Its pixel buffer is reused by later readbacks once it's released or garbage-collected.
+        """
+        texture = self.textures[index] if self.textures else self.texture
+        if isinstance(texture, DepthTexture):
+            pixel_fmt, pixel_type, dtype, channels = gl.GL_DEPTH_COMPONENT, gl.GL_FLOAT, np.dtype(np.float32), 1
+        else:
+            pixel_fmt, pixel_type, dtype, channels = texture.pixel_fmt, texture.pixel_type, texture.dtype, texture.channels
+        shape = texture.height, texture.width, channels
+        nbytes = texture.height * texture.width * channels * dtype.itemsize
+        buffer = next((buffer for buffer in self._readback_buffers if buffer.nbytes == nbytes), None)
+        if buffer is not None:
+            self._readback_buffers.remove(buffer)
+        else:
+            buffer = PixelPackBuffer(nbytes)  # Pooled per size, since color textures can have different pixel types.
+
+        previous = (gl.GLint * 1)()
+        gl.glGetIntegerv(gl.GL_READ_FRAMEBUFFER_BINDING_EXT, previous)
+        gl.glBindFramebufferEXT(gl.GL_READ_FRAMEBUFFER_EXT, self.id)
+        if self.textures:
+            gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0_EXT + index)
+        with buffer:
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, row_alignment(nbytes // texture.height))
+            gl.glReadPixels(0, 0, texture.width, texture.height, pixel_fmt, pixel_type, 0)
+        gl.glBindFramebufferEXT(gl.GL_READ_FRAMEBUFFER_EXT, previous[0])
+        fence = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        return ReadbackFuture(buffer, fence, shape, dtype, on_release=self._readback_buffers.append)
+
+
+class GBuffer(FBO):
+
+    def __init__(self, width=1024, height=1024, **kwargs):
+        """
+        An FBO that collects the scene's world positions, normals, albedo (diffuse color), and depth in one pass, for
+        deferred lighting and post-processing passes to read.  Draw the scene into it once per frame with
+        resources.gbuffer_shader (or any shader writing the same gl_FragData outputs), then draw each pass inside
+        bind_textures(), where the textures are the 'PositionMap', 'NormalMap', 'AlbedoMap', and 'SceneDepthMap'
+        uniforms.
+
+        Example::
+
+            with resources.gbuffer_shader, gbuffer:
+                rc.clear_color(0, 0, 0)
+                window.clear()
+                scene.draw()
+            with lighting_shader, gbuffer.bind_textures():
+                quad.draw()
+        """
+        self.position = Texture(width=width, height=height, dtype=np.float32, name='PositionMap')
+        self.normal = Texture(width=width, height=height, dtype=np.float16, name='NormalMap')
+        self.albedo = Texture(width=width, height=height, name='AlbedoMap')
+        self.depth = DepthTexture(width=width, height=height, name='SceneDepthMap')
+        super(GBuffer, self).__init__(color=[self.position, self.normal, self.albedo], depth=self.depth, **kwargs)
+
+    @contextmanager
+    def bind_textures(self):
+        """Binds all of the G-buffer's textures, for a pass that reads them."""
+        with ExitStack() as stack:
+            for texture in self.textures + [self.depth]:
+                stack.enter_context(texture)
+            yield self
+
+    def release(self):
+        """Deletes the framebuffer and its textures from the graphics card."""
+        super(GBuffer, self).release()
+        for texture in self.textures + [self.depth]:
+            texture.release()
+
+
+def _finish_readback(buffer, state, on_release):
+    """Unmaps a readback's pixel buffer, deletes its fence, and gives the buffer back to its FBO."""
+    if state['mapped'] is not None:
+        buffer.unmap()
+        state['mapped'] = None
+    if state['fence'] is not None:
+        gl.glDeleteSync(state['fence'])
+        state['fence'] = None
+    on_release(buffer)
+
+
+class ReadbackFuture(GLResourceMixin):
+
+    def __init__(self, buffer, fence, shape, dtype, on_release):
+        """
+        The pixels being copied by FBO.read_async().  Its methods must be called from the OpenGL thread.
+
+        The pixel buffer goes back to the FBO when release() or result() is called, or once the future is
+        garbage-collected (on the next delete_pending(), like other OpenGL objects).
+        """
+        self.buffer = buffer
+        self.shape = shape
+        self.dtype = dtype
+        self._state = {'fence': fence, 'mapped': None}  # Shared with _finish_readback(), which mustn't reference self.
+        self._result = None
+        self._track_gl_object(partial(_finish_readback, buffer, self._state, on_release))
+
+    def _check_fence(self, flags, timeout):
+        status = gl.glClientWaitSync(self._state['fence'], flags, int(timeout * 1e9))
+        if status == gl.GL_WAIT_FAILED:
+            raise RuntimeError("Waiting for the framebuffer readback failed.")
+        if status in (gl.GL_ALREADY_SIGNALED, gl.GL_CONDITION_SATISFIED):
+            gl.glDeleteSync(self._state['fence'])
+            self._state['fence'] = None
+        return self._state['fence'] is None
+
+    def done(self):
+        """Returns True if the pixels have been copied, without waiting."""
+        return self._state['fence'] is None or self._check_fence(0, 0)
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds (or until they are, if None) for the pixels to be copied.  Returns True if they
+        were."""
+        if self._state['fence'] is None:
+            return True
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        flags = gl.GL_SYNC_FLUSH_COMMANDS_BIT  # Makes sure the readback was sent to the graphics card.
+        while not self._check_fence(flags, .1 if deadline is None else max(0, min(.1, deadline - time.perf_counter()))):
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            flags = 0
+        return True
+
+    def result(self, timeout=None):
+        """Returns a copy of the pixels, waiting for them if needed, and gives the pixel buffer back to the FBO."""
+        if self._result is None:
+            if self.buffer is None:
+                raise RuntimeError("This readback was released before its result was read.")
+            if not self.wait(timeout):
+                raise TimeoutError("The framebuffer readback didn't finish within {} seconds.".format(timeout))
+            if self._state['mapped'] is not None:
+                self._result = np.array(self._state['mapped'])
+            else:
+                self._result = np.empty(self.shape, self.dtype)
+                self.buffer.read(self._result)
+            self.release()
+        return self._result
+
+    def map(self, timeout=None):
+        """Returns the pixels as a read-only array of the mapped pixel buffer, without copying them.  The array can be
+        read from any thread, until release() is called."""
+        if self._state['mapped'] is None:
+            if not self.wait(timeout):
+                raise TimeoutError("The framebuffer readback didn't finish within {} seconds.".format(timeout))
+            mapped = self.buffer.map(gl.GL_MAP_READ_BIT).view(self.dtype).reshape(self.shape)
+            mapped.setflags(write=False)
+            self._state['mapped'] = mapped
+        return self._state['mapped']
+
+    def release(self):
+        """Unmaps the pixel buffer, and gives it back to the FBO for its next readback."""
+        super(ReadbackFuture, self).release()
+        self.buffer = None
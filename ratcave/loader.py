@@ -0,0 +1,195 @@
+"""
+This module contains the AssetLoader, which prepares Meshes and Textures in the background and uploads them to the
+graphics card a little at a time, so loading doesn't cause dropped frames.
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+
+import numpy as np
+from wavefront_reader import read_wavefront
+
+from .mesh import Mesh, calculate_normals
+from .texture import Texture
+from .vertex import reindex_vertices
+from .wavefront import WavefrontReader
+
+
+read_wavefront_cached = lru_cache(maxsize=16)(read_wavefront)
+
+
+def prepare_wavefront_body(file_name, body_name):
+    """
+    Does the CPU-side work of building a Mesh from a wavefront file: parsing, generating missing normals and
+    texture coordinates, reindexing, and decoding the material's images.
+
+    Returns:
+        dict with 'arrays', 'indices', 'material', and 'images' (image arrays keyed by filename).
+    """
+    body = read_wavefront_cached(file_name)[body_name]
+    vertices = np.array(body['v'], dtype=np.float32)
+    normals = body['vn'] if 'vn' in body and len(body['vn']) else calculate_normals(vertices)
+    texcoords = body['vt'] if 'vt' in body and len(body['vt']) else np.zeros((vertices.shape[0], 2), dtype=np.float32)
+    arrays, indices = reindex_vertices((vertices, np.array(normals, dtype=np.float32), np.array(texcoords, dtype=np.float32)))
+
+    material = body.get('material', {})
+    images = {value: Texture.load_image(value) for key, value in material.items() if key == 'map_Kd'}
+    return {'arrays': arrays, 'indices': indices, 'material': material, 'images': images}
+
+
+def forward_future(source, target):
+    """Gives the target Future the result (or exception) of the source Future, following results that are Futures."""
+    def on_done(future):
+        if future.exception() is not None:
+            target.set_exception(future.exception())
+        elif isinstance(future.result(), Future):
+            future.result().add_done_callback(on_done)
+        else:
+            target.set_result(future.result())
+    source.add_done_callback(on_done)
+
+
+class AssetLoader(object):
+
+    def __init__(self, max_workers=None, processes=False, frame_budget=.004):
+        """
+        Loads Meshes and Textures without stalling the render loop.
+
+        CPU-side preparation (parsing, reindexing, normal generation, image decoding) runs in a thread pool (or a process
+        pool, if 'processes' is True).  The OpenGL work that follows is queued, and is done by process_uploads(), which
+        should be called once per frame from the thread that owns the OpenGL context.
+
+        Example::
+
+            loader = AssetLoader()
+            future = loader.load_mesh(obj_filename, 'Monkey', position=(0, 0, -2))
+
+            @window.event
+            def on_draw():
+                loader.process_uploads()  # Uses at most frame_budget seconds.
+                if future.done():
+                    scene.meshes.append(future.result())
+
+        Args:
+            max_workers (int): the number of background workers.
+            processes (bool): whether to use processes instead of threads for the CPU work.
+            frame_budget (float): the default time (in seconds) process_uploads() may spend uploading, per call.
+        """
+        self.frame_budget = frame_budget
+        self.textures = {}
+        executor_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self._executor = executor_cls(max_workers=max_workers)
+        self._uploads = deque()
+        self._working = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @property
+    def pending_uploads(self):
+        """The number of OpenGL jobs waiting for process_uploads()."""
+        return len(self._uploads)
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) in the background.  Returns a Future."""
+        return self._track(self._executor.submit(fn, *args, **kwargs))
+
+    def _track(self, future):
+        with self._lock:
+            self._working.add(future)
+        future.add_done_callback(self._discard_working)
+        return future
+
+    def _discard_working(self, future):
+        with self._lock:
+            self._working.discard(future)
+
+    def schedule_upload(self, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) to be run by process_uploads() on the OpenGL thread.  Returns a Future."""
+        future = Future()
+        self._uploads.append((future, fn, args, kwargs))
+        return future
+
+    def process_uploads(self, budget=None):
+        """
+        Runs queued OpenGL jobs until 'budget' seconds (default: frame_budget) have passed.  At least one job is run per
+        call, so loading always progresses.  Must be called from the thread that owns the OpenGL context.
+
+        Returns:
+            int: the number of jobs run.
+        """
+        budget = self.frame_budget if budget is None else budget
+        start = time.perf_counter()
+        n_jobs = 0
+        while self._uploads and (n_jobs == 0 or time.perf_counter() - start < budget):
+            future, fn, args, kwargs = self._uploads.popleft()
+            n_jobs += 1
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as exc:
+                future.set_exception(exc)
+        return n_jobs
+
+    def finish(self):
+        """Waits for all background work and runs all queued OpenGL jobs, however long it takes."""
+        while True:
+            self.process_uploads(budget=float('inf'))
+            with self._lock:
+                working = set(self._working)
+            if not working and not self._uploads:
+                return
+            wait(working, timeout=.001, return_when=FIRST_COMPLETED)
+
+    def shutdown(self):
+        """Stops the background workers, after they finish their current work."""
+        self._executor.shutdown(wait=True)
+
+    def _chain(self, cpu_future, gl_fn, *args):
+        """Returns a Future for gl_fn(cpu_result, *args), run on the OpenGL thread once cpu_future is done."""
+        result = self._track(Future())
+
+        def on_cpu_done(future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                forward_future(self.schedule_upload(gl_fn, future.result(), *args), result)
+
+        cpu_future.add_done_callback(on_cpu_done)
+        return result
+
+    def load_texture(self, img_filename, **kwargs):
+        """Decodes an image in the background and uploads it as a Texture.  Returns a Future for the Texture."""
+        return self._chain(self.submit(Texture.load_image, img_filename), self._create_texture, img_filename, kwargs)
+
+    def _create_texture(self, values, img_filename, kwargs):
+        if img_filename not in self.textures:
+            self.textures[img_filename] = Texture(values=values, **kwargs)
+        return self.textures[img_filename]
+
+    def load_mesh(self, file_name, body_name, **kwargs):
+        """
+        Builds a Mesh from a wavefront (.obj) file in the background, and uploads its arrays and textures.
+        Takes all keyword arguments that Mesh takes.  Returns a Future for the Mesh.
+        """
+        return self._chain(self.submit(prepare_wavefront_body, file_name, body_name), self._create_mesh, kwargs)
+
+    def _create_mesh(self, data, kwargs):
+        # Textures and the vertex array are uploaded in separate jobs, so each fits in a frame's budget more easily.
+        for img_filename, values in data['images'].items():
+            self.schedule_upload(self._create_texture, values, img_filename, {})
+        mesh = Mesh(arrays=data['arrays'], indices=data['indices'], **kwargs)
+        return self.schedule_upload(self._finish_mesh, mesh, data['material'])
+
+    def _finish_mesh(self, mesh, material):
+        WavefrontReader.apply_material(mesh, material, self.textures)
+        mesh.geometry.load_vertex_array()
+        return mesh
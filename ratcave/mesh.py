@@ -5,9 +5,9 @@ This module contains the Mesh and EmptyEntity classes.
 import pickle
 import numpy as np
 from .utils import NameLabelMixin
-from . import physical, shader, gl
+from . import physical, shader, gl, bounds
 from .texture import Texture
-from .vertex import VertexArray, pairwise
+from .vertex import Geometry, GeometryArrayView, pairwise
 from copy import deepcopy
 
 
@@ -43,10 +43,11 @@ class EmptyEntity(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMi
         pass
 
 
-class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, VertexArray):
+class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin):
 
-    def __init__(self, arrays, textures=(), mean_center=True,
-                 gl_states=(), point_size=15, visible=True, **kwargs):
+    def __init__(self, arrays=None, textures=(), mean_center=True, gl_states=(), point_size=15, visible=True,
+                 indices=None, drawmode=gl.GL_TRIANGLES, reindex=True, formats=None, geometry=None, residency='keep',
+                 **kwargs):
         """
         Returns a Mesh object, containing the position, rotation, and color info of an OpenGL Mesh.
 
@@ -63,25 +64,34 @@ class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, Ve
             drawmode: specifies the OpenGL draw mode
             point_size (int):
             visible (bool): whether the Mesh is available to be rendered.  To make hidden (invisible), set to False.
+            formats (tuple): the attribute format of each array on the graphics card, to save graphics memory.  For
+                example, ratcave.vertex.compact_formats.  Defaults to 32-bit floats.
+            geometry (Geometry): an existing (possibly shared) Geometry to draw, used instead of arrays.
+            residency (str): whether to 'keep' the arrays in memory after uploading them to the graphics card, 'evict'
+                them (reading them back when accessed), or move them to a 'memmap' file.  Saves memory for large Meshes.
 
         Returns:
             Mesh instance
         """
-        super(Mesh, self).__init__(arrays=arrays, **kwargs)
+        super(Mesh, self).__init__(**kwargs)
+        self._geometry = None
+        self._transform_cache = {}
         self.reset_uniforms()
 
-        # Mean-center vertices and move position to vertex mean.
-        vertex_mean = self.vertices.mean(axis=0) #if not self.indices is None else self.vertices[self.indices, :].mean(axis=0)
-
-        if mean_center:
-            self.arrays[0] -= vertex_mean
-        if 'position' in kwargs:
-            self.position.xyz = kwargs['position']
-        elif mean_center:
-            self.position.xyz = vertex_mean
+        if geometry is None:
+            geometry = Geometry(arrays=arrays, indices=indices, drawmode=drawmode, reindex=reindex, formats=formats,
+                                residency=residency)
+
+            # Mean-center vertices and move position to vertex mean.
+            vertex_mean = geometry.vertices.mean(axis=0)
+            if mean_center:
+                geometry.arrays[0] -= vertex_mean
+            if 'position' not in kwargs and mean_center:
+                self.position.xyz = vertex_mean
+        self.geometry = geometry
         self._mean_center = mean_center
-        # self.position.xyz = vertex_mean if not 'position' in kwargs else kwargs['position']
 
+        self.drawmode = drawmode
         self.textures = list(textures)
         self.gl_states = gl_states
         self.point_size = point_size
@@ -91,10 +101,20 @@ class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, Ve
         return "<Mesh(name='{self.name}', position_rel={self.position}, position_glob={self.position_global}, rotation={self.rotation})".format(
             self=self)
 
-    def copy(self):
-        """Returns a copy of the Mesh."""
-        return Mesh(arrays=deepcopy([arr.copy() for arr in [self.vertices, self.normals, self.texcoords]]),
-                    textures=self.textures, mean_center=deepcopy(self._mean_center),
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        geometry, self._geometry = self._geometry, None
+        self.geometry = geometry
+
+    def copy(self, share_geometry=True):
+        """
+        Returns a copy of the Mesh.
+
+        By default, the copy shares this Mesh's Geometry (its arrays and graphics card buffers); the arrays are only
+        copied once either Mesh modifies them.  If share_geometry is False, the copy gets its own Geometry immediately.
+        """
+        geometry = self.geometry if share_geometry else self.geometry.copy()
+        return Mesh(geometry=geometry, textures=self.textures, mean_center=deepcopy(self._mean_center),
                     position=self.position.xyz, rotation=self.rotation.__class__(*self.rotation[:]),
                     scale=self.scale.xyz,
                     drawmode=self.drawmode, point_size=self.point_size, visible=self.visible,
@@ -110,7 +130,7 @@ class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, Ve
         """Loads and Returns a Mesh from a pickle file, given a filename."""
         with open(filename, 'rb') as f:
             mesh = pickle.load(f)
-            mesh2 = mesh.copy()
+            mesh2 = mesh.copy(share_geometry=False)
         return mesh2
 
     @classmethod
@@ -127,42 +147,115 @@ class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, Ve
         self.uniforms['model_matrix'] = self.model_matrix_global.view()
         self.uniforms['normal_matrix'] = self.normal_matrix_global.view()
 
+    @property
+    def geometry(self):
+        """The Geometry (vertex arrays, indices, and their buffers) drawn by this Mesh.  It may be shared with copies."""
+        return self._geometry
+
+    @geometry.setter
+    def geometry(self, value):
+        if not isinstance(value, Geometry):
+            raise TypeError("Mesh.geometry must be a Geometry.")
+        if self._geometry is not None:
+            self._geometry.remove_user(self)
+        value.add_user(self)
+        self._geometry = value
+        self._transform_cache = {}
+
+        # Link the uniform that lets shaders decode the Geometry's positions.  Its normals' format is a shader feature.
+        if 'position_dequantization' in self.uniforms:
+            del self.uniforms['position_dequantization']
+        self.uniforms['position_dequantization'] = value.dequantization_matrix.view()
+
+    def _unshare_geometry(self):
+        """Gives this Mesh its own copy of its Geometry, if it is shared with other Meshes."""
+        if self.geometry.refcount > 1:
+            self.geometry = self.geometry.copy()
+
+    def _get_array(self, index):
+        return GeometryArrayView.from_mesh(self, index)
+
+    def _set_array(self, index, value):
+        self._unshare_geometry()
+        self.geometry._set_array(index, value)
+
+    @property
+    def arrays(self):
+        """The Geometry's list of arrays.  Writing to these directly changes every Mesh sharing the Geometry."""
+        return self.geometry.arrays
+
+    @property
+    def indices(self):
+        return self.geometry.indices
+
     @property
     def vertices(self):
         """Mesh vertices, centered around 0,0,0."""
-        return self.arrays[0].view()
+        return self._get_array(0)
 
     @vertices.setter
     def vertices(self, value):
-        self.arrays[0] = value
+        self._set_array(0, value)
 
     @property
     def normals(self):
         """Mesh normals array."""
-        return self.arrays[1].view()
+        return self._get_array(1)
 
     @normals.setter
     def normals(self, value):
-        self.arrays[1] = value
+        self._set_array(1, value)
 
     @property
     def texcoords(self):
         """UV coordinates"""
-        return self.arrays[2].view()
+        return self._get_array(2)
 
     @texcoords.setter
     def texcoords(self, value):
-        self.arrays[2] = value
+        self._set_array(2, value)
+
+    def _transformed_vertices(self, space):
+        """Returns the (read-only) vertices in the given space, recalculated only when the Mesh or its vertices change."""
+        key = self.transform_version, self.geometry.version
+        cached_key, vertices = self._transform_cache.get(space, (None, None))
+        if cached_key != key:
+            vertices = self.transform_points(self.vertices, space=space)
+            vertices.flags.writeable = False
+            self._transform_cache[space] = key, vertices
+        return vertices
 
     @property
     def vertices_local(self):
         """Vertex position, in local coordinate space (modified by model_matrix)"""
-        return np.dot(self.model_matrix, np.append(self.vertices, np.ones(self.vertices.shape[0], 1), axis=1))[:3]
+        return self._transformed_vertices('local')
 
     @property
     def vertices_global(self):
-        """Vertex position, in world coordinate space (modified by model_matrix)"""
-        return np.dot(self.model_matrix_global, np.append(self.vertices, np.ones(self.vertices.shape[0], 1), axis=1))[:3]
+        """Vertex position, in world coordinate space (modified by model_matrix_global)"""
+        return self._transformed_vertices('global')
+
+    def _cached_world_bounds(self, name, calculate):
+        key = self.transform_version, self.geometry.version
+        cached_key, value = self._transform_cache.get(name, (None, None))
+        if cached_key != key:
+            value = calculate(self.model_matrix_global)
+            self._transform_cache[name] = key, value
+        return value
+
+    @property
+    def aabb_global(self):
+        """The (2 x 3) axis-aligned bounding box of the Mesh in world coordinates, from its Geometry's local box."""
+        return self._cached_world_bounds('aabb', lambda matrix: bounds.transform_aabbs(matrix, self.geometry.aabb))
+
+    @property
+    def bounding_sphere_global(self):
+        """The BoundingSphere (center, radius) of the Mesh in world coordinates."""
+        def calculate(matrix):
+            sphere = self.geometry.bounding_sphere
+            center, radius = bounds.transform_spheres(matrix, sphere.center, sphere.radius)
+            return bounds.BoundingSphere(center=center, radius=float(radius))
+        return self._cached_world_bounds('sphere', calculate)
 
     @classmethod
     def from_incomplete_data(cls, vertices, normals=(), texcoords=(), **kwargs):
@@ -173,23 +266,53 @@ class Mesh(shader.HasUniformsUpdater, physical.PhysicalGraph, NameLabelMixin, Ve
                                                                                                  dtype=np.float32)
         return cls(arrays=(vertices, normals, texcoords), **kwargs)
 
+    @property
+    def shader_features(self):
+        """The features a Shader's variant is chosen by when drawing the Mesh: 'HAS_<NAME>' for each of its Textures
+        (e.g. 'HAS_TEXTUREMAP'), 'FLAT_SHADING' if its 'flat_shading' uniform is set, and 'OCTAHEDRAL_NORMALS' if its
+        Geometry's normals are octahedral-encoded."""
+        features = {'HAS_' + texture.name.upper() for texture in self.textures}
+        formats = self.geometry.formats
+        if len(formats) > 1 and formats[1] == 'octahedral':
+            features.add('OCTAHEDRAL_NORMALS')
+        flat_shading = self.uniforms.get('flat_shading')
+        if flat_shading is not None and flat_shading.any():
+            features.add('FLAT_SHADING')
+        return features
+
     def draw(self):
         """ Draw the Mesh if it's visible, from the perspective of the camera and lit by the light. The function sends the uniforms"""
-        if not self._loaded:
-            self.load_vertex_array()
+        self.geometry.upload()
 
         if self.visible:
             if self.drawmode == gl.GL_POINTS:
                 gl.glPointSize(self.point_size)
 
-            for texture in self.textures:
-                texture.bind()
+            bound_shader = shader.Shader._bound
+            if bound_shader is not None and bound_shader.features:
+                with bound_shader.bind_variant(self.shader_features):
+                    self._draw_textured()
+            else:
+                self._draw_textured()
+
+    def _draw_textured(self):
+        for texture in self.textures:
+            texture.bind()
+
+        self.uniforms.send()
+        self._draw_geometry()
+
+        for texture in self.textures:
+            texture.unbind()
 
-            self.uniforms.send()
-            super(Mesh, self).draw()
+    def release(self):
+        """Deletes the Mesh's vertex arrays from the graphics card, unless its Geometry is shared with other Meshes.
+        Textures are not released, as they are often shared between Meshes."""
+        if self.geometry.refcount <= 1:
+            self.geometry.release()
 
-            for texture in self.textures:
-                texture.unbind()
+    def _draw_geometry(self):
+        self.geometry.draw(drawmode=self.drawmode)
 
     @property
     def collider(self):
@@ -35,6 +35,7 @@ class Physical(AutoRegisterObserver):
         self._model_matrix = np.identity(4, dtype=np.float32)
         self._normal_matrix = np.identity(4, dtype=np.float32)
         self._view_matrix = np.identity(4, dtype=np.float32)
+        self._transform_version = 0
 
     @property
     def position(self):
@@ -139,6 +140,34 @@ class Physical(AutoRegisterObserver):
         self.view_matrix = np.linalg.inv(self._model_matrix)
         self.model_matrix = np.dot(self._model_matrix, self.scale.to_matrix())
         self.normal_matrix = np.linalg.inv(self._model_matrix.T)
+        self._transform_version += 1
+
+    @property
+    def transform_version(self):
+        """A counter that increases whenever the transform matrices change, for caching values calculated from them."""
+        self.update()
+        return self._transform_version
+
+    def _space_matrix(self, space):
+        if space not in ('local', 'global'):
+            raise ValueError("space must be 'local' or 'global', not '{}'.".format(space))
+        return self.model_matrix
+
+    def transform_points(self, points, space='global'):
+        """
+        Returns points in this object's coordinates transformed to its parent's coordinates (space='local') or to world
+        coordinates (space='global').
+
+        Args:
+            points (array): an (N x 3) array of points, or a single xyz point.
+        """
+        matrix = self._space_matrix(space)
+        return np.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
+
+    def inverse_transform_points(self, points, space='global'):
+        """Returns points in parent (space='local') or world (space='global') coordinates transformed to this object's coordinates."""
+        matrix = np.linalg.inv(self._space_matrix(space))
+        return np.dot(points, matrix[:3, :3].T) + matrix[:3, 3]
 
 
 class PhysicalGraph(Physical, SceneGraph):
@@ -193,6 +222,10 @@ class PhysicalGraph(Physical, SceneGraph):
         self.normal_matrix_global = nn_pg.dot(nn_t).dot(nn)
         self.view_matrix_global = np.linalg.inv(self._model_matrix_global)
 
+    def _space_matrix(self, space):
+        matrix = super(PhysicalGraph, self)._space_matrix(space)
+        return self.model_matrix_global if space == 'global' else matrix
+
     def notify(self):
         super(Physical, self).notify()
         for child in self.children:
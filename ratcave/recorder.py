@@ -0,0 +1,152 @@
+"""
+This module contains the FrameRecorder, which saves every frame drawn to an FBO from a background thread, reading the
+frames back through pixel buffers so the render loop doesn't wait for the graphics card.
+"""
+
+import queue
+import struct
+import threading
+from collections import deque
+
+import numpy as np
+import pyglet
+
+_npy_header_size = 128  # Fixed, so the header can be rewritten with the number of frames once recording ends.
+_image_formats = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+
+def npy_header(shape, dtype, size=_npy_header_size):
+    """Returns a .npy (version 1.0) file header of the given size, in bytes."""
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+    header = header.ljust(size - 11) + '\n'
+    if len(header) != size - 10:
+        raise ValueError("A header for shape {} doesn't fit in {} bytes.".format(shape, size))
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class FrameRecorder(object):
+
+    def __init__(self, fbo, path, latency=2, max_queued=8):
+        """
+        Records the frames drawn to an FBO.  Call capture() after each frame is drawn, and close() (or use it as a
+        context manager) when done.
+
+        Example::
+
+            with FrameRecorder(fbo, 'session.npy') as recorder:
+                for trial in trials:
+                    with fbo:
+                        scene.draw()
+                    recorder.capture()
+
+            frames = np.load('session.npy', mmap_mode='r')  # (n_frames x height x width x channels)
+
+        Args:
+          - fbo (FBO): The framebuffer to record.
+          - path (str): A '.npy' file, whose frames are stored with rows from bottom to top like Texture.values, or a
+            format string for numbered image files, like 'frames/{:06d}.png'.
+          - latency (int): How many frames a readback can wait for the graphics card before capture() waits for it.
+          - max_queued (int): How many frames can wait for the writer thread (each in its own pixel buffer) before
+            capture() waits for it.
+        """
+        self.npy = path.endswith('.npy')
+        if not self.npy and '{' not in path:
+            raise ValueError("path must be a '.npy' file or a format string for image files, not '{}'".format(path))
+        self.fbo = fbo
+        self.path = path
+        self.latency = latency
+        self.max_queued = max_queued
+        self.frames = 0
+        self.frames_written = 0
+        self._frame_shape = None
+        self._frame_dtype = None
+        self._file = open(path, 'wb') if self.npy else None
+        self._pending = deque()  # ReadbackFutures still being copied by the graphics card.
+        self._frames = queue.Queue()  # (future, mapped frame) pairs for the writer thread, ending with None.
+        self._written = queue.Queue()  # Futures whose frames were written, waiting to be released.
+        self._queued = 0  # Frames sent to the writer thread and not released yet.
+        self._error = None
+        self._thread = threading.Thread(target=self._write_frames, name='FrameRecorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def capture(self):
+        """Starts reading back the FBO's current frame.  Must be called from the OpenGL thread."""
+        self._check_error()
+        self._release_written()
+        while self._queued >= self.max_queued:
+            self._release(self._written.get())
+        self._pending.append(self.fbo.read_async())
+        self.frames += 1
+        while self._pending and (len(self._pending) > self.latency or self._pending[0].done()):
+            self._send(self._pending.popleft())
+
+    def close(self):
+        """Writes the remaining frames, and closes the file.  Must be called from the OpenGL thread."""
+        while self._pending:
+            self._send(self._pending.popleft())
+        self._frames.put(None)
+        self._thread.join()
+        self._release_written()
+        if self.npy:
+            if self._frame_shape is not None:
+                self._file.seek(0)
+                self._file.write(npy_header((self.frames_written,) + self._frame_shape, self._frame_dtype))
+            self._file.close()
+        self._check_error()
+
+    def _send(self, future):
+        self._frames.put((future, future.map()))
+        self._queued += 1
+
+    def _release(self, future):
+        future.release()
+        self._queued -= 1
+
+    def _release_written(self):
+        while True:
+            try:
+                future = self._written.get_nowait()
+            except queue.Empty:
+                return
+            self._release(future)
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _write_frames(self):
+        while True:
+            item = self._frames.get()
+            if item is None:
+                return
+            future, frame = item
+            try:
+                if self._error is None:
+                    self._write(frame)
+            except Exception as error:
+                self._error = error
+            self._written.put(future)
+
+    def _write(self, frame):
+        if self.npy:
+            if self._frame_shape is None:
+                self._frame_shape, self._frame_dtype = frame.shape, frame.dtype
+                self._file.write(npy_header((0,) + frame.shape, frame.dtype))
+            self._file.write(frame.data)
+        else:
+            height, width, channels = frame.shape
+            if frame.dtype != np.uint8 or channels not in _image_formats:
+                raise ValueError("Only uint8 frames with 1, 3, or 4 channels can be saved as images; use a .npy file.")
+            image = pyglet.image.ImageData(width, height, _image_formats[channels], frame.tobytes(),
+                                           pitch=width * channels)  # Rows from bottom to top, like the frame's.
+            image.save(self.path.format(self.frames_written))
+        self.frames_written += 1
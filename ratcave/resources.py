@@ -4,6 +4,7 @@ from glob import glob
 from .shader import Shader
 from .camera import Camera
 from .light import Light
+from .utils.lifecycle import ResourceScope, ResourceStats, delete_pending, live_objects
 
 """
 Here are some sample obj files for prototyping your app!
@@ -26,16 +27,33 @@ obj_grid3D = path.join(resource_path, 'grid3D.obj')
 # Shaders
 shader_path = path.join(path.split(__file__)[0], '..', 'shaders')
 
-if 'APPVEYOR' not in environ:
-    for dirname in os.listdir(shader_path):
-        if path.isdir(path.join(shader_path, dirname)):
-            vertname = glob(path.join(shader_path, dirname, '*.vert'))[0]
-            fragname = glob(path.join(shader_path, dirname, '*.frag'))[0]
-            globals()[dirname + '_shader'] = Shader.from_file(vert=path.join(shader_path, vertname),
-                                                              frag=path.join(shader_path, fragname),
-                                                              lazy=True)
+def _load_shader(dirname):
+    vertname = glob(path.join(shader_path, dirname, '*.vert'))[0]
+    fragname = glob(path.join(shader_path, dirname, '*.frag'))[0]
+    return Shader.from_file(vert=path.join(shader_path, vertname), frag=path.join(shader_path, fragname), lazy=True)
 
 
+def _shader_dirnames():
+    if 'APPVEYOR' in environ:
+        return []
+    return [dirname for dirname in os.listdir(shader_path) if path.isdir(path.join(shader_path, dirname))]
 
-default_camera = Camera()
-default_light = Light()
+
+_defaults = {'default_camera': Camera, 'default_light': Light}
+
+
+def __getattr__(name):
+    """Makes the sample Shaders (default_shader, shadow_shader, ...), default_camera, and default_light when they're
+    first used, so importing ratcave doesn't read any files or need an OpenGL context."""
+    if name in _defaults:
+        value = _defaults[name]()
+    elif name.endswith('_shader') and name[:-len('_shader')] in _shader_dirnames():
+        value = _load_shader(name[:-len('_shader')])
+    else:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_defaults) | {dirname + '_shader' for dirname in _shader_dirnames()})
@@ -1,8 +1,9 @@
 from . import gl
 from . import Camera, Light, Mesh, EmptyEntity
 from .texture import TextureCube
-from .utils import mixins, clear_color
+from .utils import mixins, clear_color, delete_pending
 from .gl_states import GLStateManager
+from .shader import compile_shaders
 
 
 
@@ -36,12 +37,39 @@ class Scene(mixins.NameLabelMixin):
     def __repr__(self):
         return "<Scene(name='{self.name}'), meshes={self.meshes}, light={self.light}, camera={self.camera}>".format(self=self)
 
+    def prewarm(self, *shaders):
+        """
+        Uploads everything the Scene draws to the graphics card now (the Meshes' vertex arrays, their Textures' pending
+        updates and mipmaps, and the given Shaders, with the variants of them the Meshes draw with), and waits for it to
+        finish, so the first draw() doesn't stall.  Call before an experiment starts, after AssetLoader.finish() if
+        Meshes are being loaded in the background.
+        """
+        programs = []
+        for shader in shaders:
+            for program in [shader] + [shader.variant(mesh.shader_features) for mesh in self.meshes
+                                       if hasattr(mesh, 'shader_features')]:
+                if program not in programs:
+                    programs.append(program)
+        for shader in compile_shaders(programs):  # All sent to the driver first, so they can compile in parallel.
+            shader.load()
+
+        for mesh in self.meshes:
+            geometry = getattr(mesh, 'geometry', None)
+            if geometry is not None:
+                geometry.upload()
+            for texture in getattr(mesh, 'textures', ()):
+                texture.bind()  # Uploads the changes waiting for it, and regenerates its mipmaps.
+                texture.unbind()
+
+        gl.glFinish()
+
     def clear(self):
         """Clear Screen and Apply Background Color"""
         clear_color(*self.bgColor)
 
     def draw(self, clear=True):
         """Draw each visible mesh in the scene from the perspective of the scene's camera and lit by its light."""
+        delete_pending()  # OpenGL objects of garbage-collected instances are deleted here, from the context's thread.
         if clear:
             self.clear()
 
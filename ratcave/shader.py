@@ -1,19 +1,206 @@
 import abc
+import os
+import re
+import time
+from contextlib import contextmanager
+from functools import partial
 from pyglet import gl
-from ctypes import byref, create_string_buffer, c_char, c_char_p, c_int, c_float, c_double, cast, pointer, POINTER
+from ctypes import byref, create_string_buffer, c_char, c_char_p, c_int, c_uint, c_float, c_double, cast, pointer, POINTER
 import numpy as np
-from .utils import BindingContextMixin, BindNoTargetMixin
+from .utils import BindingContextMixin, BindNoTargetMixin, GLResourceMixin, create_opengl_object, delete_opengl_object
+from collections import namedtuple
 from collections import UserDict as IterableUserDict  # Python 3
 
-
-class UniformArray(np.ndarray): pass
+ActiveUniform = namedtuple('ActiveUniform', 'location type size')
+UniformFunction = namedtuple('UniformFunction', 'function dtype length is_matrix')
+
+_ctypes_types = {np.dtype(np.float32): c_float, np.dtype(np.int32): c_int, np.dtype(np.uint32): c_uint,
+                 np.dtype(np.float64): c_double}
+_default_dtypes = {'f': np.float32, 'i': np.int32, 'u': np.uint32, 'b': np.int32}  # for values that aren't arrays
+
+# (numpy format, shape, std140 base alignment in bytes) of the GLSL types that can be put in a UniformBlock.
+_std140_types = {'float': ('<f4', (), 4), 'int': ('<i4', (), 4),
+                 'vec2': ('<f4', (2,), 8), 'vec3': ('<f4', (3,), 16), 'vec4': ('<f4', (4,), 16),
+                 'mat4': ('<f4', (4, 4), 16)}
+
+
+def std140_dtype(fields):
+    """Returns a numpy structured dtype laid out like a std140 uniform block, given a sequence of (name, GLSL type)
+    pairs in the order they are declared in the block."""
+    names, formats, offsets, offset = [], [], [], 0
+    for name, glsl_type in fields:
+        fmt, shape, alignment = _std140_types[glsl_type]
+        offset = -(-offset // alignment) * alignment
+        names.append(name)
+        formats.append((fmt, shape))
+        offsets.append(offset)
+        offset += np.dtype((fmt, shape)).itemsize
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': -(-offset // 16) * 16})
+
+
+_include_directive = re.compile(r'^\s*#\s*include\s+["<](.+)[">]')
+_conditional_directive = re.compile(r'^\s*#\s*(ifdef|ifndef|if|elif)\b(.*)$', re.M)
+
+
+def _find_include(filename, include_dirs):
+    for directory in include_dirs:
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    raise IOError("Shader include file '{}' not found in {}.".format(filename, list(include_dirs)))
+
+
+def preprocess(source, defines=None, include_dirs=(), _included=()):
+    """
+    Returns the GLSL source with its #include "filename" lines replaced by the files' contents, and a #define line for
+    each (name, value) in defines put after its #version and #extension lines.  Included files are looked for next to
+    the file that includes them first, then in include_dirs.  #line directives keep the line numbers in error messages
+    matching the original source.
+    """
+    lines = []
+    for number, line in enumerate(source.splitlines(), start=1):
+        match = _include_directive.match(line)
+        if not match:
+            lines.append(line)
+            continue
+        path = _find_include(match.group(1), include_dirs)
+        if path in _included:
+            raise ValueError("Shader include file '{}' includes itself.".format(path))
+        with open(path) as f:
+            included = f.read()
+        lines.append(preprocess(included, include_dirs=[os.path.dirname(path)] + list(include_dirs),
+                                _included=_included + (path,)))
+        lines.append('#line {}'.format(number + 1))
+
+    if defines:  # After the #version and #extension lines, which have to come first.
+        start = next((idx + 1 for idx, line in enumerate(lines) if line.lstrip().startswith('#version')), 0)
+        header = lambda line: line.lstrip().startswith(('#extension', '//')) or not line.strip()
+        while start < len(lines) and header(lines[start]):
+            start += 1
+        define_lines = ['#define {} {}'.format(name, value) for name, value in sorted(defines.items())]
+        lines[start:start] = define_lines + ['#line {}'.format(start + 1)]
+    return '\n'.join(lines)
+
+
+_log_line_number = re.compile(r'^\s*(?:ERROR:\s*)?\d+\s*[:(]\s*(\d+)')
+GL_COMPLETION_STATUS = 0x91B1  # From GL_KHR_parallel_shader_compile (and the ARB extension of the same name).
+_parallel_compile = {}  # The function setting the driver's number of compiler threads, by extension name.
+
+
+class ShaderError(Exception):
+
+    def __init__(self, stage, log, source=''):
+        """
+        Raised when a Shader's program fails to compile or link.  Has the 'stage' that failed ('vertex', 'fragment',
+        'geometry', or 'link'), the driver's 'log', the 'source' compiled (with #includes and #defines applied), and
+        'errors': a (line number, message) pair for each line of the log, with None as the number when the log line
+        doesn't start with one.
+        """
+        self.stage, self.log, self.source = stage, log, source
+        self.errors = []
+        for line in log.splitlines():
+            if line.strip():
+                match = _log_line_number.match(line)
+                self.errors.append((int(match.group(1)) if match else None, line.strip()))
+        super(ShaderError, self).__init__("{} shader failed:\n{}".format(stage.capitalize(), log))
+
+
+class ShaderCompileError(ShaderError): pass
+
+
+class ShaderLinkError(ShaderError): pass
+
+
+def _parallel_compile_extension():
+    """Returns the name of the current context's parallel shader compile extension, or None if it has none."""
+    from pyglet.gl import gl_info
+    if not gl_info.have_context():
+        return None
+    for extension in ['GL_KHR_parallel_shader_compile', 'GL_ARB_parallel_shader_compile']:
+        if gl_info.have_extension(extension):
+            return extension
+    return None
+
+
+def compile_shaders(shaders):
+    """
+    Starts compiling and linking all the Shaders at once, without waiting for any of them, and returns them.  If the
+    driver supports GL_KHR_parallel_shader_compile, they compile in the background, on as many threads as the driver
+    allows, and Shader.is_ready can be polled to tell when each is done.  Each Shader finishes (raising a ShaderError
+    if it failed) when it's first bound.
+
+    Example::
+
+        shaders = compile_shaders([shader1, shader2, shader3])
+        while not all(shader.is_ready for shader in shaders):
+            show_loading_screen()
+    """
+    extension = _parallel_compile_extension()
+    if extension is not None:
+        if extension not in _parallel_compile:
+            from pyglet.gl.lib import link_GL
+            name = 'glMaxShaderCompilerThreads' + extension.split('_')[1]
+            _parallel_compile[extension] = link_GL(name, None, [gl.GLuint], requires=extension)
+        _parallel_compile[extension](0xFFFFFFFF)  # As many threads as the driver likes.
+    shaders = list(shaders)
+    for shader in shaders:
+        shader.submit()
+    return shaders
+
+
+def _uniform_functions():
+    """Returns the UniformFunction (glUniform*v function, numpy dtype, number of values per element, and whether it's
+    a matrix) for each GLSL uniform type."""
+    functions = {}
+    for kind, suffix, dtype in [('FLOAT', 'f', np.float32), ('INT', 'i', np.int32), ('BOOL', 'i', np.int32),
+                                ('UNSIGNED_INT', 'ui', np.uint32), ('DOUBLE', 'd', np.float64)]:
+        for length, vec in enumerate(['', '_VEC2', '_VEC3', '_VEC4'], start=1):
+            function = getattr(gl, 'glUniform{}{}v'.format(length, suffix))
+            functions[getattr(gl, 'GL_' + kind + vec)] = UniformFunction(function, np.dtype(dtype), length, False)
+
+    for kind, suffix, dtype in [('FLOAT', 'f', np.float32), ('DOUBLE', 'd', np.float64)]:
+        for shape in ['2', '3', '4', '2x3', '2x4', '3x2', '3x4', '4x2', '4x3']:
+            function = getattr(gl, 'glUniformMatrix{}{}v'.format(shape, suffix))
+            length = int(shape[0]) * int(shape[-1])
+            functions[getattr(gl, 'GL_{}_MAT{}'.format(kind, shape))] = UniformFunction(function, np.dtype(dtype),
+                                                                                        length, True)
+
+    samplers = ['{}SAMPLER_{}'.format(prefix, sampler) for prefix in ['', 'INT_', 'UNSIGNED_INT_']
+                for sampler in ['1D', '2D', '3D', 'CUBE', '1D_ARRAY', '2D_ARRAY', '2D_MULTISAMPLE',
+                                '2D_MULTISAMPLE_ARRAY', 'BUFFER', '2D_RECT', 'CUBE_MAP_ARRAY']]
+    samplers += ['SAMPLER_' + sampler for sampler in ['1D_SHADOW', '2D_SHADOW', 'CUBE_SHADOW', '1D_ARRAY_SHADOW',
+                                                      '2D_ARRAY_SHADOW', '2D_RECT_SHADOW', 'CUBE_MAP_ARRAY_SHADOW']]
+    for sampler in samplers:  # Samplers are set to the texture unit they read from.
+        functions[getattr(gl, 'GL_' + sampler)] = functions[gl.GL_INT]
+    return functions
+
+
+def _check_uniform_shape(name, uniform):
+    """Raises an error if the array can't be a GLSL uniform: a scalar, vector, or matrix, or an array of them."""
+    if uniform.dtype.kind not in 'fiub':
+        raise TypeError("Uniform '{}' must be numeric, not {}.".format(name, uniform.dtype))
+    matrix_shape = uniform.shape[-2:] if uniform.ndim == 3 else (2,)
+    if (not uniform.size or uniform.ndim > 3 or (uniform.ndim > 1 and uniform.shape[-1] > 4)
+            or not all(2 <= dim <= 4 for dim in matrix_shape)):
+        raise ValueError("Uniform '{}' has shape {}, which isn't a GLSL scalar, vector, or matrix, or an array of "
+                         "them.".format(name, uniform.shape))
+
+
+class UniformArray(np.ndarray):
+
+    def as_pointer(self, dtype):
+        """Returns a ctypes pointer to the array's values as dtype, cached if they don't need converting first."""
+        if self.dtype == dtype and self.flags.c_contiguous:
+            try:
+                return self._pointer
+            except AttributeError:
+                self._pointer = self.ctypes.data_as(POINTER(_ctypes_types[dtype]))
+                return self._pointer
+        return np.ascontiguousarray(self, dtype=dtype).ctypes.data_as(POINTER(_ctypes_types[dtype]))
 
 
 class UniformCollection(IterableUserDict, object):
-    # todo: Switch all uniforms functions to array equivalents, to get pointer-passing performance benefit.
-    _sendfuns = {'f': [gl.glUniform1f, gl.glUniform2f, gl.glUniform3f, gl.glUniform4f],
-                'i':   [gl.glUniform1i, gl.glUniform2i, gl.glUniform3i, gl.glUniform4i]
-                }
+    _sendfuns = _uniform_functions()
 
     def __init__(self, **kwargs):
         """Returns a dict-like collection of arrays that can copy itself to shader programs as GLSL Uniforms.
@@ -52,16 +239,16 @@ class UniformCollection(IterableUserDict, object):
             self.data[key][:] = value
             return
 
-        if isinstance(value, bool):
-            value = int(value)
         if isinstance(value, np.ndarray):
-            if 'f' in value.dtype.str and value.dtype != np.float32:
-                raise TypeError("Matrix Uniform Arrays must be 32-bit floats for rendering to work properly.")
+            if value.dtype.kind == 'f' and value.dtype not in (np.float32, np.float64):
+                raise TypeError("Float Uniform Arrays must be 32-bit floats (or 64-bit, for double uniforms).")
             uniform = value  # Don't copy the data if it's already a numpy array
         else:
             uniform = np.array([value]) if not hasattr(value, '__iter__') else np.array(value)
+            uniform = uniform.astype(_default_dtypes.get(uniform.dtype.kind, uniform.dtype))
+        _check_uniform_shape(key, uniform)
 
-        uniform_view = uniform.view(UniformArray)  # Cast as a UniformArray for 'loc' to be set as an attribute later.
+        uniform_view = uniform.view(UniformArray)  # Cast as a UniformArray, so attributes can be cached on it later.
         self.data[key] = uniform_view
 
     def __delitem__(self, key):
@@ -71,39 +258,117 @@ class UniformCollection(IterableUserDict, object):
         """
         Sends all the key-value pairs to the graphics card.
         These uniform variables will be available in the currently-bound shader.
+
+        Each uniform is sent with a single call, using the glUniform function that matches its type in the bound
+        shader.  Uniforms whose values haven't changed since they were last sent to the bound shader are skipped.
         """
 
-        for name, array in self.items():
+        shader = Shader._bound
+        if shader is None:
+            raise UnboundLocalError("""Shader not bound to OpenGL context--uniform cannot be sent.
+            ------------ Tip -------------
+            with ratcave.default_shader:
+                mesh.draw()
+            ------------------------------
+            """)
 
-            shader_id = c_int(0)
-            gl.glGetIntegerv(gl.GL_CURRENT_PROGRAM, byref(shader_id))
-            if shader_id.value == 0:
-                raise UnboundLocalError("""Shader not bound to OpenGL context--uniform cannot be sent.
-                ------------ Tip -------------
-                with ratcave.default_shader:
-                    mesh.draw()
-                ------------------------------
-                """)
-
-            # Attach a shader location value to the array, for quick memory lookup. (gl calls are expensive, for some reason)
+        # Uniform locations are looked up in the bound Shader's table, made once when it was linked.
+        active_uniforms, sent_values = shader.active_uniforms, shader._sent_values
+        for name, array in self.items():
             try:
-                loc, shader_id_for_array = array.loc
-                if shader_id.value != shader_id_for_array:
-                    raise Exception('Uniform location bound to a different shader')
-            except (AttributeError, Exception) as e:
-                array.loc = (gl.glGetUniformLocation(shader_id.value, name.encode('ascii')), shader_id.value)
-
-            if array.ndim == 2:  # Assuming a 4x4 float32 matrix (common for graphics operations)
-                try:
-                    pointer = array.pointer
-                except AttributeError:
-                    array.pointer = array.ctypes.data_as(POINTER(c_float * 16)).contents
-                    pointer = array.pointer
-                gl.glUniformMatrix4fv(array.loc[0], 1, True, pointer)
+                uniform = active_uniforms[name]
+            except KeyError:
+                continue  # The Shader doesn't use this uniform.
+
+            # Many uniforms are views of arrays that change elsewhere (like model matrices), so compare the values
+            # themselves with the last ones the program received, rather than tracking writes.
+            value = array.tobytes()
+            if sent_values.get(name) == value:
+                continue
 
+            try:
+                function, dtype, length, is_matrix = self._sendfuns[uniform.type]
+            except KeyError:
+                raise TypeError("Uniform '{}' has a type (0x{:x}) that can't be sent.".format(name, uniform.type))
+            count = min(array.size // length, uniform.size)
+            if not count:
+                raise ValueError("Uniform '{}' has a type (0x{:x}) that needs {} values, but got shape {}.".format(
+                    name, uniform.type, length, array.shape))
+            if is_matrix:
+                function(uniform.location, count, True, array.as_pointer(dtype))  # Transposed: GLSL is column-major
             else:
-                sendfun = self._sendfuns[array.dtype.kind][len(array) - 1]  # Find correct glUniform function
-                sendfun(array.loc[0], *array)
+                function(uniform.location, count, array.as_pointer(dtype))
+            sent_values[name] = value
+
+
+class UniformBlock(GLResourceMixin):
+
+    target = gl.GL_UNIFORM_BUFFER
+    bindings = {'CameraBlock': 0, 'LightBlock': 1}  # Binding point of each block, by the name shaders declare it with.
+
+    def __init__(self, name, fields):
+        """
+        A std140 uniform block: uniforms kept in a buffer on the graphics card that every Shader declaring the block
+        reads from, so they are sent once instead of to each Shader.  Cameras and Lights keep theirs in the
+        'CameraBlock' and 'LightBlock' blocks, which ratcave's shaders declare.
+
+        Args:
+          - name (str): The block's name in the shaders.  Shaders linked after the block is made are bound to it.
+          - fields (tuple): (name, GLSL type) pairs, in the order they are declared in the block.  GLSL types can be
+            'float', 'int', 'vec2', 'vec3', 'vec4', or 'mat4'.
+
+        Example::
+
+            block = UniformBlock('CameraBlock', [('projection_matrix', 'mat4'), ('view_matrix', 'mat4'),
+                                                 ('camera_position', 'vec3')])
+            block.send(camera.uniforms)
+
+        In the shader, this would be declared as::
+
+            layout(std140) uniform CameraBlock {
+                mat4 projection_matrix;
+                mat4 view_matrix;
+                vec3 camera_position;
+            };
+        """
+        self.name = name
+        self.fields = tuple(fields)
+        self.binding = UniformBlock.bindings.setdefault(name, len(UniformBlock.bindings))
+        self.data = np.zeros((), dtype=std140_dtype(self.fields))
+        self.id = None
+        self._sent_value = None
+        self._add_to_scopes()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(id=None, _sent_value=None)  # The buffer belongs to this OpenGL context.
+        return state
+
+    def send(self, uniforms):
+        """
+        Copies the block's fields from uniforms (a dict of arrays, like a Camera's uniforms) to the graphics card, in a
+        single call if any of them changed, and binds the block to its binding point.
+        """
+        for name, glsl_type in self.fields:
+            value = uniforms[name]
+            self.data[name] = np.transpose(value) if glsl_type.startswith('mat') else value  # GLSL is column-major.
+
+        if self.id is None:
+            self.id = create_opengl_object(gl.glGenBuffers)
+            self._track_gl_object(partial(delete_opengl_object, gl.glDeleteBuffers, self.id), nbytes=self.data.nbytes)
+            gl.glBindBuffer(self.target, self.id)
+            gl.glBufferData(self.target, self.data.nbytes, None, gl.GL_DYNAMIC_DRAW)
+
+        value = self.data.tobytes()
+        if value != self._sent_value:
+            gl.glBindBuffer(self.target, self.id)
+            gl.glBufferSubData(self.target, 0, self.data.nbytes, self.data.ctypes.data)
+            self._sent_value = value
+        gl.glBindBufferBase(self.target, self.binding, self.id)
+
+    def release(self):
+        super(UniformBlock, self).release()
+        self.id, self._sent_value = None, None
 
 
 class HasUniforms:
@@ -144,11 +409,15 @@ class HasUniformsUpdater(HasUniforms):
         self._uniforms = value
 
 
-class Shader(BindingContextMixin, BindNoTargetMixin):
+class Shader(BindingContextMixin, BindNoTargetMixin, GLResourceMixin):
 
     bindfun = gl.glUseProgram
+    _bound = None
+    _stage_names = {gl.GL_VERTEX_SHADER: 'vertex', gl.GL_FRAGMENT_SHADER: 'fragment',
+                    gl.GL_GEOMETRY_SHADER_EXT: 'geometry'}
+    binary_cache = None  # A ProgramBinaryCache to load linked programs from, instead of compiling them.
 
-    def __init__(self, vert='', frag='', geom='', lazy=False):
+    def __init__(self, vert='', frag='', geom='', lazy=False, defines=None, include_dirs=()):
         """
         GLSL Shader program object for rendering in OpenGL.
         To activate, call the Shader.bind() method, or pass it to a context manager (the 'with' statement).
@@ -159,6 +428,8 @@ class Shader(BindingContextMixin, BindNoTargetMixin):
           - vert (str): The vertex shader program  string
           - frag (str): The fragment shader program string
           - geom (str): The geometry shader program
+          - defines (dict): Macros to #define in each program, by name.
+          - include_dirs (list): Directories to look for #include files in.
 
         Example::
 
@@ -166,26 +437,143 @@ class Shader(BindingContextMixin, BindNoTargetMixin):
             with shader:
                 mesh.draw()
 
+        Shaders can have variants, compiled when first drawn with, for features tested with #ifdef in their sources.
+        Meshes draw with the variant for their features (see Mesh.shader_features), so a Shader can check for those
+        at compile time instead of with uniforms::
+
+            #ifdef HAS_TEXTUREMAP
+                gl_FragColor.rgb *= texture2D(TextureMap, texCoord).rgb;
+            #endif
+
         """
-        self.id = gl.glCreateProgram()  # create the program handle
+        self._id = None  # The program handle is created when first needed, so Shaders can be made without a context.
+        self._add_to_scopes()
         self.is_linked = False
         self.is_compiled = False
+        self.active_uniforms = {}
+        self.uniform_blocks = {}
+        self._sent_values = {}
+        self.timings = {}
         self.vert = vert
         self.frag = frag
         self.geom = geom
+        self.defines = dict(defines) if defines else {}
+        self.include_dirs = list(include_dirs)
         self.lazy = lazy
+        self._features = None
+        self._variants = {}
+        self._base = self
+        self._shared_uniforms = {}  # id: UniformCollection shared with the Shader's variants, like a Camera's.
+        self._shared_version = 0  # Changed whenever they're sent again, so variants know to get them too.
+        self._stages = []
+        self._link_started = None
 
         if not self.lazy:
             self.compile()
 
 
     def compile(self):
-        # create the vertex, fragment, and geometry shaders
-        self._createShader(self.vert, gl.GL_VERTEX_SHADER)
-        self._createShader(self.frag, gl.GL_FRAGMENT_SHADER)
-        if self.geom:
-            self._createShader(self.geom, gl.GL_GEOMETRY_SHADER_EXT)
+        """Sends the vertex, fragment, and geometry programs to the driver to compile.  The driver may finish
+        compiling them later: errors are raised when the Shader is linked."""
+        start = time.perf_counter()
+        vert, frag, geom = self.sources()
+        self._stages = [self._createShader(vert, gl.GL_VERTEX_SHADER), self._createShader(frag, gl.GL_FRAGMENT_SHADER)]
+        if geom:
+            self._stages.append(self._createShader(geom, gl.GL_GEOMETRY_SHADER_EXT))
         self.is_compiled = True
+        self.timings['compile'] = time.perf_counter() - start
+
+    def sources(self):
+        """Returns the (vert, frag, geom) programs as compiled: with their #includes and #defines applied."""
+        return tuple(preprocess(source, self.defines, self.include_dirs) if source else source
+                     for source in [self.vert, self.frag, self.geom])
+
+    @property
+    def features(self):
+        """The macro names the Shader's programs test with #ifdef, #ifndef, #if, or #elif, which it has variants for."""
+        if self._features is None:
+            features = set()
+            for source in self._base.sources():
+                for directive, condition in _conditional_directive.findall(source):
+                    if directive in ('ifdef', 'ifndef'):
+                        features.update(condition.split()[:1])
+                    else:
+                        features.update(re.findall(r'defined\s*\(?\s*(\w+)', condition))
+            self._features = frozenset(features)
+        return self._features
+
+    def variant(self, features):
+        """
+        Returns the Shader's variant with the given features #defined (those its programs test for), made and cached
+        the first time it's asked for, and compiled when first bound.  Returns the Shader itself if none of the
+        features are tested for.
+        """
+        base = self._base
+        key = base.features.intersection(features)
+        if not key:
+            return base
+        try:
+            return base._variants[key]
+        except KeyError:
+            defines = dict(base.defines)
+            defines.update((name, 1) for name in key)
+            variant = Shader(vert=base.vert, frag=base.frag, geom=base.geom, lazy=True, defines=defines,
+                             include_dirs=base.include_dirs)
+            variant._base = base
+            base._variants[key] = variant
+            return variant
+
+    def share_uniforms(self, uniforms):
+        """
+        Sends the uniforms (like a Camera's or a Light's) to the Shader, which must be bound, and to each of its
+        variants the next time it's bound with bind_variant().  Each program keeps its own uniform values, so variants
+        would otherwise never get uniforms that are sent once per frame rather than by every Mesh.
+        """
+        base = self._base
+        base._shared_uniforms[id(uniforms)] = uniforms
+        base._shared_version += 1
+        uniforms.send()
+        self._shared_version = base._shared_version
+
+    @contextmanager
+    def bind_variant(self, features):
+        """
+        Binds the Shader's variant for the features (see variant()) inside the 'with' block, after sending it the
+        uniforms shared with share_uniforms() if it hasn't got them yet, and binds the Shader again afterwards.
+        """
+        variant = self.variant(features)
+        if variant is self:
+            yield self
+            return
+        variant.bind()
+        base = self._base
+        if variant._shared_version != base._shared_version:
+            for uniforms in list(base._shared_uniforms.values()):
+                uniforms.send()
+            variant._shared_version = base._shared_version
+        try:
+            yield variant
+        finally:
+            self.bind()
+
+    @property
+    def id(self):
+        """The program's OpenGL handle."""
+        if self._id is None:
+            self._id = gl.glCreateProgram()  # create the program handle
+            self._track_gl_object(partial(gl.glDeleteProgram, self._id))
+        return self._id
+
+    def release(self):
+        """Deletes the program, and those of its variants, now.  Must be called from the thread that owns the OpenGL
+        context.  The Shader is compiled again if it's used afterwards."""
+        super(Shader, self).release()
+        self._id = None
+        self.is_compiled = self.is_linked = False
+        self._sent_values = {}
+        self._shared_version = None
+        for variant in self._variants.values():
+            variant.release()
 
     def bind(self):
         """Activate this Shader, making it the currently-bound program.
@@ -204,11 +592,60 @@ class Shader(BindingContextMixin, BindNoTargetMixin):
             with shader:
                 mesh.draw()
         """
+        self.load()
+        super(Shader, self).bind()
+        Shader._bound = self  # Tracked here, so uniforms can be sent without asking OpenGL which program is bound.
+
+    @classmethod
+    def unbind(cls):
+        super(Shader, cls).unbind()
+        Shader._bound = None
+
+    def load(self):
+        """
+        Compiles and links the Shader program, if it hasn't been done yet, and waits for it to finish.  Raises a
+        ShaderCompileError or ShaderLinkError if it failed.  If Shader.binary_cache is set, the program is loaded from
+        it instead when possible, and stored in it after being linked.  The time each step took, in seconds, is kept in
+        the Shader's 'timings' dict.
+        """
         if not self.is_linked:
-            if not self.is_compiled:
-                self.compile()
-            self.link()
-        super(self.__class__, self).bind()
+            self.submit()
+            if self._link_started is not None:
+                self._finish_link()
+                if self.binary_cache is not None:
+                    self.binary_cache.store(self)
+
+    def submit(self):
+        """
+        Starts compiling and linking the program (or loads it from Shader.binary_cache), without waiting for the driver
+        to finish.  Shader.bind() finishes it, if needed.  See compile_shaders(), to submit many Shaders at once.
+        """
+        if self.is_linked or self._link_started is not None:
+            return
+        cache = self.binary_cache
+        start = time.perf_counter()
+        if cache is not None and cache.load(self):
+            self.timings['cache_load'] = time.perf_counter() - start
+            return
+        if not self.is_compiled:
+            self.compile()
+        self._start_link()
+
+    @property
+    def is_ready(self):
+        """
+        Whether the program can be bound without waiting for the driver to finish compiling it.  Only drivers with
+        GL_KHR_parallel_shader_compile can tell without waiting: for others, it's True once the Shader is submitted.
+        """
+        if self.is_linked:
+            return True
+        if self._link_started is None:
+            return False
+        if _parallel_compile_extension() is None:
+            return True
+        completed = c_int(0)
+        gl.glGetProgramiv(self.id, GL_COMPLETION_STATUS, byref(completed))
+        return bool(completed.value)
 
     @classmethod
     def from_file(cls, vert, frag, **kwargs):
@@ -224,49 +661,130 @@ class Shader(BindingContextMixin, BindNoTargetMixin):
         """
         vert_program = open(vert).read()
         frag_program = open(frag).read()
+        kwargs.setdefault('include_dirs', [os.path.dirname(os.path.abspath(vert))])
         return cls(vert=vert_program, frag=frag_program, **kwargs)
 
 
     def _createShader(self, strings, shadertype):
 
+        """Sends a program to the driver to compile and attaches it, returning its (handle, type, source)."""
         # create the shader handle
         shader = gl.glCreateShader(shadertype)
+        source = strings
 
         # convert the source strings into a ctypes pointer-to-char array, and upload them
         # this is deep, dark, dangerous black magick - don't try stuff like this at home!
         strings = tuple(s.encode('ascii') for s in strings)  # Nick added, for python3
         src = (c_char_p * len(strings))(*strings)
         gl.glShaderSource(shader, len(strings), cast(pointer(src), POINTER(POINTER(c_char))), None)
-        # compile the shader
+        # compile the shader.  Its status is checked after linking, so the driver can compile in the background.
         gl.glCompileShader(shader)
-
-        # retrieve the compile status
-        compile_success = c_int(0)
-        gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS, byref(compile_success))
-
-        # if compilation failed, print the log
-        if compile_success:
-            gl.glAttachShader(self.id, shader)
-        else:
-            gl.glGetShaderiv(shader, gl.GL_INFO_LOG_LENGTH, byref(compile_success))  # retrieve the log length
-            buffer = create_string_buffer(compile_success.value)  # create a buffer for the log
-            gl.glGetShaderInfoLog(shader, compile_success, None, buffer)  # retrieve the log text
-            print(buffer.value)  # print the log to the console
+        gl.glAttachShader(self.id, shader)
+        return shader, shadertype, source
 
     def link(self):
-        """link the program, making it the active shader.
+        """link the program, making it the active shader.  Raises a ShaderError if it or its programs failed.
 
         .. note:: Shader.bind() is preferred here, because link() Requires the Shader to be compiled already.
         """
+        self._start_link()
+        self._finish_link()
+
+    def _start_link(self):
+        self._link_started = time.perf_counter()
+        if self.binary_cache is not None:
+            gl.glProgramParameteri(self.id, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
         gl.glLinkProgram(self.id)
 
-        # Check if linking was successful.  If not, print the log.
+    def _finish_link(self):
+        """Waits for the driver to finish linking, raising a ShaderError with its log if it failed."""
+        stages, self._stages = self._stages, []
+        start, self._link_started = self._link_started, None
+        try:
+            # Check if compiling and linking were successful.  If not, raise an error with the log.
+            for shader, shadertype, source in stages:
+                status = c_int(0)
+                gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS, byref(status))
+                if not status:
+                    log = self._info_log(shader, gl.glGetShaderiv, gl.glGetShaderInfoLog)
+                    raise ShaderCompileError(self._stage_names.get(shadertype, str(shadertype)), log, source)
+
+            status = c_int(0)
+            gl.glGetProgramiv(self.id, gl.GL_LINK_STATUS, byref(status))
+            if not status:
+                raise ShaderLinkError('link', self._info_log(self.id, gl.glGetProgramiv, gl.glGetProgramInfoLog))
+        except ShaderError:
+            self.is_compiled = False  # So the sources are sent again if it's linked again.
+            raise
+        finally:
+            for shader, _, _ in stages:
+                gl.glDetachShader(self.id, shader)
+                gl.glDeleteShader(shader)
+
+        self.is_linked = True
+        self._reflect_uniforms()
+        self._bind_uniform_blocks()
+        self.timings['link'] = time.perf_counter() - start
+
+    @staticmethod
+    def _info_log(handle, get_iv, get_log):
+        length = c_int(0)
+        get_iv(handle, gl.GL_INFO_LOG_LENGTH, byref(length))  # retrieve the log length
+        buffer = create_string_buffer(max(length.value, 1))  # create a buffer for the log
+        get_log(handle, length, None, buffer)  # retrieve the log text
+        return buffer.value.decode('ascii', 'replace')
+
+    def _program_binary(self):
+        """Returns the linked program's (binary format, binary), from glGetProgramBinary."""
+        length, binary_format = c_int(0), c_uint(0)
+        gl.glGetProgramiv(self.id, gl.GL_PROGRAM_BINARY_LENGTH, byref(length))
+        buffer = create_string_buffer(length.value)
+        gl.glGetProgramBinary(self.id, length, byref(length), byref(binary_format), buffer)
+        return binary_format.value, buffer.raw[:length.value]
+
+    def _link_binary(self, binary_format, binary):
+        """Links the program from a binary made by _program_binary().  Returns False if the driver rejected it."""
+        gl.glProgramBinary(self.id, binary_format, binary, len(binary))
         link_status = c_int(0)
         gl.glGetProgramiv(self.id, gl.GL_LINK_STATUS, byref(link_status))
         if not link_status:
-            gl.glGetProgramiv(self.id, gl.GL_INFO_LOG_LENGTH, byref(link_status))  # retrieve the log length
-            buffer = create_string_buffer(link_status.value)  # create a buffer for the log
-            gl.glGetProgramInfoLog(self.id, link_status, None, buffer)  # retrieve the log text
-            print(buffer.value)  # print the log to the console
-
-        self.is_linked = True
+            return False
+        self.is_compiled = self.is_linked = True
+        self._reflect_uniforms()
+        self._bind_uniform_blocks()
+        return True
+
+    def _reflect_uniforms(self):
+        """Stores the location, type, and size of each of the linked program's active uniforms, by name."""
+        self.active_uniforms = {}
+        self._sent_values = {}
+        count, max_length = c_int(0), c_int(0)
+        gl.glGetProgramiv(self.id, gl.GL_ACTIVE_UNIFORMS, byref(count))
+        gl.glGetProgramiv(self.id, gl.GL_ACTIVE_UNIFORM_MAX_LENGTH, byref(max_length))
+        name_buffer = create_string_buffer(max(max_length.value, 1))
+        length, size, gl_type = c_int(0), c_int(0), c_uint(0)
+        for index in range(count.value):
+            gl.glGetActiveUniform(self.id, index, len(name_buffer), byref(length), byref(size), byref(gl_type),
+                                  name_buffer)
+            location = gl.glGetUniformLocation(self.id, name_buffer.value)
+            if location < 0:  # Uniforms in uniform blocks don't have locations.
+                continue
+            name = name_buffer.value.decode('ascii')
+            uniform = ActiveUniform(location=location, type=gl_type.value, size=size.value)
+            self.active_uniforms[name] = uniform
+            if name.endswith('[0]'):  # Arrays can be set by their name alone, too.
+                self.active_uniforms[name[:-3]] = uniform
+
+    def _bind_uniform_blocks(self):
+        """Binds the linked program's uniform blocks to the binding points of the UniformBlocks with the same names."""
+        self.uniform_blocks = {}
+        count, max_length = c_int(0), c_int(0)
+        gl.glGetProgramiv(self.id, gl.GL_ACTIVE_UNIFORM_BLOCKS, byref(count))
+        gl.glGetProgramiv(self.id, gl.GL_ACTIVE_UNIFORM_BLOCK_MAX_NAME_LENGTH, byref(max_length))
+        name_buffer = create_string_buffer(max(max_length.value, 1))
+        for index in range(count.value):
+            gl.glGetActiveUniformBlockName(self.id, index, len(name_buffer), None, name_buffer)
+            name = name_buffer.value.decode('ascii')
+            self.uniform_blocks[name] = index
+            if name in UniformBlock.bindings:
+                gl.glUniformBlockBinding(self.id, index, UniformBlock.bindings[name])
@@ -0,0 +1,94 @@
+"""
+Stores linked Shader programs on disk, so they don't have to be compiled again the next time the program is started.
+
+Example::
+
+    ratcave.Shader.binary_cache = ratcave.ProgramBinaryCache('~/.cache/ratcave')
+    with shader:  # Loaded from the cache if it was linked before with the same sources and graphics driver.
+        mesh.draw()
+    print(shader.timings)
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+from ctypes import byref, c_int, c_char_p, cast
+from pyglet import gl
+
+
+class ProgramBinaryCache(object):
+
+    _header = struct.Struct('<4sI')  # magic string, binary format
+    _magic = b'RCPB'
+
+    def __init__(self, directory):
+        """
+        A directory of program binaries (from glGetProgramBinary), each stored under a hash of its Shader's sources and
+        the graphics driver's vendor, renderer, and version.  Shaders whose binary is missing, or that the driver
+        doesn't accept anymore (after a driver update, for example), are compiled from their sources instead.
+
+        Args:
+          - directory (str): Where to store the binaries.  It's made if it doesn't exist.
+        """
+        self.directory = os.path.expanduser(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<ProgramBinaryCache(directory='{}', hits={}, misses={})>".format(self.directory, self.hits, self.misses)
+
+    @staticmethod
+    def supported():
+        """Returns True if the current OpenGL context can save and load program binaries."""
+        n_formats = c_int(0)
+        gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS, byref(n_formats))
+        return n_formats.value > 0
+
+    @staticmethod
+    def _driver():
+        names = (cast(gl.glGetString(name), c_char_p).value for name in [gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION])
+        return b'\n'.join(name or b'' for name in names)
+
+    def key(self, shader):
+        """Returns the name the Shader's binary is stored under."""
+        digest = hashlib.sha256(self._driver())
+        for source in shader.sources():
+            digest.update(b'\0' + source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, shader):
+        return os.path.join(self.directory, self.key(shader) + '.bin')
+
+    def load(self, shader):
+        """Links the Shader from its stored binary, if there is one that the driver accepts.  Returns True if it did."""
+        if not self.supported():
+            return False
+        try:
+            with open(self.path(shader), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return False
+
+        magic, binary_format = self._header.unpack_from(data) if len(data) >= self._header.size else (None, None)
+        if magic != self._magic or not shader._link_binary(binary_format, data[self._header.size:]):
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, shader):
+        """Saves the linked Shader's binary, replacing any older one."""
+        if not self.supported():
+            return
+        binary_format, binary = shader._program_binary()
+        if not binary:
+            return
+        handle, temp_path = tempfile.mkstemp(dir=self.directory)  # Renamed when complete, so it's never read half-written.
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self._header.pack(self._magic, binary_format))
+            f.write(binary)
+        os.replace(temp_path, self.path(shader))
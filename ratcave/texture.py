@@ -1,28 +1,172 @@
-import itertools
-from .utils import BindTargetMixin, BindingContextMixin, create_opengl_object
+import ctypes
+import os
+import queue
+import threading
+import weakref
+from collections import OrderedDict
+from functools import partial
+from .utils import BindTargetMixin, BindingContextMixin, GLResourceMixin, create_opengl_object, delete_opengl_object, \
+    check_residency, memmap_copy
 import pyglet
 from . import gl
 import numpy as np
 from .shader import HasUniforms
 
+# The OpenGL pixel type of each supported numpy dtype, and the internal formats of the floating-point ones.
+_pixel_types = {np.dtype(np.uint8): gl.GL_UNSIGNED_BYTE, np.dtype(np.float16): gl.GL_HALF_FLOAT,
+                np.dtype(np.float32): gl.GL_FLOAT}
+_float_formats = {(4, np.dtype(np.float16)): gl.GL_RGBA16F, (4, np.dtype(np.float32)): gl.GL_RGBA32F,
+                  (1, np.dtype(np.float16)): gl.GL_R16F, (1, np.dtype(np.float32)): gl.GL_R32F}
+
+
+# Image files loaded as CompressedTextures (see ratcave.compressed) rather than decoded by pyglet.
+compressed_extensions = ('.dds', '.ktx2')
+
+
+def row_alignment(row_bytes):
+    """Returns the largest GL_UNPACK_ALIGNMENT (8, 4, 2, or 1) that rows of this many bytes are padded to."""
+    for alignment in (8, 4, 2):
+        if row_bytes % alignment == 0:
+            return alignment
+    return 1
+
+
+def merge_rectangles(rectangles):
+    """Merges overlapping or touching (x, y, width, height) rectangles into their bounding rectangles."""
+    merged = []
+    for x, y, width, height in rectangles:
+        x0, y0, x1, y1 = x, y, x + width, y + height
+        idx = 0
+        while idx < len(merged):
+            mx0, my0, mx1, my1 = merged[idx]
+            if x0 <= mx1 and mx0 <= x1 and y0 <= my1 and my0 <= y1:
+                x0, y0, x1, y1 = min(x0, mx0), min(y0, my0), max(x1, mx1), max(y1, my1)
+                del merged[idx]
+                idx = 0  # The bigger rectangle may now touch ones that were already checked.
+            else:
+                idx += 1
+        merged.append((x0, y0, x1, y1))
+    return [(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in merged]
+
+
+class TextureUnits(object):
+
+    def __init__(self, first=1):
+        """
+        Assigns texture units to Textures when they're bound.  Textures stay bound to their unit after they're unbound,
+        until it's needed for another Texture (the least recently used one, preferably of the same target), so binding
+        them again doesn't call OpenGL.  Units below 'first' are left for other libraries, like pyglet, and for
+        ratcave's own glBindTexture() calls outside of it.
+
+        ratcave has one, texture_units, for the whole process, while texture bindings belong to each OpenGL context:
+        with several contexts, call forget() for Textures bound in another one, so they're bound again.
+        """
+        self.first = first
+        self.hits = 0
+        self.misses = 0
+        self._max_units = None
+        self._units = OrderedDict()  # unit: weak reference to its Texture, least recently used first.
+        self._in_use = {}  # unit: number of times its Texture is bound and not yet unbound.
 
-class Texture(HasUniforms, BindTargetMixin):
+    @property
+    def max_units(self):
+        """The number of texture units the fragment shader can use (queried once)."""
+        if self._max_units is None:
+            max_units = (gl.GLint * 1)()
+            gl.glGetIntegerv(gl.GL_MAX_TEXTURE_IMAGE_UNITS, max_units)
+            self._max_units = max_units[0]
+        return self._max_units
+
+    def unit_of(self, texture):
+        """Returns the unit the Texture is bound to, or None."""
+        unit = texture._unit
+        return unit if unit in self._units and self._units[unit]() is texture else None
+
+    def acquire(self, texture):
+        """Marks the Texture as in use, and returns its unit and whether it's already bound there."""
+        unit = self.unit_of(texture)
+        if unit is not None:
+            self.hits += 1
+            self._units.move_to_end(unit)
+            self._in_use[unit] += 1
+            return unit, True
+
+        self.misses += 1
+        unit = self._free_unit(texture.target)
+        self._units[unit] = weakref.ref(texture)
+        self._in_use[unit] = 1
+        texture._unit = unit
+        return unit, False
+
+    def _free_unit(self, target):
+        for unit in range(self.first, self.max_units):
+            if unit not in self._units:
+                return unit
+        for unit, ref in self._units.items():
+            if ref() is None:  # Garbage-collected.
+                del self._units[unit]
+                return unit
+
+        candidates = [unit for unit in self._units if not self._in_use[unit]]
+        if not candidates:
+            raise MemoryError("More Textures are bound at once than the {} texture units available.".format(
+                self.max_units - self.first))
+        unit = next((unit for unit in candidates if self._units[unit]().target == target), candidates[0])
+        self._units.pop(unit)()._unit = None
+        return unit
+
+    def release(self, texture):
+        """Marks the Texture as no longer in use, so its unit can be given to another one."""
+        unit = self.unit_of(texture)
+        if unit is not None and self._in_use[unit]:
+            self._in_use[unit] -= 1
+
+    def forget(self, texture):
+        """Frees the Texture's unit, for Textures that are deleted."""
+        unit = self.unit_of(texture)
+        if unit is not None:
+            del self._units[unit]
+            self._in_use[unit] = 0
+        texture._unit = None
+
+
+texture_units = TextureUnits()
+
+
+class Texture(HasUniforms, BindTargetMixin, GLResourceMixin):
 
     target = gl.GL_TEXTURE_2D
     target0 = gl.GL_TEXTURE_2D
     attachment_point = gl.GL_COLOR_ATTACHMENT0_EXT
     internal_fmt = gl.GL_RGBA
     pixel_fmt = gl.GL_RGBA
-    _slot_counter = itertools.count(start=1)
+    pixel_type = gl.GL_UNSIGNED_BYTE
+    dtype = np.dtype(np.uint8)
+    channels = 4
+    _float_formats = _float_formats
     bindfun = gl.glBindTexture
+    texel_bytes = 4
+    faces = 1
+
+    def __init__(self, values=None, name='TextureMap', width=1024, height=1024, mipmap=False, residency='keep',
+                 dtype=None, bgra=False, **kwargs):
+        """2D Color Texture class. Width and height can be set, and will generate a new OpenGL texture if no id is given.
+
+        The residency sets what happens to the values in memory once they're uploaded: 'keep' them, 'evict' them (the
+        values property then reads them back from the graphics card), or move them to a temporary 'memmap' file.
 
-    def __init__(self, values=None, name='TextureMap', width=1024, height=1024, mipmap=False, **kwargs):
-        """2D Color Texture class. Width and height can be set, and will generate a new OpenGL texture if no id is given."""
+        The dtype is uint8 (the default), float16, or float32; a float16 or float32 'values' array sets it.  If 'bgra',
+        values are in (blue, green, red, alpha) order, as some image and video libraries return them, and the graphics
+        card swaps the channels while uploading.
+        """
         super(Texture, self).__init__(**kwargs)
+        self.residency = check_residency(residency)
+        self._values = None
+        self._updates = []  # ((x, y, width, height), patch) changes waiting to be uploaded.
+        self._mipmaps_stale = False
+        self._set_format(dtype if dtype is not None else getattr(values, 'dtype', None), bgra)
 
-        self._slot = next(self._slot_counter)
-        if self._slot >= self.max_texture_limit:
-            raise MemoryError("More Textures have been created than your graphics Hardware can handle.")
+        self._unit = None  # Assigned by texture_units when bound.
         self.name = name
         self.mipmap = mipmap
 
@@ -32,6 +176,8 @@ class Texture(HasUniforms, BindTargetMixin):
             width, height = values.shape[1], values.shape[0]
         self.width = width
         self.height = height
+        self._track_gl_object(partial(delete_opengl_object, gl.glDeleteTextures, self.id), nbytes=self.nbytes)
+        self._add_to_scopes()
         with self:
             self._genTex2D()
             self._apply_filter_settings()
@@ -39,6 +185,25 @@ class Texture(HasUniforms, BindTargetMixin):
         if type(values) != type(None):
             self.values = values
 
+    def _set_format(self, dtype, bgra):
+        dtype = np.dtype(dtype) if dtype is not None and np.dtype(dtype) in _pixel_types else self.dtype
+        if dtype != self.dtype:
+            if (self.channels, dtype) not in self._float_formats:
+                raise ValueError("{} doesn't support {} values.".format(type(self).__name__, dtype))
+            self.internal_fmt = self._float_formats[self.channels, dtype]
+            self.pixel_type = _pixel_types[dtype]
+            self.dtype = dtype
+            self.texel_bytes = self.channels * dtype.itemsize
+        if bgra:
+            if self.channels != 4:
+                raise ValueError("Only four-channel Textures can have BGRA values.")
+            self.pixel_fmt = gl.GL_BGRA
+
+    @property
+    def shape(self):
+        """The shape of the texture's values array: (height x width x channels)."""
+        return self.height, self.width, self.channels
+
     @property
     def name(self):
         return self._name
@@ -47,55 +212,144 @@ class Texture(HasUniforms, BindTargetMixin):
     def name(self, name):
         if hasattr(self, '_name'):
             del self.uniforms.data[self._name]
-            del self.uniforms.data[self._name + '_isBound']
-            print('replaced name')
-
-        self.uniforms[name] = self._slot
-        self.uniforms[name + '_isBound'] = False
+        self.uniforms[name] = self._unit or 0
         self._name = name
 
     @property
     def values(self):
+        if self._values is None and self.residency == 'evict':
+            values = np.empty(self.shape, dtype=self.dtype)
+            with self:
+                gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, row_alignment(values.strides[-3]))
+                gl.glGetTexImage(self.target0, 0, self.pixel_fmt, self.pixel_type, values.ctypes.data)
+            values.setflags(write=False)
+            return values
         return self._values
 
     @values.setter
     def values(self, values):
-        arr = np.array(values).astype(np.uint8)
-        arr.setflags(write=False)
-
-        if arr.shape != (self.height, self.height, 4):
-            raise ValueError("Texture.values shape must match shape: width x height x 4 (RGBA)")
-
+        arr = np.ascontiguousarray(values, dtype=self.dtype)  # Only copied if it has to be converted.
+        if arr.ndim == 2 and self.channels == 1:
+            arr = arr[:, :, np.newaxis]
+        if arr.shape != self.shape:
+            raise ValueError("Texture.values shape must match shape: height x width x {} ({}), not {}".format(
+                self.channels, self.shape, arr.shape))
+
+        self._updates = []  # Replaced by the new values.
         with self:
-            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, self.width, self.height,
-                               gl.GL_RGBA, gl.GL_UNSIGNED_INT_8_8_8_8,
-                               (gl.GLubyte * arr.size)(*np.flip(arr, axis=2).flatten())
-                               )
+            self._upload(arr)
+        self._mipmaps_stale = True
+        if self.residency == 'evict':
+            self._values = None
+            return
+        if self.residency == 'memmap':
+            arr = memmap_copy(arr)
+        elif np.may_share_memory(arr, values):
+            arr = arr.copy()  # Keeps the stored values from changing along with the caller's array.
+        arr.setflags(write=False)
         self._values = arr
 
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def __setitem__(self, key, values):
+        """Updates a rectangle of the texture, like a numpy array: tex[y0:y1, x0:x1] = patch."""
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) > 2:
+            raise IndexError("Textures are updated by row and column, not by channel.")
+        rows, cols = (tuple(key) + (slice(None),))[:2]
+        (y0, y1), (x0, x1) = self._slice_bounds(rows, self.height), self._slice_bounds(cols, self.width)
+        self.update((x0, y0, x1 - x0, y1 - y0), values)
+
+    @staticmethod
+    def _slice_bounds(index, size):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(size)
+            if step != 1:
+                raise IndexError("Texture updates must be contiguous rectangles, so slice steps aren't supported.")
+            return start, max(start, stop)
+        index = int(index) + size if int(index) < 0 else int(index)
+        return index, index + 1
+
+    def update(self, region, values):
+        """
+        Replaces a rectangle of the texture's values.  The change is uploaded (along with any others, merged where
+        they overlap) the next time the Texture is bound, and its mipmaps are regenerated then.
+
+        Args:
+          - region (tuple): (x, y, width, height) of the rectangle, in pixels.  y counts rows of the values array.
+          - values (array): (height x width x channels) array, or anything that broadcasts to it.
+        """
+        x, y, width, height = region
+        if x < 0 or y < 0 or x + width > self.width or y + height > self.height:
+            raise ValueError("Region {} is outside of the {}x{} Texture.".format(region, self.width, self.height))
+        patch = np.asarray(values, dtype=self.dtype)
+        if patch.ndim == 2 and self.channels == 1:
+            patch = patch[:, :, np.newaxis]
+        patch = np.broadcast_to(patch, (height, width, self.channels))
+
+        if self._values is not None:  # The in-memory copy has every pixel, so changes can be merged and read from it.
+            self._values.setflags(write=True)
+            self._values[y:y + height, x:x + width] = patch
+            self._values.setflags(write=False)
+            self._updates.append((region, None))
+        else:
+            self._updates.append((region, np.array(patch)))
+        self._mipmaps_stale = True
+
+    def _upload(self, arr, x=0, y=0):
+        """Uploads a (height x width x channels) array to (x, y).  Its rows can be part of a wider array's."""
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, arr.strides[0] // arr.strides[1])
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, row_alignment(arr.strides[0]))
+        gl.glTexSubImage2D(self.target0, 0, x, y, arr.shape[1], arr.shape[0], self.pixel_fmt, self.pixel_type,
+                           arr.ctypes.data)
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+
+    def _upload_updates(self):
+        if not self._updates:
+            return
+        updates, self._updates = self._updates, []
+        if self._values is not None:
+            regions = merge_rectangles([region for region, _ in updates])
+            updates = [(region, self._values[region[1]:region[1] + region[3], region[0]:region[0] + region[2]])
+                       for region in regions]
+        for (x, y, _, _), patch in updates:
+            self._upload(patch, x, y)
+
     def bind(self):
-        gl.glActiveTexture(gl.GL_TEXTURE0 + self.slot)
-        super(Texture, self).bind()
-        self.uniforms['{}_isBound'.format(self.name)] = True
+        unit, resident = texture_units.acquire(self)
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        if not resident:
+            super(Texture, self).bind()
+        self._upload_updates()
+        if self._mipmaps_stale and self.mipmap:
+            self.generate_mipmap()
+            self._mipmaps_stale = False
+        self.uniforms[self.name] = unit
         try:
             self.uniforms.send()
         except UnboundLocalError:
             pass
 
     def unbind(self):
-        super(Texture, self).unbind()
-        self.uniforms['{}_isBound'.format(self.name)] = False
-        try:
-            self.uniforms.send()
-        except UnboundLocalError:
-            pass
-
+        """Lets the texture's unit be given to other Textures.  It stays bound there until then."""
+        texture_units.release(self)
         gl.glActiveTexture(gl.GL_TEXTURE0)
 
+    @property
+    def nbytes(self):
+        """The approximate size of the texture on the graphics card, in bytes."""
+        return self.width * self.height * self.texel_bytes * self.faces
+
     @property
     def slot(self):
-        """The texture's ActiveTexture slot."""
-        return self._slot
+        """The texture unit the texture is bound to, or None if it isn't bound to one."""
+        return texture_units.unit_of(self)
+
+    def release(self):
+        """Deletes the texture now.  Must be called from the thread that owns the OpenGL context."""
+        texture_units.forget(self)
+        super(Texture, self).release()
 
     def __enter__(self):
         self.bind()
@@ -107,13 +361,11 @@ class Texture(HasUniforms, BindTargetMixin):
     @property
     def max_texture_limit(self):
         """The maximum number of textures available for this graphic card's fragment shader."""
-        max_unit_array = (gl.GLint * 1)()
-        gl.glGetIntegerv(gl.GL_MAX_TEXTURE_IMAGE_UNITS, max_unit_array)
-        return max_unit_array[0]
+        return texture_units.max_units
 
     def _genTex2D(self):
         """Creates an empty texture in OpenGL."""
-        gl.glTexImage2D(self.target0, 0, self.internal_fmt, self.width, self.height, 0, self.pixel_fmt, gl.GL_UNSIGNED_BYTE, 0)
+        gl.glTexImage2D(self.target0, 0, self.internal_fmt, self.width, self.height, 0, self.pixel_fmt, self.pixel_type, 0)
 
     def generate_mipmap(self):
         if self.mipmap:
@@ -132,25 +384,275 @@ class Texture(HasUniforms, BindTargetMixin):
         gl.glTexParameterf(self.target, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
         gl.glTexParameterf(self.target, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
 
-    def attach_to_fbo(self):
-        """Attach the texture to a bound FBO object, for rendering to texture."""
-        gl.glFramebufferTexture2DEXT(gl.GL_FRAMEBUFFER_EXT, self.attachment_point, self.target0, self.id, 0)
+    def attach_to_fbo(self, index=0):
+        """Attach the texture to a bound FBO object, for rendering to texture.  Color textures are attached to the
+        FBO's index'th color attachment."""
+        gl.glFramebufferTexture2DEXT(gl.GL_FRAMEBUFFER_EXT, self.attachment_point + index, self.target0, self.id, 0)
+
+    @staticmethod
+    def load_image(img_filename, file=None):
+        """Returns an image file's pixels as a (height x width x 4) uint8 array.  Doesn't need an OpenGL context, so it
+        can run in a background thread.  If a file object is given, the image is read from it instead, and the filename
+        only hints at its format."""
+        img = pyglet.image.load(img_filename, file=file)
+        return np.ndarray(buffer=img.get_image_data().data, shape=(img.height, img.width, 4), dtype=np.uint8)
 
     @classmethod
     def from_image(cls, img_filename, mipmap=False, **kwargs):
         """Uses Pyglet's image.load function to generate a Texture from an image file. If 'mipmap', then texture will
-        have mipmap layers calculated."""
-        img = pyglet.image.load(img_filename)
-        arr = np.ndarray(buffer=img.get_image_data().data, shape=(img.height, img.width, 4), dtype=np.uint8)
-        return cls(values=arr, **kwargs)
+        have mipmap layers calculated.  DDS and KTX2 files make a CompressedTexture instead."""
+        if cls is Texture and os.path.splitext(img_filename)[1].lower() in compressed_extensions:
+            from .compressed import CompressedTexture  # Imports this module.
+            return CompressedTexture.from_file(img_filename, **kwargs)
+        return cls(values=cls.load_image(img_filename), **kwargs)
 
     def reset_uniforms(self):
         pass
 
+class PixelBuffer(BindingContextMixin, BindTargetMixin, GLResourceMixin):
+
+    target = gl.GL_PIXEL_UNPACK_BUFFER
+    bindfun = gl.glBindBuffer
+
+    def __init__(self, nbytes, usage=gl.GL_STREAM_DRAW):
+        """A Pixel Buffer Object: memory on the graphics card that textures can be updated from without waiting."""
+        self.id = create_opengl_object(gl.glGenBuffers)
+        self.nbytes = nbytes
+        self.usage = usage
+        self._track_gl_object(partial(delete_opengl_object, gl.glDeleteBuffers, self.id), nbytes=nbytes)
+        self._add_to_scopes()
+        with self:
+            gl.glBufferData(self.target, nbytes, None, usage)
+
+    def write(self, array):
+        """Replaces the buffer's data with the array's.  The old data is orphaned first, so this doesn't wait for
+        texture updates that are still reading it."""
+        with self:
+            gl.glBufferData(self.target, self.nbytes, None, self.usage)
+            gl.glBufferSubData(self.target, 0, array.nbytes, array.ctypes.data)
+
+    def map(self, access=gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT):
+        """Maps the buffer into memory, returned as a uint8 array that can be used from any thread until unmap().  By
+        default, it's mapped for writing, and the old data is orphaned."""
+        with self:
+            pointer = gl.glMapBufferRange(self.target, 0, self.nbytes, access)
+        if not pointer:
+            raise MemoryError("Pixel buffer {} couldn't be mapped.".format(self.id))
+        return np.ctypeslib.as_array((ctypes.c_ubyte * self.nbytes).from_address(pointer))
+
+    def unmap(self):
+        with self:
+            gl.glUnmapBuffer(self.target)
+
+
+class PixelPackBuffer(PixelBuffer):
+
+    target = gl.GL_PIXEL_PACK_BUFFER
+
+    def __init__(self, nbytes, usage=gl.GL_STREAM_READ):
+        """A Pixel Buffer Object that glReadPixels can copy into without waiting, to be read back later."""
+        super(PixelPackBuffer, self).__init__(nbytes, usage=usage)
+
+    def read(self, array):
+        """Copies the buffer's data into the array."""
+        with self:
+            gl.glGetBufferSubData(self.target, 0, array.nbytes, array.ctypes.data)
+
+
+class StreamingTexture(Texture):
+
+    def __init__(self, width=1024, height=1024, buffers=3, mapped=False, residency='evict', **kwargs):
+        """
+        A Texture for video and other values that change every frame.  Frames are written into a ring of Pixel Buffer
+        Objects, from any thread, and the newest one is copied into the texture by the graphics card the next time the
+        Texture is bound, without the OpenGL thread waiting for the copy.
+
+        Example::
+
+            tex = StreamingTexture(width=1920, height=1080)
+            threading.Thread(target=lambda: [tex.write(frame) for frame in video_frames]).start()
+            ...
+            with tex:  # In the OpenGL thread: starts uploading the newest frame written, if there is one.
+                mesh.draw()
+
+        Args:
+          - buffers (int): Number of frames that can be waiting for upload.  When they're all full, write() replaces the
+            oldest one, which is counted in dropped_frames.
+          - mapped (bool): Whether frames are written straight into mapped buffer memory.  Otherwise, they're written
+            to memory and sent with glBufferSubData when they're uploaded.
+        """
+        self.mapped = mapped
+        self.dropped_frames = 0
+        self._lock = threading.Lock()
+        self._free = queue.Queue()  # (buffer, frame array) pairs that can be written to.
+        self._ready = queue.Queue()  # Written pairs, oldest first.
+        super(StreamingTexture, self).__init__(width=width, height=height, residency=residency, **kwargs)
+        self._buffers = [PixelBuffer(self.nbytes // self.faces) for _ in range(buffers)]
+        self._staging = {} if mapped else {buffer.id: np.empty(self.shape, self.dtype) for buffer in self._buffers}
+        for buffer in self._buffers:
+            self._recycle(buffer)
+
+    def _recycle(self, buffer):
+        frame = buffer.map().view(self.dtype).reshape(self.shape) if self.mapped else self._staging[buffer.id]
+        self._free.put((buffer, frame))
+
+    def _count_dropped_frame(self):
+        with self._lock:
+            self.dropped_frames += 1
+
+    def write(self, values):
+        """Copies a (height x width x channels) frame into the next free buffer, to be uploaded when the Texture is next
+        bound.  Can be called from any thread."""
+        values = np.asarray(values, dtype=self.dtype)
+        if values.ndim == 2 and self.channels == 1:
+            values = values[:, :, np.newaxis]
+        if values.shape != self.shape:
+            raise ValueError("Frame shape must be {}, not {}".format(self.shape, values.shape))
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            try:
+                slot = self._ready.get_nowait()  # Replaces the oldest frame that hasn't been uploaded yet.
+                self._count_dropped_frame()
+            except queue.Empty:
+                slot = self._free.get()  # Every buffer is being uploaded right now.
+        slot[1][...] = values
+        self._ready.put(slot)
+
+    def _upload_updates(self):
+        super(StreamingTexture, self)._upload_updates()
+        latest = None
+        while True:
+            try:
+                slot = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            if latest is not None:
+                self._free.put(latest)  # Only the newest frame is uploaded.
+                self._count_dropped_frame()
+            latest = slot
+        if latest is None:
+            return
+
+        buffer, frame = latest
+        if self.mapped:
+            buffer.unmap()
+        else:
+            buffer.write(frame)
+        with buffer:
+            gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+            gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, row_alignment(frame[0].nbytes))
+            gl.glTexSubImage2D(self.target0, 0, 0, 0, self.width, self.height, self.pixel_fmt, self.pixel_type, 0)
+        self._values = None
+        self._mipmaps_stale = True
+        self._recycle(buffer)
+
+    def release(self):
+        """Deletes the texture and its pixel buffers now.  Must be called from the thread that owns the OpenGL context."""
+        super(StreamingTexture, self).release()
+        for buffer in self._buffers:
+            buffer.release()
+
+
+class TextureArray(Texture):
+
+    target = gl.GL_TEXTURE_2D_ARRAY
+    target0 = gl.GL_TEXTURE_2D_ARRAY
+
+    def __init__(self, values=None, name='TextureArrayMap', layers=1, width=1024, height=1024, **kwargs):
+        """
+        A stack of same-sized images in one texture (GL_TEXTURE_2D_ARRAY), so Meshes with different images can use one
+        Texture.  A Mesh picks its image with the 'texture_layer' uniform, which the default shader reads.
+
+        Args:
+            values (array): (layers x height x width x channels) array of the images.
+            layers (int): Number of images, if no values are given.
+        """
+        if values is not None:
+            values = np.asarray(values)
+            layers, height, width = values.shape[:3]
+            kwargs.setdefault('dtype', values.dtype)
+        self.layers = layers
+        super(TextureArray, self).__init__(name=name, width=width, height=height, **kwargs)
+        if values is not None:
+            self.values = values
+
+    @classmethod
+    def from_images(cls, img_filenames, **kwargs):
+        """Makes a TextureArray of image files, which must all be the same size, in the order given."""
+        return cls(values=np.stack([cls.load_image(filename) for filename in img_filenames]), **kwargs)
+
+    @property
+    def shape(self):
+        """The shape of the texture's values array: (layers x height x width x channels)."""
+        return (self.layers,) + super(TextureArray, self).shape
+
+    @property
+    def nbytes(self):
+        return super(TextureArray, self).nbytes * self.layers
+
+    def _genTex2D(self):
+        gl.glTexImage3D(self.target0, 0, self.internal_fmt, self.width, self.height, self.layers, 0, self.pixel_fmt,
+                        self.pixel_type, 0)
+
+    def _upload(self, arr, x=0, y=0, layer=0):
+        """Uploads a (layers x height x width x channels) array, starting at the given layer."""
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, row_alignment(arr.strides[-3]))
+        gl.glTexSubImage3D(self.target0, 0, x, y, layer, arr.shape[2], arr.shape[1], arr.shape[0], self.pixel_fmt,
+                           self.pixel_type, arr.ctypes.data)
+
+    def __setitem__(self, layer, values):
+        """Replaces one layer's image: tex[layer] = image."""
+        layer = int(layer) + self.layers if int(layer) < 0 else int(layer)
+        if not 0 <= layer < self.layers:
+            raise IndexError("Layer {} is out of range for a TextureArray with {} layers.".format(layer, self.layers))
+        image = np.ascontiguousarray(values, dtype=self.dtype)
+        if image.ndim == 2 and self.channels == 1:
+            image = image[:, :, np.newaxis]
+        if image.shape != self.shape[1:]:
+            raise ValueError("Layer shape must be {}, not {}".format(self.shape[1:], image.shape))
+        with self:
+            self._upload(image[np.newaxis], layer=layer)
+        if self._values is not None:
+            self._values.setflags(write=True)
+            self._values[layer] = image
+            self._values.setflags(write=False)
+        self._mipmaps_stale = True
+
+    def update(self, region, values, layer=0):
+        """
+        Replaces a rectangle of one layer's image.
+
+        Args:
+          - region (tuple): (x, y, width, height) of the rectangle, in pixels.  y counts rows of the values array.
+          - values (array): (height x width x channels) array, or anything that broadcasts to it.
+          - layer (int): The layer to update.
+        """
+        layer = int(layer) + self.layers if int(layer) < 0 else int(layer)
+        if not 0 <= layer < self.layers:
+            raise IndexError("Layer {} is out of range for a TextureArray with {} layers.".format(layer, self.layers))
+        x, y, width, height = region
+        if x < 0 or y < 0 or x + width > self.width or y + height > self.height:
+            raise ValueError("Region {} is outside of the {}x{} Texture.".format(region, self.width, self.height))
+        patch = np.asarray(values, dtype=self.dtype)
+        if patch.ndim == 2 and self.channels == 1:
+            patch = patch[:, :, np.newaxis]
+        patch = np.ascontiguousarray(np.broadcast_to(patch, (height, width, self.channels)))
+        with self:
+            self._upload(patch[np.newaxis], x, y, layer)
+        if self._values is not None:
+            self._values.setflags(write=True)
+            self._values[layer, y:y + height, x:x + width] = patch
+            self._values.setflags(write=False)
+        self._mipmaps_stale = True
+
+
 class TextureCube(Texture):
 
     target = gl.GL_TEXTURE_CUBE_MAP
     target0 = gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X
+    faces = 6
 
     def __init__(self, name='CubeMap', *args, **kwargs):
         """the Color Cube Texture class."""
@@ -171,7 +673,7 @@ class TextureCube(Texture):
         """Generate an empty texture in OpenGL"""
         for face in range(6):
             gl.glTexImage2D(self.target0 + face, 0, self.internal_fmt, self.width, self.height, 0,
-                            self.pixel_fmt, gl.GL_UNSIGNED_BYTE, 0)
+                            self.pixel_fmt, self.pixel_type, 0)
 
     @classmethod
     def from_image(cls, img_filename):
@@ -186,6 +688,8 @@ class DepthTexture(Texture):
     internal_fmt = gl.GL_DEPTH_COMPONENT
     pixel_fmt = gl.GL_DEPTH_COMPONENT
     attachment_point = gl.GL_DEPTH_ATTACHMENT_EXT
+    channels = 1
+    _float_formats = {}
 
     def __init__(self, name='DepthMap', *args, **kwargs):
         """the Color Cube Texture class."""
@@ -199,14 +703,18 @@ class DepthTexture(Texture):
 class GrayscaleTexture(Texture):
     internal_fmt = gl.GL_R8
     pixel_fmt = gl.GL_RED
+    texel_bytes = 1
+    channels = 1
 
 
 class GrayscaleTextureCube(TextureCube):
     internal_fmt = gl.GL_R8
     pixel_fmt = gl.GL_RED
+    texel_bytes = 1
+    channels = 1
 
 
-class RenderBuffer(BindingContextMixin, BindTargetMixin):
+class RenderBuffer(BindingContextMixin, BindTargetMixin, GLResourceMixin):
 
     target = gl.GL_RENDERBUFFER_EXT
     attachment_point = gl.GL_DEPTH_ATTACHMENT
@@ -218,8 +726,11 @@ class RenderBuffer(BindingContextMixin, BindTargetMixin):
         self.id = create_opengl_object(gl.glGenRenderbuffersEXT)
         self.width = width
         self.height = height
-        self.bind()
-        self._gen()
+        self._track_gl_object(partial(delete_opengl_object, gl.glDeleteRenderbuffersEXT, self.id),
+                              nbytes=width * height * 4)
+        self._add_to_scopes()
+        with self:  # Unbound afterward, so RenderBuffer._bound doesn't keep it alive.
+            self._gen()
 
     def _gen(self):
         gl.glRenderbufferStorageEXT(self.target, self.internal_fmt, self.width, self.height)
@@ -0,0 +1,156 @@
+"""
+Shares Textures made from image files across the whole program, so each image is only decoded and uploaded once, no
+matter how many Meshes, WavefrontReaders, or scenes use it.
+
+Example::
+
+    from ratcave.texture_cache import default_cache
+
+    default_cache.prefetch(['floor.png', 'wall.ktx2'])  # Decoded in background threads.
+    floor.textures.append(default_cache.get('floor.png'))  # Only uploaded here.
+    print(default_cache)
+"""
+
+import hashlib
+import io
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .compressed import CompressedImage, CompressedTexture, parse_compressed_image
+from .texture import Texture, compressed_extensions
+
+
+def _file_key(filename):
+    """Identifies a file's current version by its path, modification time, and size."""
+    path = os.path.realpath(filename)
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def _decode(filename, hash_contents):
+    """Returns (digest of the file's contents, or None if not 'hash_contents'; its decoded image)."""
+    with open(filename, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest() if hash_contents else None
+    if os.path.splitext(filename)[1].lower() in compressed_extensions:
+        return digest, parse_compressed_image(data)
+    return digest, Texture.load_image(filename, file=io.BytesIO(data))
+
+
+class TextureCache(object):
+
+    def __init__(self, budget=None, by_content=False, workers=4):
+        """
+        Textures of image files, made the first time each is asked for with get() and shared from then on.  Files are
+        told apart by their path and modification time, so a changed file is loaded again, or with 'by_content', by a
+        hash of their contents, so copies of an image under different paths share one Texture too.
+
+        When the Textures take more than 'budget' bytes on the graphics card, the least recently used ones are dropped
+        from the cache.  Their memory is freed once no Mesh uses them anymore; until then, get() still returns them.
+
+        Args:
+          - budget (int): The most bytes of Textures to keep, or None for no limit.
+          - by_content (bool): Whether to share Textures of files with the same contents.
+          - workers (int): Number of threads decoding prefetched images.
+        """
+        self.budget = budget
+        self.by_content = by_content
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._textures = OrderedDict()  # key: Texture, least recently used first.
+        self._evicted = weakref.WeakValueDictionary()  # key: Texture dropped from the cache but still used elsewhere.
+        self._decoding = {}  # file key: Future of _decode()'s result.
+        self._digests = {}  # file key: content digest, when by_content.
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<TextureCache(textures={}, nbytes={}, budget={}, hits={}, misses={}, evictions={})>".format(
+            len(self._textures), self.nbytes, self.budget, self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._textures)
+
+    def prefetch(self, filenames):
+        """Starts decoding the image files in background threads, so that get() only has to upload them."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            for filename in filenames:
+                try:
+                    file_key = _file_key(filename)
+                except OSError:
+                    continue  # Reported by get(), if it's ever asked for.
+                if file_key not in self._decoding and not self._is_cached(file_key):
+                    self._decoding[file_key] = self._executor.submit(_decode, filename, self.by_content)
+
+    def get(self, filename, **kwargs):
+        """
+        Returns the Texture of an image file (a CompressedTexture for DDS and KTX2 files), making it if it isn't
+        cached.  Must be called from the thread that owns the OpenGL context.  Keyword arguments are passed to the
+        Texture, and Textures made with different ones aren't shared.
+        """
+        file_key = _file_key(filename)
+        options = tuple(sorted(kwargs.items()))
+        texture = self._find((self._digests.get(file_key, file_key), options))
+        if texture is not None:
+            self.hits += 1
+            return texture
+
+        with self._lock:
+            future = self._decoding.pop(file_key, None)
+        digest, image = future.result() if future is not None else _decode(filename, self.by_content)
+        key = (file_key, options)
+        if digest is not None:
+            self._digests[file_key] = digest
+            key = (digest, options)
+            texture = self._find(key)  # The same image, from another file.
+            if texture is not None:
+                self.hits += 1
+                return texture
+
+        self.misses += 1
+        if isinstance(image, CompressedImage):
+            texture = CompressedTexture(image, **kwargs)
+        else:
+            texture = Texture(values=image, **kwargs)
+        self._add(key, texture)
+        return texture
+
+    def clear(self):
+        """Drops every Texture from the cache.  They're freed once no Mesh uses them anymore."""
+        self._textures.clear()
+        self._evicted.clear()
+        self._digests.clear()
+        self.nbytes = 0
+
+    def _is_cached(self, file_key):
+        key = self._digests.get(file_key, file_key)
+        return any(cached_key[0] == key for cached_key in list(self._textures) + list(self._evicted.keys()))
+
+    def _find(self, key):
+        texture = self._textures.get(key)
+        if texture is not None:
+            self._textures.move_to_end(key)
+            return texture
+        texture = self._evicted.pop(key, None)
+        if texture is not None:  # Still used by a Mesh, so it's put back instead of being made again.
+            self._add(key, texture)
+        return texture
+
+    def _add(self, key, texture):
+        self._textures[key] = texture
+        self.nbytes += texture.nbytes
+        while self.budget is not None and self.nbytes > self.budget and len(self._textures) > 1:
+            old_key, old_texture = self._textures.popitem(last=False)
+            self._evicted[old_key] = old_texture
+            self.nbytes -= old_texture.nbytes
+            self.evictions += 1
+
+
+default_cache = TextureCache()  # Shared by WavefrontReaders, unless they're given another one.
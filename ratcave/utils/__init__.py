@@ -1,5 +1,6 @@
 from . import gl
-from .gl import create_opengl_object, vec, get_viewport, clear_color, Viewport, GL_POINTS, GL_TRIANGLES
+from .gl import create_opengl_object, delete_opengl_object, vec, get_viewport, clear_color, Viewport, GL_POINTS, GL_TRIANGLES
 from .mixins import NameLabelMixin, BindTargetMixin, BindNoTargetMixin, BindingContextMixin
 from .observers import Observable, Observer, IterObservable, AutoRegisterObserver
+from .lifecycle import GLResourceMixin, ResourceScope, delete_pending, live_objects, check_residency, memmap_copy
 
@@ -18,13 +18,26 @@ class Enum(int):
         return self.name
 
 
-for module in [pyglet_gl, pyglet_gl.gl]:
-    for name in dir(module):
-        attr = getattr(module, name)
-        if isinstance(getattr(module, name), int):
-            locals()[name] = Enum((name, attr))
-        elif not name.startswith('_') and name not in ['pyglet', 'gl']:
-            locals()[name] = attr
+def __getattr__(name):
+    """Returns pyglet's OpenGL functions and constants, wrapping constants in an Enum (and caching them) when first
+    asked for, rather than wrapping thousands of them on import."""
+    if not name.startswith('_') and name not in ['pyglet', 'gl']:
+        for module in [pyglet_gl.gl, pyglet_gl]:
+            try:
+                attr = getattr(module, name)
+            except AttributeError:
+                continue
+            attr = Enum((name, attr)) if isinstance(attr, int) else attr
+            globals()[name] = attr
+            return attr
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def __dir__():
+    names = set(globals())
+    for module in [pyglet_gl, pyglet_gl.gl]:
+        names.update(name for name in dir(module) if not name.startswith('_') and name not in ['pyglet', 'gl'])
+    return sorted(names)
 
 
 def create_opengl_object(gl_gen_function, n=1):
@@ -37,6 +50,11 @@ def create_opengl_object(gl_gen_function, n=1):
         return handle.value  # Return handle value
 
 
+def delete_opengl_object(gl_delete_function, handle):
+    """Deletes an OpenGL object made with create_opengl_object, given the matching glDelete function."""
+    gl_delete_function(1, byref(pyglet_gl.GLuint(handle)))
+
+
 def vec(data, dtype=None):
         """ Makes GLfloat or GLuint vector containing float or uint args.
         By default, newtype is 'float', but can be set to 'int' to make
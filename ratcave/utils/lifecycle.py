@@ -0,0 +1,150 @@
+"""
+Keeps track of the OpenGL objects created by ratcave, so they can be deleted.
+
+OpenGL objects can only be deleted from the thread that owns the OpenGL context, so the objects of ratcave instances
+that are garbage-collected are queued, and deleted on the next call to delete_pending() (Scene.draw() calls it every
+frame).  To delete them deterministically instead, call release(), or create them inside a ResourceScope.
+"""
+
+import itertools
+import tempfile
+import threading
+import weakref
+from collections import deque, namedtuple
+import numpy as np
+
+ResourceStats = namedtuple('ResourceStats', 'count nbytes')
+
+# What happens to the in-memory copy of data once it's on the graphics card: kept in memory, evicted (and read back
+# from the graphics card when needed), or moved to a memory-mapped temporary file that the OS can page out.
+residency_policies = ('keep', 'evict', 'memmap')
+
+_keys = itertools.count()
+_live = {}  # key: (kind, nbytes)
+_owners = {}  # id of the owning instance: (key, finalizer)
+_pending = deque()
+_lock = threading.Lock()
+_scopes = threading.local()
+
+
+def _queue_delete(owner_id, key, delete):
+    _owners.pop(owner_id, None)
+    _pending.append((key, delete))
+
+
+def _delete(key, delete):
+    with _lock:
+        _live.pop(key, None)
+    delete()
+
+
+def _release(owner_id):
+    _, finalizer = _owners.pop(owner_id, (None, None))
+    info = finalizer.detach() if finalizer is not None else None
+    if info is not None:
+        _, _, (_, key, delete), _ = info
+        _delete(key, delete)
+
+
+def _register(owner, key, delete):
+    finalizer = weakref.finalize(owner, _queue_delete, id(owner), key, delete)
+    finalizer.atexit = False  # The OpenGL context is likely gone by then.
+    _owners[id(owner)] = key, finalizer
+
+
+def check_residency(residency):
+    if residency not in residency_policies:
+        raise ValueError("residency must be one of {}, not '{}'.".format(residency_policies, residency))
+    return residency
+
+
+def memmap_copy(array):
+    """Returns a copy of the array backed by a temporary memory-mapped file, whose pages the OS can drop from memory."""
+    array = np.asarray(array)
+    with tempfile.TemporaryFile() as f:  # The file is deleted once the memory map is closed.
+        mapped = np.memmap(f, dtype=array.dtype, mode='w+', shape=array.shape)
+    mapped[:] = array
+    return mapped
+
+
+def delete_pending():
+    """Deletes the OpenGL objects of garbage-collected ratcave instances.  Must be called from the thread that owns the
+    OpenGL context.  Returns the number of objects deleted."""
+    count = 0
+    while _pending:
+        key, delete = _pending.popleft()
+        _delete(key, delete)
+        count += 1
+    return count
+
+
+def live_objects():
+    """Returns a dict of ResourceStats (count, nbytes) of the OpenGL objects ratcave currently has, by type."""
+    stats = {}
+    with _lock:
+        for kind, nbytes in _live.values():
+            count, total = stats.get(kind, (0, 0))
+            stats[kind] = ResourceStats(count=count + 1, nbytes=total + nbytes)
+    return stats
+
+
+class ResourceScope(object):
+    """
+    Context manager that releases the OpenGL objects of every ratcave instance created inside its 'with' block when
+    the block ends, like the Meshes and Textures made for a single trial.  Instances created before the block (for
+    example, a Mesh copy's shared Geometry) are not released, even if they are first drawn inside it.
+
+    Example::
+
+        for trial in trials:
+            with ResourceScope():
+                stimulus = Mesh.from_incomplete_data(vertices=make_vertices(trial))
+                run_trial(stimulus)
+    """
+
+    def __init__(self):
+        self._instances = []
+
+    def __enter__(self):
+        if not hasattr(_scopes, 'stack'):
+            _scopes.stack = []
+        _scopes.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _scopes.stack.remove(self)
+        for ref in self._instances:
+            instance = ref()
+            if instance is not None:
+                instance.release()
+        del self._instances[:]
+
+
+class GLResourceMixin:
+    """Mixin for classes that own an OpenGL object, which is deleted by release() or after the instance is
+    garbage-collected."""
+
+    def _add_to_scopes(self):
+        """Registers a new instance with the ResourceScopes currently open in this thread."""
+        for scope in getattr(_scopes, 'stack', ()):
+            scope._instances.append(weakref.ref(self))
+
+    def _track_gl_object(self, delete, nbytes=0):
+        """Registers the instance's OpenGL object.  delete() deletes it, and shouldn't reference the instance."""
+        GLResourceMixin.release(self)
+        key = next(_keys)
+        with _lock:
+            _live[key] = type(self).__name__, int(nbytes)
+        _register(self, key, delete)
+
+    def _transfer_gl_object(self, other):
+        """Makes other the owner of this instance's OpenGL object, so it isn't deleted along with this instance."""
+        _, finalizer = _owners.pop(id(self), (None, None))
+        info = finalizer.detach() if finalizer is not None else None
+        if info is not None:
+            _, _, (_, key, delete), _ = info
+            _register(other, key, delete)
+
+    def release(self):
+        """Deletes the OpenGL object now.  Must be called from the thread that owns the OpenGL context."""
+        _release(id(self))
@@ -1,7 +1,12 @@
 import itertools
+import weakref
+from collections import namedtuple
+from functools import partial
+from ctypes import POINTER, c_void_p
 import numpy as np
-from . import gl
-from .utils import BindingContextMixin, BindNoTargetMixin, BindTargetMixin, create_opengl_object, vec
+from . import gl, bounds
+from .utils import BindingContextMixin, BindNoTargetMixin, BindTargetMixin, GLResourceMixin, create_opengl_object, \
+    delete_opengl_object, check_residency, memmap_copy
 from sys import platform
 
 
@@ -28,45 +33,401 @@ def reindex_vertices(arrays=None):
     return new_arrays, new_indices
 
 
-class VertexArray(BindingContextMixin, BindNoTargetMixin):
+AttributeFormat = namedtuple('AttributeFormat', 'dtype gl_type normalized')
+
+# Formats that vertex arrays can be stored in on the graphics card.  Normalized integer formats are read by shaders as
+# floats in [-1, 1] (signed) or [0, 1] (unsigned); 'octahedral' stores unit normals as two signed 16-bit values.
+attribute_formats = {'float32': AttributeFormat(np.float32, gl.GL_FLOAT, False),
+                     'float16': AttributeFormat(np.float16, gl.GL_HALF_FLOAT, False),
+                     'snorm16': AttributeFormat(np.int16, gl.GL_SHORT, True),
+                     'unorm16': AttributeFormat(np.uint16, gl.GL_UNSIGNED_SHORT, True),
+                     'unorm8': AttributeFormat(np.uint8, gl.GL_UNSIGNED_BYTE, True),
+                     'octahedral': AttributeFormat(np.int16, gl.GL_SHORT, True),
+                     }
+
+# A compact choice for (vertices, normals, texcoords): about half the memory of float32 arrays.
+compact_formats = ('snorm16', 'octahedral', 'unorm16')
+
+
+def octahedral_encode(normals):
+    """Returns Nx2 octahedral coordinates (in [-1, 1]) from an Nx3 array of normal vectors."""
+    normals = np.asarray(normals, dtype=np.float32)
+    normals = normals / np.maximum(np.abs(normals).sum(axis=1, keepdims=True), 1e-12)
+    encoded = normals[:, :2].copy()
+    lower = normals[:, 2] < 0  # Fold the lower hemisphere over the diagonals.
+    encoded[lower] = (1. - np.abs(normals[lower][:, [1, 0]])) * np.where(encoded[lower] >= 0, 1., -1.)
+    return encoded
+
+
+def octahedral_decode(encoded):
+    """Returns Nx3 unit normal vectors from an Nx2 array of octahedral coordinates."""
+    encoded = np.asarray(encoded, dtype=np.float32)
+    normals = np.column_stack((encoded, 1. - np.abs(encoded).sum(axis=1)))
+    lower = normals[:, 2] < 0
+    normals[lower, :2] = (1. - np.abs(encoded[lower][:, [1, 0]])) * np.where(encoded[lower] >= 0, 1., -1.)
+    return normals / np.linalg.norm(normals, axis=1, keepdims=True)
+
+
+def encode_attribute(array, fmt):
+    """
+    Returns a contiguous copy of a 2D float array converted to one of the attribute_formats.
+
+    Values are clipped to the range of normalized integer formats.  Rows are padded with zeros to a multiple of
+    4 bytes, which graphics cards prefer for vertex attributes.
+    """
+    array = np.asarray(array, dtype=np.float32)
+    if fmt == 'octahedral':
+        array = octahedral_encode(array)
+    dtype = np.dtype(attribute_formats[fmt].dtype)
+    if dtype.kind in 'iu':
+        info = np.iinfo(dtype)
+        array = np.round(np.clip(array, -1. if info.min < 0 else 0., 1.) * info.max)
+    encoded = array.astype(dtype)
+
+    row_bytes = encoded.shape[1] * dtype.itemsize
+    if row_bytes % 4:
+        padding = np.zeros((encoded.shape[0], (4 - row_bytes % 4) // dtype.itemsize), dtype=dtype)
+        encoded = np.hstack((encoded, padding))
+    return np.ascontiguousarray(encoded)
+
+
+class VertexArray(BindingContextMixin, BindNoTargetMixin, GLResourceMixin):
 
     bindfun = gl.glBindVertexArray if platform != 'darwin' else gl.glBindVertexArrayAPPLE
 
-    def __init__(self, arrays, indices=None, drawmode=gl.GL_TRIANGLES, reindex=True, **kwargs):
+    def __init__(self, arrays, indices=None, drawmode=gl.GL_TRIANGLES, reindex=True, formats=None, residency='keep',
+                 **kwargs):
+        """
+        Vertex arrays and (optional) indices, uploaded to the graphics card as a Vertex Array Object when first drawn.
+
+        Args:
+            formats (tuple): the attribute format (a key of attribute_formats) of each array on the graphics card.
+                Defaults to 'float32' for all arrays.  Positions (the first array) in a normalized integer format are
+                fit to the vertices' bounding box, and restored with the dequantization_matrix.  Arrays in formats
+                other than 'float32' are re-encoded when modified.
+            residency (str): what happens to the arrays in memory once they are uploaded: 'keep' them, 'evict' them
+                (see evict()), or move them to a temporary 'memmap' file that the OS can page out of memory.
+        """
         super(VertexArray, self).__init__(**kwargs)
         if indices is None and reindex:
             arrays, indices = reindex_vertices(arrays)  # Indexing
         self.id = None
         self.arrays = [np.array(vert, dtype=np.float32) for vert in arrays]
-        self.indices = np.array(indices, dtype=np.uint32).view(type=ElementArrayBuffer) if not indices is None else indices
+        self.indices = np.array(indices, dtype=np.uint32) if not indices is None else indices
+        self.formats = tuple(formats) if formats else ('float32',) * len(self.arrays)
+        if len(self.formats) != len(self.arrays):
+            raise ValueError("VertexArray needs one format for each array.")
+        for fmt in self.formats:
+            if fmt not in attribute_formats:
+                raise ValueError("Unknown attribute format '{}'.  Options: {}".format(fmt, sorted(attribute_formats)))
+        self.dequantization_matrix = np.identity(4, dtype=np.float32)
+        self._encoded_buffers = {}
         self._loaded = False
+        self._dirty = set()
+        self.version = 0
         self.drawmode = drawmode
+        self.residency = check_residency(residency)
+        self._add_to_scopes()
+
+    def mark_modified(self, index):
+        """Notes that the array at index was changed in-place, so it is re-uploaded the next time it is drawn."""
+        self._dirty.add(index)
+        self.version += 1
 
+    def encode_array(self, index):
+        """Returns the array at index, converted to its attribute format for uploading to the graphics card."""
+        array, fmt = np.asarray(self.arrays[index]), self.formats[index]
+        if index == 0 and attribute_formats[fmt].normalized:
+            # Fit positions into the format's range, keeping the inverse transform to apply in the vertex shader.
+            low = -1. if np.dtype(attribute_formats[fmt].dtype).kind == 'i' else 0.
+            vmin, vmax = array.min(axis=0), array.max(axis=0)
+            scale = np.where(vmax > vmin, (vmax - vmin) / (1. - low), 1.)
+            offset = vmin - low * scale
+            self.dequantization_matrix[:] = np.identity(4)
+            self.dequantization_matrix[:3, :3] = np.diag(scale)
+            self.dequantization_matrix[:3, 3] = offset
+            array = (array - offset) / scale
+        return encode_attribute(array, fmt)
 
     def load_vertex_array(self):
+        """Uploads the arrays and indices to the graphics card.  Must be called from the thread that owns the OpenGL context."""
         self.id = create_opengl_object(gl.glGenVertexArrays if platform != 'darwin' else gl.glGenVertexArraysAPPLE)
+        delete_fun = gl.glDeleteVertexArrays if platform != 'darwin' else gl.glDeleteVertexArraysAPPLE
+        self._track_gl_object(partial(delete_opengl_object, delete_fun, self.id))
+        if self.residency == 'memmap':
+            self.arrays = [memmap_copy(array) if self._uploads_array(array) else array for array in self.arrays]
+            if self._uploads_array(self.indices):
+                self.indices = memmap_copy(self.indices)
+        if self._uploads_array(self.indices):
+            self.indices = self.indices.view(type=ElementArrayBuffer)
         with self:
             for loc, verts in enumerate(self.arrays):
-                vbo = verts.view(type=VertexBuffer)
+                fmt = attribute_formats[self.formats[loc]]
+                if self.formats[loc] == 'float32':
+                    vbo = verts.view(type=VertexBuffer) if self._uploads_array(verts) else verts
+                    self.arrays[loc] = vbo
+                else:
+                    vbo = self.encode_array(loc).view(type=VertexBuffer)
+                    self._encoded_buffers[loc] = vbo
                 with vbo:
-                    gl.glVertexAttribPointer(loc, verts.shape[1], gl.GL_FLOAT, gl.GL_FALSE, 0, 0)
+                    gl.glVertexAttribPointer(loc, vbo.shape[1], fmt.gl_type, fmt.normalized, 0, 0)
                     gl.glEnableVertexAttribArray(loc)
-                self.arrays[loc] = vbo
         self._loaded = True
+        self._dirty.clear()
+        if self.residency == 'evict':
+            self.evict()
 
-    def draw(self):
+    @staticmethod
+    def _uploads_array(array):
+        """Whether an array still needs a buffer on the graphics card."""
+        return array is not None and not isinstance(array, (VertexBuffer, DeviceBuffer))
+
+    def evict(self):
+        """
+        Drops the in-memory copies of the arrays and indices that are on the graphics card.  They are read back from
+        it when accessed, and dropped again once they're no longer referenced.  Arrays in compact formats keep their
+        float32 copies in memory, since the uploaded versions are lossy.
+        """
+        self.arrays = [DeviceBuffer(array) if isinstance(array, VertexBuffer) else array for array in self.arrays]
+        self._encoded_buffers = {loc: DeviceBuffer(buffer) if isinstance(buffer, VertexBuffer) else buffer
+                                 for loc, buffer in self._encoded_buffers.items()}
+        if isinstance(self.indices, VertexBuffer):
+            self.indices = DeviceBuffer(self.indices)
+
+    def release(self):
+        """Deletes the vertex array and its buffers from the graphics card.  The arrays stay in memory, and are uploaded
+        again if the VertexArray is drawn again."""
+        super(VertexArray, self).release()
+        buffers = list(itertools.chain(self.arrays, self._encoded_buffers.values(), [self.indices]))
+        self.arrays = [np.asarray(array) for array in self.arrays]
+        self.indices = np.asarray(self.indices) if self.indices is not None else None
+        for buffer in buffers:
+            if isinstance(buffer, (VertexBuffer, DeviceBuffer)):
+                buffer.release()
+        self._encoded_buffers = {}
+        self.id, self._loaded = None, False
+
+    def upload(self):
+        """Uploads the arrays to the graphics card if they aren't there yet, or re-uploads the ones modified since."""
         if not self._loaded:
             self.load_vertex_array()
+        for index in self._dirty:
+            if index in self._encoded_buffers:
+                self._encoded_buffers[index][:] = self.encode_array(index)
+            else:
+                self.arrays[index].upload()
+        self._dirty.clear()
+        for buffer in itertools.chain(self.arrays, [self.indices]):
+            if isinstance(buffer, DeviceBuffer):
+                buffer.unpin()
 
+    def draw(self, drawmode=None):
+        self.upload()
+
+        drawmode = self.drawmode if drawmode is None else drawmode
         with self:
             if self.indices is None:
-                gl.glDrawArrays(self.drawmode, 0, self.arrays[0].shape[0])
+                gl.glDrawArrays(drawmode, 0, self.arrays[0].shape[0])
             else:
                 with self.indices as indices:
-                    gl.glDrawElements(self.drawmode, indices.shape[0], gl.GL_UNSIGNED_INT, 0)
+                    gl.glDrawElements(drawmode, indices.shape[0], gl.GL_UNSIGNED_INT, 0)
+
+    def draw_ranges(self, starts, counts, drawmode=None):
+        """
+        Draws several ranges of the indices in one call (with glMultiDrawElements).
+
+        Args:
+            starts (array): the first index of each range.
+            counts (array): the number of indices in each range.
+        """
+        if self.indices is None:
+            raise ValueError("VertexArray.draw_ranges() needs indices.")
+        self.upload()
+
+        drawmode = self.drawmode if drawmode is None else drawmode
+        counts = np.ascontiguousarray(counts, dtype=np.int32)
+        offsets = np.ascontiguousarray(starts, dtype=np.uintp) * self.indices.itemsize  # byte offsets, passed as pointers
+        with self, self.indices:
+            if len(counts) == 1:
+                gl.glDrawElements(drawmode, int(counts[0]), gl.GL_UNSIGNED_INT, int(offsets[0]))
+            else:
+                gl.glMultiDrawElements(drawmode, counts.ctypes.data_as(POINTER(gl.GLsizei)), gl.GL_UNSIGNED_INT,
+                                       offsets.ctypes.data_as(POINTER(c_void_p)), len(counts))
+
+
+class Geometry(VertexArray):
+
+    def __init__(self, arrays, indices=None, drawmode=gl.GL_TRIANGLES, reindex=True, formats=None, residency='keep',
+                 **kwargs):
+        """
+        Vertex data (arrays, indices, and their VertexArray on the graphics card) that can be shared between Meshes.
+
+        A Geometry keeps track of the Meshes that draw it, so copies made with Mesh.copy() can reuse one set of arrays
+        in memory and one set of buffers on the graphics card.  A Mesh that modifies a shared Geometry's arrays gets
+        its own copy of the Geometry first (copy-on-write); modifying the Geometry directly changes every Mesh using it.
+
+        Args:
+            arrays (tuple): a list of 2D arrays to be rendered.  All arrays should have same number of rows.
+            indices (array): optional element indices.  If None and reindex is True, they are built from the arrays.
+            drawmode: the default OpenGL draw mode.
+            reindex (bool): whether to remove duplicate vertices and draw with indices.
+            formats (tuple): the attribute format of each array on the graphics card (see VertexArray).
+            residency (str): whether to 'keep', 'evict' or 'memmap' the arrays in memory after uploading (see VertexArray).
+        """
+        super(Geometry, self).__init__(arrays=arrays, indices=indices, drawmode=drawmode, reindex=reindex,
+                                       formats=formats, residency=residency, **kwargs)
+        self._users = weakref.WeakSet()
+        self._bounds = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['arrays'] = [np.array(array) for array in self.arrays]
+        state['indices'] = np.array(self.indices) if self.indices is not None else None
+        state['id'], state['_loaded'], state['_encoded_buffers'], state['_dirty'] = None, False, {}, set()
+        del state['_users']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._users = weakref.WeakSet()
+
+    @property
+    def refcount(self):
+        """The number of Meshes currently drawing this Geometry."""
+        return len(self._users)
+
+    def add_user(self, mesh):
+        self._users.add(mesh)
+
+    def remove_user(self, mesh):
+        self._users.discard(mesh)
+
+    def copy(self):
+        """Returns a new, unshared Geometry with copies of this Geometry's arrays and indices."""
+        indices = np.array(self.indices) if self.indices is not None else None
+        return Geometry(arrays=[np.array(array) for array in self.arrays], indices=indices,
+                        drawmode=self.drawmode, reindex=False, formats=self.formats, residency=self.residency)
+
+    def _cached_bounds(self, name, calculate):
+        version, value = self._bounds.get(name, (None, None))
+        if version != self.version:
+            value = calculate(np.asarray(self.arrays[0]))
+            self._bounds[name] = self.version, value
+        return value
+
+    @property
+    def aabb(self):
+        """The (2 x 3) axis-aligned bounding box (min and max corners) of the vertices, recalculated only when they change."""
+        return self._cached_bounds('aabb', bounds.aabb_from_points)
 
+    @property
+    def bounding_sphere(self):
+        """A BoundingSphere (center, radius) around the vertices, recalculated only when they change."""
+        return self._cached_bounds('sphere', lambda vertices: bounds.sphere_from_points(vertices, aabb=self.aabb))
 
-class VertexBuffer(BindingContextMixin, BindTargetMixin, np.ndarray):
+    @property
+    def obb(self):
+        """An OrientedBox (center, axes, half_extents) around the vertices, aligned to their principal axes."""
+        return self._cached_bounds('obb', bounds.obb_from_points)
+
+    def _set_array(self, index, value):
+        if np.shape(value) == self.arrays[index].shape:
+            np.asarray(self.arrays[index])[:] = value
+            self.mark_modified(index)
+        else:
+            self.arrays[index] = np.array(value, dtype=np.float32)
+            self._loaded = False
+            self.version += 1
+
+    @property
+    def vertices(self):
+        return GeometryArrayView.from_geometry(self, 0)
+
+    @vertices.setter
+    def vertices(self, value):
+        self._set_array(0, value)
+
+    @property
+    def normals(self):
+        return GeometryArrayView.from_geometry(self, 1)
+
+    @normals.setter
+    def normals(self, value):
+        self._set_array(1, value)
+
+    @property
+    def texcoords(self):
+        return GeometryArrayView.from_geometry(self, 2)
+
+    @texcoords.setter
+    def texcoords(self, value):
+        self._set_array(2, value)
+
+
+class GeometryArrayView(np.ndarray):
+    """
+    View of one of a Geometry's arrays, as returned by the vertices, normals and texcoords properties.
+
+    Writes to the view (item assignment, or in-place operations like view += 1) are uploaded to the graphics card the
+    next time the Geometry is drawn.  Views taken from a Mesh whose Geometry is shared with other Meshes are read-only;
+    item assignment (including view[:] += 1) gives the Mesh its own copy of the Geometry before writing, so the other
+    Meshes are unaffected.
+    """
+    _geometry, _index, _mesh = None, None, None
+
+    @classmethod
+    def from_geometry(cls, geometry, index):
+        view = np.asarray(geometry.arrays[index]).view(cls)
+        view._geometry, view._index = geometry, index
+        return view
+
+    @classmethod
+    def from_mesh(cls, mesh, index):
+        view = cls.from_geometry(mesh.geometry, index)
+        if mesh.geometry.refcount > 1:
+            view.flags.writeable = False
+            view._mesh = mesh
+        return view
+
+    def __array_finalize__(self, obj):
+        # Views of this view still report writes to the Geometry; copies (which own their data) don't.
+        shares_data = self.base is not None
+        self._geometry = getattr(obj, '_geometry', None) if shares_data else None
+        self._index = getattr(obj, '_index', None) if shares_data else None
+        self._mesh = None
+
+    def _modified(self):
+        if self._geometry is not None:
+            self._geometry.mark_modified(self._index)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(np.asarray(x) if isinstance(x, GeometryArrayView) else x for x in inputs)
+        out = kwargs.pop('out', ())
+        if any(isinstance(arr, GeometryArrayView) and not arr.flags.writeable for arr in out):
+            # In-place operations return a new array instead, which Python then writes back through __setitem__.
+            return getattr(ufunc, method)(*inputs, **kwargs)
+        if out:
+            kwargs['out'] = tuple(np.asarray(arr) if isinstance(arr, GeometryArrayView) else arr for arr in out)
+        result = getattr(ufunc, method)(*inputs, **kwargs)
+        if not out:
+            return result
+        for arr in out:
+            if isinstance(arr, GeometryArrayView):
+                arr._modified()
+        return out[0] if len(out) == 1 else out
+
+    def __setitem__(self, key, value):
+        if self._mesh is not None:
+            mesh, index = self._mesh, self._index
+            mesh._unshare_geometry()
+            np.asarray(mesh.geometry.arrays[index])[key] = value
+            mesh.geometry.mark_modified(index)
+        else:
+            super(GeometryArrayView, self).__setitem__(key, value)
+            self._modified()
+
+
+class VertexBuffer(BindingContextMixin, BindTargetMixin, GLResourceMixin, np.ndarray):
 
     target = gl.GL_ARRAY_BUFFER
     bindfun = gl.glBindBuffer
@@ -74,15 +435,84 @@ class VertexBuffer(BindingContextMixin, BindTargetMixin, np.ndarray):
     def __array_finalize__(self, obj):
         if not isinstance(obj, VertexBuffer):  # only do this when creating from arrays (e.g. array.view(type=VBO))
             self.id = create_opengl_object(gl.glGenBuffers)
+            self._track_gl_object(partial(delete_opengl_object, gl.glDeleteBuffers, self.id), nbytes=self.nbytes)
             with self:
-                gl.glBufferData(self.target, 4 * self.size, vec(self.ravel()), gl.GL_STATIC_DRAW)
+                gl.glBufferData(self.target, self.nbytes, self.ctypes.data, gl.GL_STATIC_DRAW)
         return self
 
     def __setitem__(self, key, value):
         super(VertexBuffer, self).__setitem__(key, value)
+        self.upload()
+
+    def upload(self):
+        """Copies the array's data to its buffer on the graphics card."""
         with self:
-            gl.glBufferSubData(self.target, 0, 4 * self.size, vec(self.ravel()))
+            gl.glBufferSubData(self.target, 0, self.nbytes, self.ctypes.data)
 
 
 class ElementArrayBuffer(VertexBuffer):
     target = gl.GL_ELEMENT_ARRAY_BUFFER
+
+
+class DeviceBuffer(BindingContextMixin, GLResourceMixin):
+
+    def __init__(self, vbo):
+        """
+        A buffer on the graphics card whose data isn't kept in memory, made by evicting a VertexBuffer.
+
+        The data is read back from the graphics card when it's accessed (e.g. with np.asarray()), and kept in memory
+        only while it is referenced or waiting to be uploaded after a modification.
+        """
+        self.id, self.target, self.shape, self.dtype = vbo.id, vbo.target, vbo.shape, vbo.dtype
+        self._values = lambda: None  # weak reference to the data read back, if any
+        self._pinned = None
+        vbo._transfer_gl_object(self)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.read()
+        return values if dtype is None else values.astype(dtype)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice) and key == slice(None) and self._values() is None:
+            self._pinned = np.empty(self.shape, self.dtype)  # No need to read back data that will all be replaced.
+            self._values = weakref.ref(self._pinned)
+        self.read()[key] = value
+        self.upload()
+
+    @property
+    def itemsize(self):
+        return self.dtype.itemsize
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.itemsize
+
+    def bind(self):
+        gl.glBindBuffer(self.target, self.id)
+
+    def unbind(self):
+        gl.glBindBuffer(self.target, 0)
+
+    def read(self):
+        """Returns the buffer's data, reading it back from the graphics card if it isn't in memory."""
+        values = self._values()
+        if values is None:
+            values = np.empty(self.shape, self.dtype)
+            gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, self.id)
+            gl.glGetBufferSubData(gl.GL_COPY_READ_BUFFER, 0, values.nbytes, values.ctypes.data)
+            gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, 0)
+            self._values = weakref.ref(values)
+        self._pinned = values  # Kept until the next upload, in case it's modified.
+        return values
+
+    def upload(self):
+        """Copies the data in memory (if it was read back and modified) to the graphics card."""
+        values = self._values()
+        if values is not None:
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.id)
+            gl.glBufferSubData(gl.GL_COPY_WRITE_BUFFER, 0, values.nbytes, values.ctypes.data)
+            gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, 0)
+
+    def unpin(self):
+        """Lets the data read back be dropped from memory once nothing else references it."""
+        self._pinned = None
@@ -1,6 +1,9 @@
+from collections import OrderedDict
 from .mesh import Mesh
 from wavefront_reader import read_wavefront
 from . import Texture
+from .atlas import TextureAtlas
+from .texture_cache import default_cache
 
 class WavefrontReader:
 
@@ -15,17 +18,28 @@ class WavefrontReader:
                              'map_Kd': 'map_Kd',
                              }
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, atlas=False, cache=default_cache):
         """
         Reads Wavefront (.obj) files created in Blender to build ratcave.graphics Mesh objects.
         :param file_name: .obj file to read (assumes an accompanying .mtl file has the same base file name.)
         :type file_name: str
+        :param atlas: whether to pack the images of all the file's materials into one TextureAtlas, and remap the
+            Meshes' texture coordinates into it, so they share a Texture (and can be batched together).
+        :type atlas: bool
+        :param cache: where the materials' Textures are shared from (by default, with every other WavefrontReader).
+            The images start decoding in background threads right away.
+        :type cache: TextureCache
         :return:
         :rtype: WavefrontReader
         """
         self.file_name = file_name
         self.bodies = read_wavefront(file_name)
         self.textures = {}
+        self.use_atlas = atlas
+        self.atlas = None
+        self.cache = cache
+        if cache is not None and not atlas:
+            cache.prefetch(self.images())
 
     def get_mesh(self, body_name, **kwargs):
         """Builds Mesh from geom name in the wavefront file.  Takes all keyword arguments that Mesh takes."""
@@ -33,25 +47,47 @@ class WavefrontReader:
         vertices = body['v']
         normals = body['vn'] if 'vn' in body else None
         texcoords = body['vt'] if 'vt' in body else None
+        image = body.get('material', {}).get('map_Kd')
+        if self.use_atlas and image is not None and texcoords is not None and len(texcoords):
+            texcoords = self.get_atlas().remap_texcoords(texcoords, image)
         mesh = Mesh.from_incomplete_data(vertices=vertices, normals=normals, texcoords=texcoords, **kwargs)
 
-        uniforms = kwargs['uniforms'] if 'uniforms' in kwargs else {}
         if 'material' in body:
-            material_props = {self.material_property_map[key]: value for key, value in body['material'].items()}
-            for key, value in material_props.items():
-                if isinstance(value, str):
-                    if key == 'map_Kd':
-                        if not value in self.textures:
-                            self.textures[value] = Texture.from_image(value)
-                        mesh.textures.append(self.textures[value])
-                    else:
-                        setattr(mesh, key, value)
-                elif hasattr(value, '__len__'):  # iterable materials
-                    mesh.uniforms[key] = value
-                elif key in ['d', 'illum']:  # integer materials
-                    mesh.uniforms[key] = value
-                elif key in ['spec_weight', 'Ni']:  # float materials: should be specially converted to float if not already done.
-                    mesh.uniforms[key] = float(value)
-                else:
-                    print('Warning: Not applying uniform {}: {}'.format(key, value))
+            self.apply_material(mesh, body['material'], self.textures, cache=self.cache)
         return mesh
+
+    def get_atlas(self):
+        """Returns the TextureAtlas of the images of all the file's materials, packing it the first time."""
+        if self.atlas is None:
+            images = self.images()
+            self.atlas = TextureAtlas.from_images(images)
+            self.textures.update((image, self.atlas.texture) for image in images)
+        return self.atlas
+
+    def images(self):
+        """Returns the filenames of the images of the file's materials, without repeats."""
+        return list(OrderedDict.fromkeys(body['material']['map_Kd'] for body in self.bodies.values()
+                                         if 'map_Kd' in body.get('material', {})))
+
+    @classmethod
+    def apply_material(cls, mesh, material, textures, cache=None):
+        """Sets a Mesh's uniforms and textures from a wavefront material.  Textures are reused from (and added to) the
+        'textures' dict, which maps image filenames to Textures, and are otherwise taken from the TextureCache, if
+        given."""
+        material_props = {cls.material_property_map[key]: value for key, value in material.items()}
+        for key, value in material_props.items():
+            if isinstance(value, str):
+                if key == 'map_Kd':
+                    if not value in textures:
+                        textures[value] = cache.get(value) if cache is not None else Texture.from_image(value)
+                    mesh.textures.append(textures[value])
+                else:
+                    setattr(mesh, key, value)
+            elif hasattr(value, '__len__'):  # iterable materials
+                mesh.uniforms[key] = value
+            elif key in ['d', 'illum']:  # integer materials
+                mesh.uniforms[key] = value
+            elif key in ['spec_weight', 'Ni']:  # float materials: should be specially converted to float if not already done.
+                mesh.uniforms[key] = float(value)
+            else:
+                print('Warning: Not applying uniform {}: {}'.format(key, value))
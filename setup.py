@@ -10,8 +10,9 @@ setup(name='ratcave',
       packages=find_packages(exclude=['docs']),
       include_package_data=True,
       package_data={'': ['../assets/*.'+el for el in ['png', 'obj', 'mtl']] +
-                        ['../shaders/*/*'+el for el in ['vert', 'frag']]
+                        ['../shaders/*/*'+el for el in ['vert', 'frag']] + ['../shaders/*.glsl']
                     },
+      python_requires='>=3.7',
       install_requires=['pyglet==1.3.3', 'numpy', 'scipy', 'wavefront_reader'],
       setup_requires=['pytest-runner'],
       tests_require = ['pytest'],
@@ -23,10 +24,6 @@ setup(name='ratcave',
           "Intended Audience :: Science/Research",
           "Programming Language :: Python",
           "Programming Language :: Python :: 3",
-          "Programming Language :: Python :: 3.3",
-          "Programming Language :: Python :: 3.4",
-          "Programming Language :: Python :: 3.5",
-          "Programming Language :: Python :: 3.6",
           "Programming Language :: Python :: 3.7",
           "Programming Language :: Python :: 3.8",
       ],
@@ -1,14 +1,14 @@
 #version 150
 #extension GL_NV_shadow_samplers_cube : enable
 
-uniform int flat_shading, TextureMap_isBound, CubeMap_isBound, DepthMap_isBound;
 uniform float spec_weight, opacity;
-uniform vec3 camera_position, light_position;
 uniform vec3 diffuse, specular, ambient;
 uniform sampler2D TextureMap;
 uniform sampler2DShadow DepthMap;
 uniform samplerCube CubeMap;
 
+#include "../uniform_blocks.glsl"
+
 in float lightAmount;
 in vec2 texCoord;
 in vec3 normal, eyeVec;
@@ -20,34 +20,32 @@ void main()
 {
 
     //If lighting is turned off, just use the diffuse color and return. (Flat lighting)
-    if (flat_shading > 0) {
-            if (TextureMap_isBound > 0){
-                final_color = vec4(diffuse * texture2D(TextureMap, texCoord).rgb, 1.0);
-                return;
-            } else if (CubeMap_isBound > 0) {
-                final_color = vec4(lightAmount + (diffuse * textureCube(CubeMap, eyeVec).rgb), 1.0);
-                return;
-            } else {
-                 final_color = vec4(diffuse, 1.0);
-                 return;
-            }
-    }
+#ifdef FLAT_SHADING
+    #if defined(HAS_TEXTUREMAP)
+        final_color = vec4(diffuse * texture2D(TextureMap, texCoord).rgb, 1.0);
+    #elif defined(HAS_CUBEMAP)
+        final_color = vec4(lightAmount + (diffuse * textureCube(CubeMap, eyeVec).rgb), 1.0);
+    #else
+        final_color = vec4(diffuse, 1.0);
+    #endif
+    return;
+#endif
 
     //Shade Cube Map and return, if needed
-    if (CubeMap_isBound > 0){
-            final_color = textureCube(CubeMap, eyeVec);// * lightAmount;
-            final_color[3] = 1.0;
-            return;
-    }
+#ifdef HAS_CUBEMAP
+    final_color = textureCube(CubeMap, eyeVec);// * lightAmount;
+    final_color[3] = 1.0;
+    return;
+#endif
 
     // Ambient Lighting
     float ambient_coeff = .25;
 
     // UV Texture
     vec3 texture_coeff = vec3(1.0);
-    if (TextureMap_isBound > 0){
-        texture_coeff = texture2D(TextureMap, texCoord).rgb;
-    }
+#ifdef HAS_TEXTUREMAP
+    texture_coeff = texture2D(TextureMap, texCoord).rgb;
+#endif
 
     //// Phong Model
     vec3 normal = normalize(normal);
@@ -66,14 +64,14 @@ void main()
 
     // Depth-Map Shadows
     float shadow_coeff = 1.;
-    if (DepthMap_isBound > 0){
-        if (ShadowCoord.w > 0.0){
-            vec4 shadowCoordinateWdivide = ShadowCoord / ShadowCoord.w;
-            shadowCoordinateWdivide.z -= .0001; // to prevent "shadow acne" caused from precision errors
-            float distanceFromLight = texture(DepthMap, shadowCoordinateWdivide.xyz);
-            shadow_coeff = 0.65 + (0.35 * distanceFromLight);
-        }
+#ifdef HAS_DEPTHMAP
+    if (ShadowCoord.w > 0.0){
+        vec4 shadowCoordinateWdivide = ShadowCoord / ShadowCoord.w;
+        shadowCoordinateWdivide.z -= .0001; // to prevent "shadow acne" caused from precision errors
+        float distanceFromLight = texture(DepthMap, shadowCoordinateWdivide.xyz);
+        shadow_coeff = 0.65 + (0.35 * distanceFromLight);
     }
+#endif
 
     // Calculate Final Color and Opacity
     vec3 color = shadow_coeff * texture_coeff *
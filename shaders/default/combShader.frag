@@ -1,14 +1,20 @@
 #version 120
+#extension GL_ARB_uniform_buffer_object : enable
 //#extension GL_NV_shadow_samplers_cube : enable
+#ifdef HAS_TEXTUREARRAYMAP
+#extension GL_EXT_texture_array : enable
+uniform sampler2DArray TextureArrayMap;
+uniform float texture_layer;
+#endif
 
-uniform int flat_shading, TextureMap_isBound, DepthMap_isBound;
 uniform float spec_weight, opacity;
-uniform vec3 camera_position, light_position;
 uniform vec3 diffuse, specular, ambient;
 uniform sampler2D TextureMap;
 uniform sampler2DShadow DepthMap;
 uniform samplerCube CubeMap;
 
+#include "../uniform_blocks.glsl"
+
 //varying float lightAmount;
 varying vec2 texCoord;
 varying vec3 normal, eyeVec;
@@ -34,26 +40,29 @@ vec4 PhongLighting(vec3 vertex, vec3 normal, vec3 light_position, vec3 camera_po
 void main()
 {
     // Apply Lighting
-    if (flat_shading > 0) {
-        gl_FragColor = vec4(diffuse, 1.0);
-    } else {
-        gl_FragColor = PhongLighting(vVertex.xyz, normal, light_position, camera_position, ambient, diffuse, specular, spec_weight);
-    }
+#ifdef FLAT_SHADING
+    gl_FragColor = vec4(diffuse, 1.0);
+#else
+    gl_FragColor = PhongLighting(vVertex.xyz, normal, light_position, camera_position, ambient, diffuse, specular, spec_weight);
+#endif
 
     // Depth-Map Shadows
-    if (DepthMap_isBound > 0){
-        if (ShadowCoord.w > 0.0){
-            vec4 shadowCoordinateWdivide = ShadowCoord / ShadowCoord.w;
-            shadowCoordinateWdivide.z -= .0001; // to prevent "shadow acne" caused from precision errors
-            vec4 distanceFromLight = shadow2D(DepthMap, shadowCoordinateWdivide.xyz);
-            gl_FragColor.rgb *= 0.65 + (0.35 * distanceFromLight.rgb);
-        }
+#ifdef HAS_DEPTHMAP
+    if (ShadowCoord.w > 0.0){
+        vec4 shadowCoordinateWdivide = ShadowCoord / ShadowCoord.w;
+        shadowCoordinateWdivide.z -= .0001; // to prevent "shadow acne" caused from precision errors
+        vec4 distanceFromLight = shadow2D(DepthMap, shadowCoordinateWdivide.xyz);
+        gl_FragColor.rgb *= 0.65 + (0.35 * distanceFromLight.rgb);
     }
+#endif
 
     // UV Texture
-    if (TextureMap_isBound > 0){
-        gl_FragColor.rgb *= texture2D(TextureMap, texCoord).rgb;
-    }
+#ifdef HAS_TEXTUREMAP
+    gl_FragColor.rgb *= texture2D(TextureMap, texCoord).rgb;
+#endif
+#ifdef HAS_TEXTUREARRAYMAP
+    gl_FragColor.rgb *= texture2DArray(TextureArrayMap, vec3(texCoord, texture_layer)).rgb;
+#endif
 
     return;
  }
@@ -1,18 +1,16 @@
 #version 120
+#extension GL_ARB_uniform_buffer_object : enable
 
 attribute vec3 vertexPosition;
 attribute vec3 normalPosition;
 attribute vec2 uvTexturePosition;
 
-uniform vec3 light_position, playerPos;
+uniform vec3 playerPos;
 uniform mat4 model_matrix, normal_matrix;
-uniform mat4 view_matrix = mat4(1.0);
-uniform mat4 projection_matrix = mat4(vec4(1.38564062,  0.,  0.,  0.),
-                                      vec4(0.,  1.73205078,  0.,  0.),
-                                      vec4(0., 0., -1.01680672, -1. ),
-                                      vec4(0., 0., -0.20168068, 0.)
-                                      );
-uniform mat4 light_projection_matrix, light_view_matrix;
+uniform mat4 position_dequantization = mat4(1.0);
+
+#include "../uniform_blocks.glsl"
+#include "../octahedral.glsl"
 
 varying float lightAmount;
 varying vec2 texCoord;
@@ -30,8 +28,9 @@ void main()
   {
 
     //Calculate Vertex World Position and Normal Direction
-    vVertex = model_matrix * vec4(vertexPosition, 1.0);
-    normal = normalize(normal_matrix * vec4(normalPosition, 1.0)).xyz;
+    vVertex = model_matrix * position_dequantization * vec4(vertexPosition, 1.0);
+    vec3 vertexNormal = decode_normal(normalPosition);
+    normal = normalize(normal_matrix * vec4(vertexNormal, 1.0)).xyz;
 
     //Calculate Vertex Position on Screen
 	gl_Position = projection_matrix * view_matrix * vVertex;
@@ -0,0 +1,25 @@
+#version 120
+#extension GL_ARB_uniform_buffer_object : enable
+
+// Writes the G-buffer (see ratcave.GBuffer): world position, normal, and albedo, for later lighting passes.
+
+uniform float opacity = 1.0;
+uniform vec3 diffuse;
+uniform sampler2D TextureMap;
+
+varying vec2 texCoord;
+varying vec3 normal;
+varying vec4 vVertex;
+
+void main()
+{
+    vec3 albedo = diffuse;
+#ifdef HAS_TEXTUREMAP
+    albedo *= texture2D(TextureMap, texCoord).rgb;
+#endif
+
+    gl_FragData[0] = vec4(vVertex.xyz, 1.0);
+    gl_FragData[1] = vec4(normalize(normal), 0.0);
+    gl_FragData[2] = vec4(albedo, opacity);
+    return;
+ }
@@ -0,0 +1,31 @@
+#version 120
+#extension GL_ARB_uniform_buffer_object : enable
+
+attribute vec3 vertexPosition;
+attribute vec3 normalPosition;
+attribute vec2 uvTexturePosition;
+
+uniform mat4 model_matrix, normal_matrix;
+uniform mat4 position_dequantization = mat4(1.0);
+
+#include "../uniform_blocks.glsl"
+#include "../octahedral.glsl"
+
+varying vec2 texCoord;
+varying vec3 normal;
+varying vec4 vVertex;
+
+void main()
+  {
+
+    //Calculate Vertex World Position and Normal Direction
+    vVertex = model_matrix * position_dequantization * vec4(vertexPosition, 1.0);
+    vec3 vertexNormal = decode_normal(normalPosition);
+    normal = normalize(normal_matrix * vec4(vertexNormal, 1.0)).xyz;
+
+    //Calculate Vertex Position on Screen
+    gl_Position = projection_matrix * view_matrix * vVertex;
+    texCoord = uvTexturePosition;
+
+    return;
+  }
@@ -0,0 +1,20 @@
+// Vertex normals, which ratcave stores as two octahedral coordinates in Geometries with the 'octahedral' normal
+// format (see ratcave.vertex.octahedral_encode).  Meshes with those draw with the OCTAHEDRAL_NORMALS variant.
+
+vec3 octahedral_decode(vec2 e)
+{
+    vec3 v = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    if (v.z < 0.0) {
+        v.xy = (1.0 - abs(v.yx)) * vec2(e.x >= 0.0 ? 1.0 : -1.0, e.y >= 0.0 ? 1.0 : -1.0);
+    }
+    return normalize(v);
+}
+
+vec3 decode_normal(vec3 normal)
+{
+#ifdef OCTAHEDRAL_NORMALS
+    return octahedral_decode(normal.xy);
+#else
+    return normal;
+#endif
+}
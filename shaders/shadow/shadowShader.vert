@@ -1,17 +1,19 @@
 #version 120
 #extension GL_ARB_explicit_attrib_location : enable
+#extension GL_ARB_uniform_buffer_object : enable
 
 layout(location = 0) in vec3 vertexPosition;
 
-uniform mat4 light_view_matrix;
 uniform mat4 model_matrix;
-uniform mat4 light_projection_matrix;
+uniform mat4 position_dequantization = mat4(1.0);
+
+#include "../uniform_blocks.glsl"
 
 void main()
   {
 
 	//Calculate Vertex Position on Screen
-	gl_Position = light_projection_matrix * light_view_matrix * model_matrix * vec4(vertexPosition, 1.0);
+	gl_Position = light_projection_matrix * light_view_matrix * model_matrix * position_dequantization * vec4(vertexPosition, 1.0);
 
   }
 
@@ -0,0 +1,13 @@
+// Camera and Light uniforms, sent once per frame by ratcave.Camera and ratcave.Light (see ratcave.UniformBlock).
+
+layout(std140) uniform CameraBlock {
+    mat4 projection_matrix;
+    mat4 view_matrix;
+    vec3 camera_position;
+};
+
+layout(std140) uniform LightBlock {
+    mat4 light_projection_matrix;
+    mat4 light_view_matrix;
+    vec3 light_position;
+};
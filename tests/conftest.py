@@ -0,0 +1,18 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', help="Also run the benchmarks, which time ratcave on this "
+                                                              "machine and print the results.")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "benchmark: times ratcave on this machine; only run with --benchmark.")
+
+
+def pytest_collection_modifyitems(config, items):
+    if not config.getoption('--benchmark'):
+        skip = pytest.mark.skip(reason="Benchmarks only run with --benchmark.")
+        for item in items:
+            if 'benchmark' in item.keywords:
+                item.add_marker(skip)
@@ -0,0 +1,59 @@
+import mock
+from ratcave import Mesh, resources
+from ratcave.batching import merge_static
+import numpy as np
+import pytest
+
+rng = np.random.RandomState(100)
+
+
+@pytest.fixture
+def meshes():
+    base = Mesh.from_incomplete_data(rng.uniform(-1, 1, size=(36, 3)).astype(np.float32))
+    meshes = []
+    for x in range(10):
+        mesh = base.copy()
+        mesh.position.xyz = x, 0, -3
+        mesh.rotation.y = 10 * x
+        meshes.append(mesh)
+    return meshes
+
+
+def test_compatible_meshes_are_merged(meshes):
+    red = meshes[0].copy()
+    red.uniforms['diffuse'] = 1., 0., 0.
+    batches = merge_static(meshes + [red])
+    assert len(batches) == 2
+    assert batches[0].meshes == tuple(meshes)
+    assert np.isclose(batches[1].uniforms['diffuse'], (1., 0., 0.)).all()
+
+
+def test_merged_vertices_are_in_world_coordinates(meshes):
+    batch, = merge_static(meshes)
+    for idx, mesh in enumerate(meshes):
+        indices = batch.indices[batch.starts[idx]:batch.starts[idx] + batch.counts[idx]]
+        model = mesh.model_matrix_global
+        expected = np.asarray(mesh.vertices).dot(model[:3, :3].T) + model[:3, 3]
+        assert np.isclose(batch.arrays[0][indices], expected[mesh.indices], atol=1e-5).all()
+
+
+def test_hidden_meshes_are_left_out_of_draw_ranges(meshes):
+    batch, = merge_static(meshes)
+    starts, counts = batch._visible_ranges()
+    assert len(starts) == 1 and counts[0] == batch.counts.sum()
+
+    meshes[3].visible = False
+    starts, counts = batch._visible_ranges()
+    assert len(starts) == 2
+    assert counts.sum() == batch.counts.sum() - batch.counts[3]
+
+
+def test_batch_with_every_mesh_hidden_draws_nothing(meshes):
+    batch, = merge_static(meshes)
+    for mesh in meshes:
+        mesh.visible = False
+    starts, counts = batch._visible_ranges()
+    assert len(starts) == 0 and len(counts) == 0
+    with mock.patch.object(batch.geometry, 'draw_ranges') as draw_ranges, resources.default_shader:
+        batch.draw()
+    draw_ranges.assert_not_called()
@@ -0,0 +1,57 @@
+import numpy as np
+from ratcave import Mesh, EmptyEntity, bounds
+
+
+def random_mesh(rng, **kwargs):
+    return Mesh(arrays=(rng.uniform(-1, 2, (30, 3)),), mean_center=False, **kwargs)
+
+
+def test_local_bounds_contain_vertices():
+    rng = np.random.RandomState(31)
+    mesh = random_mesh(rng)
+    verts = mesh.vertices
+    aabb = mesh.geometry.aabb
+    assert np.isclose(aabb, [verts.min(axis=0), verts.max(axis=0)]).all()
+    assert mesh.geometry.aabb is aabb  # cached
+
+    sphere = mesh.geometry.bounding_sphere
+    assert np.all(np.linalg.norm(verts - sphere.center, axis=1) <= sphere.radius + 1e-5)
+
+    obb = mesh.geometry.obb
+    projected = (verts - obb.center).dot(obb.axes)
+    assert np.all(np.abs(projected) <= obb.half_extents + 1e-5)
+
+    mesh.vertices[0] = 10, 10, 10
+    assert np.isclose(mesh.geometry.aabb[1], 10).all()
+
+
+def test_world_aabb_matches_transformed_vertices():
+    rng = np.random.RandomState(31)
+    parent = EmptyEntity(position=(2, 0, 1), rotation=(0, 45, 0))
+    mesh = random_mesh(rng, position=(0, 1, 0), rotation=(30, 0, 60), scale=(1, 2, 3))
+    parent.add_child(mesh)
+
+    world_verts = mesh.vertices_global
+    aabb = mesh.aabb_global
+    assert np.all(aabb[0] <= world_verts.min(axis=0) + 1e-4)
+    assert np.all(aabb[1] >= world_verts.max(axis=0) - 1e-4)
+    assert mesh.aabb_global is aabb
+
+    sphere = mesh.bounding_sphere_global
+    assert np.all(np.linalg.norm(world_verts - sphere.center, axis=1) <= sphere.radius + 1e-4)
+
+    parent.position.x += 3
+    assert np.isclose(mesh.aabb_global, aabb + (3, 0, 0), atol=1e-5).all()
+
+
+def test_world_bounds_are_vectorized_over_meshes():
+    rng = np.random.RandomState(31)
+    meshes = [random_mesh(rng, position=rng.uniform(-5, 5, 3), rotation=rng.uniform(0, 90, 3)) for _ in range(5)]
+    aabbs = bounds.world_aabbs(meshes)
+    assert aabbs.shape == (5, 2, 3)
+    for mesh, aabb in zip(meshes, aabbs):
+        assert np.isclose(mesh.aabb_global, aabb, atol=1e-5).all()
+
+    centers, radii = bounds.world_bounding_spheres(meshes)
+    assert centers.shape == (5, 3) and radii.shape == (5,)
+    assert np.isclose(centers[2], meshes[2].bounding_sphere_global.center, atol=1e-5).all()
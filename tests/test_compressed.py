@@ -0,0 +1,163 @@
+from ratcave import compressed, texture, Texture
+import mock
+import numpy as np
+import pytest
+import struct
+import time
+
+rng = np.random.RandomState(48)
+
+
+def reference_bc1_block(block, punchthrough=True):
+    """Decodes one 8-byte BC1 color block, texel by texel."""
+    color0, color1, bits = struct.unpack('<HHI', bytes(block))
+    expand = lambda value, bits: value << 8 - bits | value >> 2 * bits - 8
+    rgb = [np.array([expand(c >> 11 & 31, 5), expand(c >> 5 & 63, 6), expand(c & 31, 5)]) for c in (color0, color1)]
+    if color0 > color1 or not punchthrough:
+        palette = [list(rgb[0]) + [255], list(rgb[1]) + [255], list((2 * rgb[0] + rgb[1]) // 3) + [255],
+                   list((rgb[0] + 2 * rgb[1]) // 3) + [255]]
+    else:
+        palette = [list(rgb[0]) + [255], list(rgb[1]) + [255], list((rgb[0] + rgb[1]) // 2) + [255], [0, 0, 0, 0]]
+    return np.array([palette[bits >> 2 * texel & 3] for texel in range(16)]).reshape(4, 4, 4)
+
+
+def reference_bc4_block(block):
+    """Decodes one 8-byte BC4 block, texel by texel."""
+    value0, value1 = int(block[0]), int(block[1])
+    bits = int.from_bytes(bytes(block[2:]), 'little')
+    if value0 > value1:
+        palette = [value0, value1] + [((7 - step) * value0 + step * value1) // 7 for step in range(1, 7)]
+    else:
+        palette = [value0, value1] + [((5 - step) * value0 + step * value1) // 5 for step in range(1, 5)] + [0, 255]
+    return np.array([palette[bits >> 3 * texel & 7] for texel in range(16)]).reshape(4, 4)
+
+
+def make_dds(fmt, width, height, levels, dxgi_format=None):
+    header = bytearray(128)
+    header[:4] = b'DDS '
+    struct.pack_into('<7I', header, 4, 124, 0x1007 | 0x20000, height, width, len(levels[0]), 0, len(levels))
+    struct.pack_into('<2I4s', header, 76, 32, 0x4, b'DX10' if dxgi_format else fmt)
+    if dxgi_format:
+        header += struct.pack('<5I', dxgi_format, 3, 0, 1, 0)
+    return bytes(header) + b''.join(levels)
+
+
+def make_ktx2(vk_format, width, height, levels):
+    header = bytearray(80 + 24 * len(levels))
+    header[:12] = compressed._ktx2_identifier
+    struct.pack_into('<9I', header, 12, vk_format, 1, width, height, 0, 0, 1, len(levels), 0)
+    offset = len(header)
+    for level, data in enumerate(levels):
+        struct.pack_into('<3Q', header, 80 + 24 * level, offset, len(data), len(data))
+        offset += len(data)
+    return bytes(header) + b''.join(levels)
+
+
+def mip_chain(fmt, width, height):
+    levels, level = [], 0
+    while True:
+        w, h = max(1, width >> level), max(1, height >> level)
+        levels.append(rng.randint(0, 256, size=compressed.level_size(fmt, w, h)).astype(np.uint8).tobytes())
+        if w == h == 1:
+            return levels
+        level += 1
+
+
+def test_bc1_blocks_decode_like_the_reference():
+    blocks = rng.randint(0, 256, size=(3, 5, 8)).astype(np.uint8)
+    image = compressed.decode_bc1(blocks.tobytes(), 20, 12)
+    assert image.shape == (12, 20, 4) and image.dtype == np.uint8
+    for row in range(3):
+        for col in range(5):
+            assert (image[4 * row:4 * row + 4, 4 * col:4 * col + 4] == reference_bc1_block(blocks[row, col])).all()
+
+
+def test_bc3_blocks_decode_like_the_reference():
+    blocks = rng.randint(0, 256, size=(2, 2, 16)).astype(np.uint8)
+    image = compressed.decode_bc3(blocks.tobytes(), 7, 6)  # Partial blocks are cropped.
+    assert image.shape == (6, 7, 4)
+    full = compressed.decode_bc3(blocks.tobytes(), 8, 8)
+    assert (full[:6, :7] == image).all()
+    for row in range(2):
+        for col in range(2):
+            texels = full[4 * row:4 * row + 4, 4 * col:4 * col + 4]
+            assert (texels[..., :3] == reference_bc1_block(blocks[row, col, 8:], punchthrough=False)[..., :3]).all()
+            assert (texels[..., 3] == reference_bc4_block(blocks[row, col, :8])).all()
+
+
+def test_dds_files_are_parsed_with_their_mipmaps():
+    levels = mip_chain('BC1', 16, 8)
+    image = compressed.parse_dds(make_dds(b'DXT1', 16, 8, levels))
+    assert image.format == 'BC1' and (image.width, image.height) == (16, 8)
+    assert image.levels == levels
+    assert [len(level) for level in levels] == [64, 16, 8, 8, 8]
+
+    levels = mip_chain('BC7', 8, 8)
+    image = compressed.parse_dds(make_dds(None, 8, 8, levels, dxgi_format=99))
+    assert image.format == 'BC7_SRGB' and image.levels == levels
+
+    with pytest.raises(ValueError):
+        compressed.parse_dds(make_dds(b'DXT5', 16, 8, levels))  # Too short for a 16x8 BC3 chain.
+
+
+def test_ktx2_files_are_parsed_with_their_mipmaps(tmpdir):
+    levels = mip_chain('ETC2_RGBA8', 32, 16)
+    path = tmpdir.join('floor.ktx2')
+    path.write_binary(make_ktx2(151, 32, 16, levels))
+    image = compressed.load_compressed_image(str(path))
+    assert image.format == 'ETC2_RGBA8' and (image.width, image.height) == (32, 16)
+    assert image.levels == levels
+
+
+def test_supported_formats_are_uploaded_compressed():
+    image = compressed.CompressedImage('BC3', 32, 16, mip_chain('BC3', 32, 16))
+    with mock.patch.object(compressed, 'format_supported', return_value=True), \
+         mock.patch.object(compressed.gl, 'glCompressedTexImage2D') as upload:
+        tex = compressed.CompressedTexture(image)
+    assert not tex.decoded and tex.mipmap
+    assert [call[0][1] for call in upload.call_args_list] == list(range(len(image.levels)))
+    assert [call[0][3:5] for call in upload.call_args_list] == [(32, 16), (16, 8), (8, 4), (4, 2), (2, 1), (1, 1)]
+    assert upload.call_args_list[0][0][2] == compressed.gl.GL_COMPRESSED_RGBA_S3TC_DXT5_EXT
+    assert upload.call_args_list[0][0][6:] == (512, image.levels[0])
+    assert tex.nbytes == sum(len(level) for level in image.levels)
+    assert len(image.levels[0]) * 4 == texture.Texture(width=32, height=16).nbytes
+    with pytest.raises(TypeError):
+        tex.values = np.zeros(tex.shape, dtype=np.uint8)
+    with pytest.raises(TypeError):
+        tex.update((0, 0, 4, 4), 0)
+    with pytest.raises(TypeError):
+        tex[:4, :4] = 0
+
+
+def test_unsupported_formats_are_decoded():
+    image = compressed.CompressedImage('BC1_SRGB', 8, 8, mip_chain('BC1', 8, 8))
+    with mock.patch.object(compressed, 'format_supported', return_value=False), \
+         mock.patch.object(compressed.gl, 'glTexImage2D') as upload:
+        tex = compressed.CompressedTexture(image)
+    assert tex.decoded
+    assert [call[0][1] for call in upload.call_args_list] == [0, 1, 2, 3]
+    assert upload.call_args_list[0][0][2] == compressed.gl.GL_SRGB8_ALPHA8
+    assert (tex.values == compressed.decode_bc1(image.levels[0], 8, 8)).all()
+
+    with mock.patch.object(compressed, 'format_supported', return_value=False):
+        with pytest.raises(ValueError):
+            compressed.CompressedTexture(compressed.CompressedImage('BC7', 8, 8, mip_chain('BC7', 8, 8)))
+
+
+def test_texture_from_image_loads_compressed_files(tmpdir):
+    path = tmpdir.join('wall.dds')
+    path.write_binary(make_dds(b'DXT5', 16, 16, mip_chain('BC3', 16, 16)))
+    tex = Texture.from_image(str(path))
+    assert isinstance(tex, compressed.CompressedTexture)
+    assert tex.image.format == 'BC3' and len(tex.image.levels) == 5
+
+
+@pytest.mark.benchmark
+def test_decode_throughput():
+    data = rng.randint(0, 256, size=compressed.level_size('BC1', 1024, 1024)).astype(np.uint8).tobytes()
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        compressed.decode_bc1(data, 1024, 1024)
+        durations.append(time.perf_counter() - start)
+    print('BC1 decoding: {:.0f} megapixels/s'.format(1.048576 / min(durations)))
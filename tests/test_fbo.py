@@ -0,0 +1,218 @@
+import ctypes
+import gc
+import time
+import mock
+import numpy as np
+import pytest
+from ratcave import texture, fbo as fbo_module, FBO, GBuffer, FrameRecorder, Shader, resources
+from ratcave.utils import delete_pending
+
+
+@pytest.fixture
+def gpu(monkeypatch):
+    """Fakes the graphics card's side of pixel buffers: fences that are signaled, and mapped memory."""
+    state = SimpleGPU()
+    monkeypatch.setattr(fbo_module.gl, 'glClientWaitSync', mock.Mock(return_value=fbo_module.gl.GL_ALREADY_SIGNALED))
+    monkeypatch.setattr(fbo_module.gl, 'glMapBufferRange', mock.Mock(side_effect=state.map))
+    monkeypatch.setattr(fbo_module.gl, 'glUnmapBuffer', mock.Mock())
+    return state
+
+
+class SimpleGPU(object):
+
+    def __init__(self):
+        self.mapped = {}
+        self.frame = None
+
+    def map(self, target, offset, nbytes, access):
+        if self.frame is None:  # Contents don't matter, so one block of memory is reused.
+            if nbytes not in self.mapped:
+                self.mapped[nbytes] = ctypes.create_string_buffer(nbytes)
+            memory = self.mapped[nbytes]
+        else:
+            memory = ctypes.create_string_buffer(self.frame.tobytes(), nbytes)
+            self.mapped[ctypes.addressof(memory)] = memory
+        return ctypes.addressof(memory)
+
+
+def test_read_async_reads_pixels_into_pixel_buffers(gpu):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    futures = [fbo.read_async() for _ in range(3)]
+    buffer_ids = {future.buffer.id for future in futures}
+    assert len(buffer_ids) == 3
+    assert all(future.done() for future in futures)
+
+    gpu.frame = np.arange(8 * 4 * 4, dtype=np.uint8).reshape(4, 8, 4)
+    frame = futures[0].map()
+    assert frame.shape == (4, 8, 4)
+    assert np.all(frame == gpu.frame)
+    assert not frame.flags.writeable
+    assert np.all(futures[0].result() == gpu.frame)
+    assert futures[0].buffer is None
+
+    with mock.patch.object(fbo_module.gl, 'glGetBufferSubData') as read:
+        assert futures[1].result().shape == (4, 8, 4)
+    read.assert_called_once()
+    futures[2].release()
+    assert len(fbo._readback_buffers) == 3
+    assert fbo.read_async().buffer.id in buffer_ids  # The pixel buffers are reused.
+    assert len(fbo._readback_buffers) == 2
+
+
+def test_dropped_readbacks_give_their_pixel_buffers_back(gpu):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    future = fbo.read_async()
+    future.map()
+    buffer = future.buffer
+    with mock.patch.object(fbo_module.gl, 'glDeleteSync') as delete_sync:
+        del future
+        gc.collect()
+        assert fbo._readback_buffers == []  # Only given back from the OpenGL thread.
+        delete_pending()
+    assert fbo._readback_buffers == [buffer]
+    delete_sync.assert_called_once()
+    fbo_module.gl.glUnmapBuffer.assert_called_once()
+    assert fbo.read_async().buffer is buffer
+
+
+def test_read_async_waits_for_fence(gpu):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    future = fbo.read_async()
+    statuses = [fbo_module.gl.GL_TIMEOUT_EXPIRED, fbo_module.gl.GL_TIMEOUT_EXPIRED, fbo_module.gl.GL_CONDITION_SATISFIED]
+    fbo_module.gl.glClientWaitSync.side_effect = statuses
+    assert not future.done()
+    assert future.wait()
+    assert fbo_module.gl.glClientWaitSync.call_count == 3
+
+    future = fbo.read_async()
+    fbo_module.gl.glClientWaitSync.side_effect = None
+    fbo_module.gl.glClientWaitSync.return_value = fbo_module.gl.GL_TIMEOUT_EXPIRED
+    with pytest.raises(TimeoutError):
+        future.result(timeout=.01)
+
+
+def test_frame_recorder_writes_npy(gpu, tmpdir):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    path = str(tmpdir.join('frames.npy'))
+    frames = np.random.RandomState(0).randint(0, 255, size=(5, 4, 8, 4)).astype(np.uint8)
+    with FrameRecorder(fbo, path) as recorder:
+        for frame in frames:
+            gpu.frame = frame
+            recorder.capture()
+    assert recorder.frames == recorder.frames_written == 5
+    recorded = np.load(path, mmap_mode='r')
+    assert recorded.shape == frames.shape
+    assert np.all(recorded == frames)
+    assert fbo_module.gl.glUnmapBuffer.call_count == 5
+
+    with pytest.raises(ValueError):
+        FrameRecorder(fbo, str(tmpdir.join('frames.raw')))
+
+
+def test_frame_recorder_writes_images(gpu, tmpdir):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    with mock.patch('pyglet.image.ImageData.save') as save:
+        with FrameRecorder(fbo, str(tmpdir.join('frame_{:03d}.png'))) as recorder:
+            for _ in range(2):
+                recorder.capture()
+    assert [call[0][0] for call in save.call_args_list] == [str(tmpdir.join(name)) for name in ['frame_000.png',
+                                                                                                 'frame_001.png']]
+
+    fbo = FBO(texture.DepthTexture(width=8, height=4))
+    recorder = FrameRecorder(fbo, str(tmpdir.join('depth_{:03d}.png')))
+    recorder.capture()
+    with pytest.raises(ValueError):
+        recorder.close()
+
+
+def test_frame_recorder_never_waits_for_the_graphics_card(gpu, tmpdir):
+    fbo = FBO(texture.Texture(width=8, height=4))
+    with FrameRecorder(fbo, str(tmpdir.join('frames.npy'))) as recorder:
+        for _ in range(20):
+            recorder.capture()
+        timeouts = [call[0][2] for call in fbo_module.gl.glClientWaitSync.call_args_list]
+    assert timeouts and not any(timeouts)  # Fences are only polled during capture().
+    assert recorder.frames_written == 20
+
+
+@pytest.mark.benchmark
+def test_frame_recorder_overhead(gpu, tmpdir):
+    fbo = FBO(texture.Texture(width=1920, height=1080))
+    frame_time = 1. / 60
+    durations = []
+    with FrameRecorder(fbo, str(tmpdir.join('frames.npy'))) as recorder:
+        for _ in range(40):
+            start = time.perf_counter()
+            recorder.capture()
+            durations.append(time.perf_counter() - start)
+            time.sleep(max(0., frame_time - durations[-1]))  # The rest of the frame, as if waiting for vsync.
+    durations = durations[10:]  # After the pixel buffers have been made.
+    print('Recording 1080p: {:.2%} of a 60 Hz frame'.format(np.median(durations) / frame_time))
+
+
+def test_binding_an_fbo_leaves_bound_textures_alone():
+    tex = texture.Texture(width=8, height=4)
+    fbo = FBO(texture.Texture(width=8, height=4))
+    calls = mock.Mock()
+    with tex, mock.patch.object(fbo_module.gl, 'glActiveTexture', calls.glActiveTexture), \
+         mock.patch.object(fbo_module.gl, 'glBindTexture', calls.glBindTexture), fbo:
+        pass
+    assert calls.mock_calls[:2] == [mock.call.glActiveTexture(fbo_module.gl.GL_TEXTURE0),
+                                    mock.call.glBindTexture(fbo_module.gl.GL_TEXTURE_2D, 0)]
+    assert texture.texture_units.unit_of(tex) not in (None, 0)
+
+
+def test_color_textures_are_all_drawn_to():
+    textures = [texture.Texture(width=8, height=4) for _ in range(3)]
+    depth = texture.DepthTexture(width=8, height=4)
+    with mock.patch.object(texture.gl, 'glFramebufferTexture2DEXT') as attach, \
+         mock.patch.object(fbo_module.gl, 'glDrawBuffers') as draw_buffers:
+        fbo = FBO(color=textures, depth=depth)
+    attachments = [call[0][1] for call in attach.call_args_list]
+    color0 = fbo_module.gl.GL_COLOR_ATTACHMENT0_EXT
+    assert attachments == [color0, color0 + 1, color0 + 2, fbo_module.gl.GL_DEPTH_ATTACHMENT_EXT]
+    count, buffers = draw_buffers.call_args[0]
+    assert count == 3 and list(buffers) == [color0, color0 + 1, color0 + 2]
+    assert fbo.renderbuffer is None and fbo.texture is textures[0]
+
+    with pytest.raises(ValueError):
+        FBO(color=[texture.Texture(width=8, height=4), texture.Texture(width=4, height=4)])
+    with pytest.raises(ValueError):
+        FBO(color=[depth])
+
+
+def test_single_texture_fbos_are_unchanged():
+    with mock.patch.object(fbo_module.gl, 'glDrawBuffers') as draw_buffers:
+        fbo = FBO(texture.Texture(width=8, height=4))
+        depth_fbo = FBO(texture.DepthTexture(width=8, height=4))
+    draw_buffers.assert_not_called()
+    assert fbo.renderbuffer is not None and fbo.textures == [fbo.texture]
+    assert depth_fbo.renderbuffer is None and depth_fbo.textures == [] and depth_fbo.depth_texture is depth_fbo.texture
+
+
+def test_gbuffer_attachments_are_read_back_separately(gpu):
+    gbuffer = GBuffer(width=8, height=4)
+    assert [tex.name for tex in gbuffer.textures] == ['PositionMap', 'NormalMap', 'AlbedoMap']
+    assert gbuffer.position.dtype == np.float32 and gbuffer.albedo.dtype == np.uint8
+
+    with mock.patch.object(fbo_module.gl, 'glReadBuffer') as read_buffer:
+        positions, albedo = gbuffer.read_async(0), gbuffer.read_async(2)
+    assert [call[0][0] for call in read_buffer.call_args_list] == [fbo_module.gl.GL_COLOR_ATTACHMENT0_EXT,
+                                                                 fbo_module.gl.GL_COLOR_ATTACHMENT0_EXT + 2]
+    assert positions.shape == (4, 8, 4) and positions.dtype == np.float32
+    assert positions.buffer.nbytes == 4 * albedo.buffer.nbytes
+    albedo_buffer = albedo.buffer
+    positions.release()
+    albedo.release()
+    assert gbuffer.read_async(2).buffer is albedo_buffer  # Reused by size.
+
+    with gbuffer.bind_textures():
+        assert all(tex.slot is not None for tex in gbuffer.textures + [gbuffer.depth])
+    gbuffer.release()
+
+
+def test_gbuffer_shader_writes_every_attachment():
+    shader = resources.gbuffer_shader
+    assert isinstance(shader, Shader)
+    frag = shader.sources()[1]
+    assert all('gl_FragData[{}]'.format(index) in frag for index in range(3))
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pytest
+import ratcave
+
+script = """
+import sys
+import pyglet.gl, pyglet.gl.gl
+called = []
+
+def record(name, function):
+    def recorded(*args, **kwargs):
+        called.append(name)
+        return function(*args, **kwargs)
+    return recorded
+
+for module in [pyglet.gl, pyglet.gl.gl]:
+    for name, attr in list(vars(module).items()):
+        if name.startswith('gl') and callable(attr):
+            setattr(module, name, record(name, attr))
+
+import ratcave
+print(','.join(called) or '-')
+print(pyglet.gl.current_context is not None)
+print('scipy' in sys.modules)
+print('default_shader' in vars(ratcave.resources) or 'default_camera' in vars(ratcave.resources))
+"""
+
+
+def run_import():
+    env = dict(os.environ)
+    env['PYGLET_SHADOW_WINDOW'] = '0'  # pyglet's own hidden window, which ratcave doesn't need at import.
+    output = subprocess.check_output([sys.executable, '-c', script], env=env, universal_newlines=True)
+    gl_calls, made_context, imported_scipy, made_resources = output.split()[-4:]
+    return [call for call in gl_calls.split(',') if call != '-'], made_context == 'True', imported_scipy == 'True', \
+        made_resources == 'True'
+
+
+def test_import_is_lazy():
+    _, _, imported_scipy, made_resources = run_import()
+    assert not imported_scipy
+    assert not made_resources
+
+
+def test_import_needs_no_opengl():
+    gl_calls, made_context, _, _ = run_import()
+    assert gl_calls == []
+    assert not made_context
+
+
+def test_default_resources_are_missing_attributes_if_they_failed_to_import(monkeypatch):
+    error = ImportError("No module named 'scipy'")
+    monkeypatch.delattr(ratcave, 'resources')
+    monkeypatch.setattr(ratcave, '_resources_error', error)
+    with pytest.raises(AttributeError) as raised:
+        ratcave.default_shader
+    assert raised.value.__cause__ is error
+    assert not hasattr(ratcave, 'default_camera')
@@ -0,0 +1,47 @@
+from ratcave.loader import AssetLoader
+import mock
+import pytest
+
+
+@pytest.fixture
+def loader():
+    with AssetLoader(max_workers=2) as loader:
+        yield loader
+
+
+def test_uploads_only_run_when_processed(loader):
+    future = loader.schedule_upload(lambda x: x * 2, 21)
+    assert not future.done()
+    assert loader.pending_uploads == 1
+    assert loader.process_uploads() == 1
+    assert future.result() == 42
+    assert loader.pending_uploads == 0
+
+
+def test_uploads_respect_time_budget(loader):
+    clock = [0.]
+
+    def upload():
+        clock[0] += .01  # Each upload takes 10 ms.
+
+    futures = [loader.schedule_upload(upload) for _ in range(5)]
+    with mock.patch('ratcave.loader.time.perf_counter', side_effect=lambda: clock[0]):
+        assert loader.process_uploads(budget=.015) == 2
+        assert sum(future.done() for future in futures) == 2
+        assert loader.process_uploads(budget=0) == 1  # At least one job always runs.
+
+
+def test_upload_errors_are_set_on_future(loader):
+    future = loader.schedule_upload(lambda: 1 / 0)
+    loader.process_uploads()
+    with pytest.raises(ZeroDivisionError):
+        future.result()
+
+
+def test_finish_completes_background_work_and_uploads(loader):
+    cpu_future = loader.submit(sum, [1, 2, 3])
+    upload_future = loader.schedule_upload(lambda: 7)
+    loader.finish()
+    assert cpu_future.result() == 6
+    assert upload_future.result() == 7
+    assert loader.pending_uploads == 0
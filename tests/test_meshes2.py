@@ -1,4 +1,4 @@
-from ratcave import resources, WavefrontReader, EmptyEntity
+from ratcave import resources, WavefrontReader, EmptyEntity, Mesh
 import pytest
 import numpy as np
 @pytest.fixture()
@@ -49,3 +49,47 @@ def test_empty_entity_gets_name():
     obj = EmptyEntity(name='DummyObj')
     assert hasattr(obj, 'name')
     assert obj.name == 'DummyObj'
+
+
+def test_mesh_copies_share_geometry(cube):
+    cube2 = cube.copy()
+    assert cube2.geometry is cube.geometry
+    assert cube.geometry.refcount == 2
+    cube3 = cube.copy(share_geometry=False)
+    assert cube3.geometry is not cube.geometry
+    assert cube.geometry.refcount == 2
+
+
+def test_modifying_shared_geometry_copies_it_first(cube):
+    cube2 = cube.copy()
+    old_verts = cube.vertices.copy()
+    cube2.vertices[:] += 1.
+    assert cube2.geometry is not cube.geometry
+    assert np.isclose(cube.vertices, old_verts).all()
+    assert np.isclose(cube2.vertices, old_verts + 1).all()
+
+    cube3 = cube.copy()
+    cube3.normals = np.zeros_like(cube3.normals)
+    assert cube3.geometry is not cube.geometry
+    assert not np.isclose(cube.normals, 0).all()
+
+
+def test_vertices_global_follows_parent_transform():
+    rng = np.random.RandomState(30)
+    parent = EmptyEntity(position=(1, 0, 0), rotation=(0, 90, 0))
+    mesh = Mesh(arrays=(rng.uniform(-1, 1, (12, 3)),), mean_center=False, position=(0, 2, 0), scale=2)
+    parent.add_child(mesh)
+    homogeneous = np.hstack((mesh.vertices, np.ones((12, 1))))
+    assert np.isclose(mesh.vertices_local, np.dot(mesh.model_matrix, homogeneous.T).T[:, :3], atol=1e-5).all()
+    assert np.isclose(mesh.vertices_global, np.dot(mesh.model_matrix_global, homogeneous.T).T[:, :3], atol=1e-5).all()
+    assert np.isclose(mesh.inverse_transform_points(mesh.vertices_global), mesh.vertices, atol=1e-5).all()
+
+    verts = mesh.vertices_global
+    assert mesh.vertices_global is verts  # cached until something changes
+    parent.position.x = 5
+    assert np.isclose(mesh.vertices_global, verts + (4, 0, 0), atol=1e-5).all()
+
+    verts = mesh.vertices_global
+    mesh.vertices[:] += 1.
+    assert mesh.vertices_global is not verts
+    assert mesh.geometry._dirty == {0}
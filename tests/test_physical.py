@@ -169,6 +169,26 @@ class TestOrientation(unittest.TestCase):
             phys.rotation.x = 90
             self.assertTrue(np.isclose(phys.orientation, ori1, atol=1e-4).all())
 
+    def test_transform_points_matches_modelmatrix(self):
+
+        rng = np.random.RandomState(30)
+        phys = Physical(position=(1, 2, 3), rotation=(10, 20, 30), scale=(1, 2, 3))
+        points = rng.uniform(-5, 5, (20, 3))
+        expected = np.dot(phys.model_matrix, np.hstack((points, np.ones((20, 1)))).T).T[:, :3]
+        self.assertTrue(np.isclose(phys.transform_points(points), expected, atol=1e-4).all())
+        self.assertTrue(np.isclose(phys.transform_points(points[0]), expected[0], atol=1e-4).all())
+        self.assertTrue(np.isclose(phys.inverse_transform_points(expected), points, atol=1e-4).all())
+        with self.assertRaises(ValueError):
+            phys.transform_points(points, space='world')
+
+    def test_transform_version_increases_on_change(self):
+
+        phys = Physical()
+        version = phys.transform_version
+        self.assertEqual(phys.transform_version, version)
+        phys.position.x = 3
+        self.assertGreater(phys.transform_version, version)
+
 
 if sys.platform == 'linux':
     def test_physical_is_picklable():
@@ -1,4 +1,6 @@
-from ratcave import Mesh, Scene, WavefrontReader, resources
+from ratcave import Mesh, Scene, WavefrontReader, Texture, resources
+from ratcave.batching import merge_static
+import numpy as np
 import pytest
 
 
@@ -13,3 +15,25 @@ def test_reader_returns_mesh(reader):
 
 
 
+
+
+def test_reader_atlas_shares_one_texture(tmpdir, monkeypatch):
+    lines = ['o A', 'v 0 0 0', 'v 1 0 0', 'v 0 1 0', 'vt 0 0', 'vt 1 0', 'vt 0 1', 'vn 0 0 1']
+    for name in ['A', 'B', 'C']:
+        lines += [] if name == 'A' else ['o ' + name]
+        lines += ['f 1/1/1 2/2/1 3/3/1']
+    obj_file = tmpdir.join('triangles.obj')
+    obj_file.write('\n'.join(lines) + '\n')
+    images = {'red.png': np.full((8, 8, 4), 10, dtype=np.uint8), 'blue.png': np.full((16, 4, 4), 20, dtype=np.uint8)}
+    monkeypatch.setattr(Texture, 'load_image', classmethod(lambda cls, filename: images[filename]))
+
+    reader = WavefrontReader(str(obj_file), atlas=True)
+    for name, image in zip('ABC', ['red.png', 'blue.png', 'red.png']):
+        reader.bodies[name]['material'] = {'map_Kd': image}
+    meshes = [reader.get_mesh(name) for name in 'ABC']
+    assert set(tex for mesh in meshes for tex in mesh.textures) == {reader.atlas.texture}
+
+    x, y, w, h = reader.atlas.regions['blue.png']
+    texcoords = meshes[1].texcoords * [reader.atlas.texture.width, reader.atlas.texture.height]
+    assert sorted(map(tuple, texcoords.round(3))) == sorted([(x, y), (x + w, y), (x, y + h)])
+    assert len(merge_static(meshes)) == 1
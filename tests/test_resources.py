@@ -0,0 +1,63 @@
+import gc
+import numpy as np
+from ratcave import Mesh, resources
+from ratcave.texture import RenderBuffer
+
+
+def count(kind):
+    return resources.live_objects().get(kind, resources.ResourceStats(0, 0)).count
+
+
+def make_mesh(rng):
+    return Mesh(arrays=(rng.uniform(-1, 1, (30, 3)), rng.uniform(-1, 1, (30, 3))), mean_center=False)
+
+
+def test_release_deletes_gl_objects():
+    rng = np.random.RandomState(32)
+    gc.collect()
+    resources.delete_pending()
+    before = resources.live_objects()
+    mesh = make_mesh(rng)
+    mesh.geometry.upload()
+    assert count('Geometry') == before.get('Geometry', (0, 0))[0] + 1
+    assert count('VertexBuffer') == before.get('VertexBuffer', (0, 0))[0] + 2
+
+    mesh.release()
+    assert resources.live_objects() == before
+    mesh.geometry.upload()  # Drawing again uploads the arrays again.
+    assert count('Geometry') == before.get('Geometry', (0, 0))[0] + 1
+    mesh.release()
+
+
+def test_shared_geometry_is_not_released_by_one_mesh():
+    rng = np.random.RandomState(32)
+    mesh = make_mesh(rng)
+    mesh.geometry.upload()
+    mesh2 = mesh.copy()
+    mesh2.release()
+    assert mesh.geometry._loaded
+    mesh.release()
+
+
+def test_memory_stays_bounded_over_many_trials():
+    rng = np.random.RandomState(32)
+    gc.collect()
+    resources.delete_pending()
+    before = resources.live_objects()
+    for trial in range(10000):
+        if trial % 2:
+            with resources.ResourceScope():
+                mesh = make_mesh(rng)
+                mesh.geometry.upload()
+                RenderBuffer(64, 64)
+        else:
+            mesh = make_mesh(rng)
+            mesh.geometry.upload()
+            del mesh
+            gc.collect(0)
+            resources.delete_pending()
+        if trial % 1000 == 0:
+            assert len(resources.live_objects()) <= len(before) + 3
+    gc.collect()
+    resources.delete_pending()
+    assert resources.live_objects() == before
@@ -1,4 +1,5 @@
-from ratcave import Scene, Camera, Light
+from ratcave import Scene, Camera, Light, Mesh, Texture
+import numpy as np
 
 
 def test_scene_initializes():
@@ -14,3 +15,12 @@ def test_scene_initializes():
 
 
 
+
+
+def test_prewarm_uploads_pending_texture_updates():
+    tex = Texture(values=np.zeros((4, 4, 4), dtype=np.uint8), mipmap=True)
+    tex[1:3, 1:3] = 255
+    mesh = Mesh.from_incomplete_data(vertices=np.random.RandomState(43).rand(9, 3).astype(np.float32), textures=[tex])
+    assert tex._updates and tex._mipmaps_stale
+    Scene(meshes=[mesh]).prewarm()
+    assert not tex._updates and not tex._mipmaps_stale
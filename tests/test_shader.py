@@ -0,0 +1,412 @@
+from types import SimpleNamespace
+import mock
+import numpy as np
+import pytest
+from ratcave import Shader, UniformCollection, ProgramBinaryCache, Mesh, Scene
+from ratcave.shader import ActiveUniform, UniformBlock, std140_dtype, preprocess, compile_shaders, \
+    ShaderCompileError, ShaderLinkError, GL_COMPLETION_STATUS
+from ratcave.utils import gl
+
+uniform_types = {'model_matrix': gl.GL_FLOAT_MAT4, 'diffuse': gl.GL_FLOAT_VEC3, 'flat_shading': gl.GL_BOOL,
+                 'unused': gl.GL_FLOAT}
+
+
+@pytest.fixture
+def uniforms():
+    uniforms = UniformCollection()
+    uniforms['model_matrix'] = np.identity(4, dtype=np.float32)
+    uniforms['diffuse'] = 1., 0., 0.
+    uniforms['flat_shading'] = False
+    uniforms['unused'] = 2.
+    return uniforms
+
+
+def make_shader(gl_mock, names, types=uniform_types):
+    shader = Shader(vert='', frag='', lazy=True)
+    shader.is_linked = True
+    shader.active_uniforms = {name: ActiveUniform(location=loc, type=types[name], size=1)
+                              for loc, name in enumerate(names)}
+    return shader
+
+
+def mock_sendfuns(gl_mock):
+    """Replaces every glUniform function with gl_mock.glUniform."""
+    sendfuns = {gl_type: fun._replace(function=gl_mock.glUniform) for gl_type, fun in UniformCollection._sendfuns.items()}
+    return mock.patch.dict(UniformCollection._sendfuns, sendfuns)
+
+
+def test_send_without_bound_shader_raises_error(uniforms):
+    Shader.unbind()
+    with pytest.raises(UnboundLocalError):
+        uniforms.send()
+
+
+def test_send_makes_one_gl_call_per_active_uniform(uniforms):
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        with mock_sendfuns(gl_mock):
+            shadow = make_shader(gl_mock, ['model_matrix'])
+            default = make_shader(gl_mock, ['model_matrix', 'diffuse', 'flat_shading'])
+            for shader, n_active in [(shadow, 1), (default, 3), (shadow, 1), (default, 3)]:
+                for name in uniforms:
+                    uniforms[name].flat[0] += 1  # Unchanged values aren't sent again.
+                with shader:
+                    gl_mock.reset_mock()
+                    uniforms.send()
+                    calls = [call[0] for call in gl_mock.method_calls]
+                    assert len(calls) == n_active
+                    assert 'glGetIntegerv' not in calls and 'glGetUniformLocation' not in calls
+
+
+def test_unchanged_uniforms_are_not_resent(uniforms):
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        with mock_sendfuns(gl_mock):
+            shadow = make_shader(gl_mock, ['model_matrix'])
+            default = make_shader(gl_mock, ['model_matrix', 'diffuse', 'flat_shading'])
+            with default:
+                uniforms.send()
+                gl_mock.reset_mock()
+                uniforms.send()
+                assert not gl_mock.method_calls
+
+                uniforms['diffuse'][0] = .5  # writes through views are detected
+                model_matrix = uniforms['model_matrix']
+                model_matrix.base[0, 3] = 2.  # and so are writes to the arrays uniforms are views of
+                uniforms.send()
+                assert len(gl_mock.method_calls) == 2
+
+            with shadow:  # Each program keeps track of its own values.
+                gl_mock.reset_mock()
+                uniforms.send()
+                assert len(gl_mock.method_calls) == 1
+
+
+def test_std140_layout_aligns_vectors_and_matrices_to_16_bytes():
+    dtype = std140_dtype([('scale', 'float'), ('position', 'vec3'), ('matrix', 'mat4'), ('offset', 'vec2')])
+    assert [dtype.fields[name][1] for name in ['scale', 'position', 'matrix', 'offset']] == [0, 16, 32, 96]
+    assert dtype.itemsize == 112
+
+
+def test_uniform_block_is_sent_in_one_call_only_when_changed():
+    uniforms = UniformCollection(projection_matrix=np.arange(16, dtype=np.float32).reshape(4, 4),
+                                 camera_position=np.zeros(3, dtype=np.float32))
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        block = UniformBlock('CameraBlock', [('projection_matrix', 'mat4'), ('camera_position', 'vec3')])
+        block.send(uniforms)
+        assert gl_mock.glBufferSubData.call_count == 1
+        assert np.all(block.data['projection_matrix'] == uniforms['projection_matrix'].T)  # column-major, like GLSL
+
+        block.send(uniforms)
+        assert gl_mock.glBufferSubData.call_count == 1
+        assert gl_mock.glBindBufferBase.call_count == 2
+
+        uniforms['camera_position'][1] = 3.
+        block.send(uniforms)
+        assert gl_mock.glBufferSubData.call_count == 2
+        gl_mock.glBindBufferBase.assert_called_with(UniformBlock.target, UniformBlock.bindings['CameraBlock'],
+                                                    block.id)
+
+
+def test_linked_shaders_bind_their_blocks_to_the_blocks_binding_points():
+    def block_name(program, index, length, _, name_buffer):
+        name_buffer.value = [b'LightBlock', b'CameraBlock', b'OtherBlock'][index]
+
+    def program_iv(program, pname, value):
+        value._obj.value = 3 if pname == gl_mock.GL_ACTIVE_UNIFORM_BLOCKS else 12
+
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        gl_mock.glGetActiveUniformBlockName.side_effect = block_name
+        gl_mock.glGetProgramiv.side_effect = program_iv
+        shader = Shader(vert='', frag='', lazy=True)
+        shader._bind_uniform_blocks()
+        assert shader.uniform_blocks == {'LightBlock': 0, 'CameraBlock': 1, 'OtherBlock': 2}
+        gl_mock.glUniformBlockBinding.assert_has_calls([mock.call(shader.id, 0, UniformBlock.bindings['LightBlock']),
+                                                        mock.call(shader.id, 1, UniformBlock.bindings['CameraBlock'])])
+        assert gl_mock.glUniformBlockBinding.call_count == 2
+
+
+def test_uniforms_are_sent_with_the_function_of_their_type_in_one_call():
+    uniforms = UniformCollection()
+    uniforms['normal_matrix'] = np.arange(9, dtype=np.float32).reshape(3, 3)
+    uniforms['offsets'] = np.arange(15, dtype=np.float32).reshape(5, 3)
+    uniforms['level'] = 3
+    uniforms['spec_weight'] = 2  # ints are converted for float uniforms.
+    types = {'normal_matrix': gl.GL_FLOAT_MAT3, 'offsets': gl.GL_FLOAT_VEC3, 'level': gl.GL_UNSIGNED_INT,
+             'spec_weight': gl.GL_FLOAT}
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        shader = make_shader(gl_mock, list(types), types=types)
+        shader.active_uniforms['offsets'] = shader.active_uniforms['offsets']._replace(size=5)
+        functions = {gl.GL_FLOAT_MAT3: gl_mock.glUniformMatrix3fv, gl.GL_FLOAT_VEC3: gl_mock.glUniform3fv,
+                     gl.GL_UNSIGNED_INT: gl_mock.glUniform1uiv, gl.GL_FLOAT: gl_mock.glUniform1fv}
+        sendfuns = {gl_type: UniformCollection._sendfuns[gl_type]._replace(function=function)
+                    for gl_type, function in functions.items()}
+        with mock.patch.dict(UniformCollection._sendfuns, sendfuns), shader:
+            uniforms.send()
+
+        matrix_args = gl_mock.glUniformMatrix3fv.call_args[0]
+        assert matrix_args[1:3] == (1, True)
+        assert np.all(np.ctypeslib.as_array(matrix_args[3], (3, 3)) == uniforms['normal_matrix'])
+        vector_args = gl_mock.glUniform3fv.call_args[0]
+        assert vector_args[1] == 5
+        assert np.all(np.ctypeslib.as_array(vector_args[2], (5, 3)) == uniforms['offsets'])
+        assert gl_mock.glUniform1uiv.call_args[0][2].contents.value == 3
+        assert gl_mock.glUniform1fv.call_args[0][2].contents.value == 2.
+
+
+def test_uniforms_too_small_for_their_type_raise_error():
+    uniforms = UniformCollection()
+    uniforms['model_matrix'] = 1., 2., 3.
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        with mock_sendfuns(gl_mock), make_shader(gl_mock, ['model_matrix']) as shader:
+            with pytest.raises(ValueError) as error:
+                uniforms.send()
+            assert 'model_matrix' in str(error.value) and '(3,)' in str(error.value)
+            assert 'model_matrix' not in shader._sent_values  # So it's sent once it's fixed.
+            assert not gl_mock.glUniform.called
+
+            del uniforms['model_matrix']
+            uniforms['model_matrix'] = np.identity(4, dtype=np.float32)
+            uniforms.send()
+            assert gl_mock.glUniform.call_count == 1
+
+
+def test_uniform_shapes_are_checked_when_assigned():
+    uniforms = UniformCollection()
+    for value in [np.zeros((4, 5), dtype=np.float32), np.zeros((2, 2, 2, 2), dtype=np.float32), [], 'red']:
+        with pytest.raises((ValueError, TypeError)):
+            uniforms['bad'] = value
+    uniforms['good'] = np.zeros((10, 3, 3), dtype=np.float32)
+    assert 'bad' not in uniforms
+
+
+@pytest.fixture
+def binary_gl():
+    """Mocks the OpenGL functions used to save and load program binaries, with a driver that accepts them."""
+    with mock.patch('ratcave.shader.gl') as gl_mock, mock.patch('ratcave.shader_cache.gl', gl_mock):
+        gl_mock.accepts_binaries = True
+
+        def get_integer(*args):
+            args[-1]._obj.value = 1
+
+        def program_iv(program, pname, value):
+            if pname == gl_mock.GL_LINK_STATUS:
+                value._obj.value = int(gl_mock.accepts_binaries or not gl_mock.from_binary)
+            elif pname == gl_mock.GL_PROGRAM_BINARY_LENGTH:
+                value._obj.value = 4
+            else:
+                value._obj.value = 0
+
+        def program_binary(program, size, length, binary_format, buffer):
+            buffer.raw = b'prog'
+            binary_format._obj.value = 7
+
+        def link(program, *args):
+            gl_mock.from_binary = bool(args)
+
+        gl_mock.glLinkProgram.side_effect = link
+        gl_mock.glProgramBinary.side_effect = link
+        gl_mock.glGetIntegerv.side_effect = get_integer
+        gl_mock.glGetShaderiv.side_effect = get_integer
+        gl_mock.glGetProgramiv.side_effect = program_iv
+        gl_mock.glGetProgramBinary.side_effect = program_binary
+        gl_mock.glGetString.return_value = None
+        yield gl_mock
+
+
+def test_shaders_are_loaded_from_the_binary_cache_after_being_linked_once(binary_gl, tmpdir):
+    cache = ProgramBinaryCache(str(tmpdir))
+    with mock.patch.object(Shader, 'binary_cache', cache):
+        first = Shader(vert='void main() {}', frag='void main() {}', lazy=True)
+        first.load()
+        assert binary_gl.glCreateShader.call_count == 2
+        assert set(first.timings) == {'compile', 'link'}
+        assert len(tmpdir.listdir()) == 1
+
+        binary_gl.reset_mock()
+        second = Shader(vert='void main() {}', frag='void main() {}', lazy=True)
+        second.load()
+        assert second.is_linked
+        assert not binary_gl.glCreateShader.called
+        binary_gl.glProgramBinary.assert_called_once_with(second.id, 7, b'prog', 4)
+        assert set(second.timings) == {'cache_load'}
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        other = Shader(vert='void main() {}', frag='void main() { discard; }', lazy=True)
+        other.load()
+        assert 'compile' in other.timings
+
+
+def test_shaders_rejected_by_the_driver_are_compiled_instead(binary_gl, tmpdir):
+    cache = ProgramBinaryCache(str(tmpdir))
+    with mock.patch.object(Shader, 'binary_cache', cache):
+        Shader(vert='void main() {}', frag='void main() {}').load()
+        binary_gl.reset_mock()
+        binary_gl.accepts_binaries = False  # e.g. after a driver update
+
+        shader = Shader(vert='void main() {}', frag='void main() {}', lazy=True)
+        shader.load()
+        assert binary_gl.glProgramBinary.called
+        assert binary_gl.glCreateShader.call_count == 2
+        assert 'compile' in shader.timings
+        assert cache.misses == 2
+
+
+def test_preprocess_includes_files_and_adds_defines_after_the_header(tmpdir):
+    tmpdir.mkdir('lib').join('lighting.glsl').write('#include "constants.glsl"\nvec3 light();')
+    tmpdir.join('lib', 'constants.glsl').write('const float pi = 3.14159;')
+    source = '#version 120\n#extension GL_ARB_uniform_buffer_object : enable\n#include "lib/lighting.glsl"\nvoid main() {}'
+    lines = preprocess(source, defines={'HAS_TEXTUREMAP': 1}, include_dirs=[str(tmpdir)]).splitlines()
+    assert lines == ['#version 120', '#extension GL_ARB_uniform_buffer_object : enable',
+                     '#define HAS_TEXTUREMAP 1', '#line 3',
+                     'const float pi = 3.14159;', '#line 2', 'vec3 light();', '#line 4', 'void main() {}']
+
+    with pytest.raises(IOError):
+        preprocess('#include "missing.glsl"', include_dirs=[str(tmpdir)])
+    tmpdir.join('loop.glsl').write('#include "loop.glsl"')
+    with pytest.raises(ValueError):
+        preprocess('#include "loop.glsl"', include_dirs=[str(tmpdir)])
+
+
+def test_shader_variants_are_made_once_per_feature_set():
+    frag = '\n'.join(['#version 120', '#ifdef HAS_TEXTUREMAP', '#endif', '#if defined(FLAT_SHADING) || 1', '#endif'])
+    with mock.patch('ratcave.shader.gl'):
+        shader = Shader(vert='#version 120', frag=frag, lazy=True)
+        assert shader.features == {'HAS_TEXTUREMAP', 'FLAT_SHADING'}
+        assert shader.variant({'HAS_CUBEMAP'}) is shader
+
+        variant = shader.variant(['FLAT_SHADING', 'HAS_TEXTUREMAP', 'HAS_CUBEMAP'])
+        assert variant is not shader
+        assert '#define FLAT_SHADING 1' in variant.sources()[1] and '#define HAS_CUBEMAP 1' not in variant.sources()[1]
+        assert variant.variant({'HAS_TEXTUREMAP', 'FLAT_SHADING'}) is variant
+        assert variant.variant(()) is shader
+        assert not variant.is_linked  # Compiled when first bound.
+
+
+def test_mesh_shader_features_follow_its_textures_and_flat_shading():
+    vertices = np.random.RandomState(39).rand(9, 3).astype(np.float32)
+    mesh = Mesh.from_incomplete_data(vertices=vertices)
+    assert mesh.shader_features == set()
+    mesh.textures.append(SimpleNamespace(name='TextureMap'))
+    mesh.uniforms['flat_shading'] = True
+    assert mesh.shader_features == {'HAS_TEXTUREMAP', 'FLAT_SHADING'}
+
+    compact = Mesh.from_incomplete_data(vertices=vertices, formats=('float32', 'octahedral', 'float32'))
+    assert compact.shader_features == {'OCTAHEDRAL_NORMALS'}
+    assert 'octahedral_normals' not in compact.uniforms
+
+
+def test_variants_get_the_uniforms_shared_with_their_shader():
+    frag = '\n'.join(['#version 120', '#ifdef HAS_TEXTUREMAP', '#endif'])
+    camera_uniforms = UniformCollection()
+    camera_uniforms['projection_matrix'] = np.identity(4, dtype=np.float32)
+    mesh = Mesh.from_incomplete_data(vertices=np.random.RandomState(39).rand(9, 3).astype(np.float32))
+    mesh.textures.append(mock.Mock())
+    mesh.textures[0].name = 'TextureMap'
+    with mock.patch('ratcave.shader.gl') as gl_mock, mock_sendfuns(gl_mock):
+        shader = Shader(vert='#version 120', frag=frag, lazy=True)
+        variant = shader.variant(mesh.shader_features)
+        for program in [shader, variant]:
+            program.is_linked = True
+            program.active_uniforms = {'projection_matrix': ActiveUniform(location=0, type=gl.GL_FLOAT_MAT4, size=1)}
+
+        with shader, mock.patch.object(mesh.geometry, 'upload'), mock.patch.object(mesh, '_draw_geometry') as draw:
+            shader.share_uniforms(camera_uniforms)
+            assert gl_mock.glUniform.call_count == 1
+            mesh.draw()
+            assert Shader._bound is shader  # The variant is only bound while the Mesh is drawn.
+            assert draw.call_count == 1
+            assert 'projection_matrix' in variant._sent_values
+            assert gl_mock.glUniform.call_count == 2
+
+            mesh.draw()  # Already sent to the variant this frame.
+            assert gl_mock.glUniform.call_count == 2
+            camera_uniforms['projection_matrix'][0, 0] = 2.
+            shader.share_uniforms(camera_uniforms)
+            mesh.draw()
+            assert gl_mock.glUniform.call_count == 4
+
+
+@pytest.fixture
+def compiler_gl():
+    """Mocks OpenGL with a driver whose compile and link statuses are set by 'compiles' and 'links'."""
+    with mock.patch('ratcave.shader.gl') as gl_mock:
+        gl_mock.compiles, gl_mock.links, gl_mock.log = True, True, b''
+
+        def shader_iv(shader, pname, value):
+            value._obj.value = int(gl_mock.compiles) if pname == gl_mock.GL_COMPILE_STATUS else len(gl_mock.log) + 1
+
+        def program_iv(program, pname, value):
+            if pname == gl_mock.GL_LINK_STATUS:
+                value._obj.value = int(gl_mock.links)
+            elif pname == gl_mock.GL_INFO_LOG_LENGTH:
+                value._obj.value = len(gl_mock.log) + 1
+
+        def info_log(handle, length, _, buffer):
+            buffer.value = gl_mock.log
+
+        gl_mock.glGetShaderiv.side_effect = shader_iv
+        gl_mock.glGetProgramiv.side_effect = program_iv
+        gl_mock.glGetShaderInfoLog.side_effect = info_log
+        gl_mock.glGetProgramInfoLog.side_effect = info_log
+        yield gl_mock
+
+
+def test_compile_shaders_submits_every_program_before_waiting_for_any(compiler_gl):
+    shaders = [Shader(vert='void main() {}', frag='void main() {}', lazy=True) for _ in range(3)]
+    with mock.patch('ratcave.shader._parallel_compile_extension', return_value=None):
+        assert compile_shaders(shaders) == shaders
+        assert all(shader.is_ready for shader in shaders)
+    calls = [call[0] for call in compiler_gl.method_calls]
+    assert calls.count('glLinkProgram') == 3
+    assert 'glGetShaderiv' not in calls and 'glGetProgramiv' not in calls
+
+    with shaders[1]:
+        assert shaders[1].is_linked
+        assert not shaders[0].is_linked
+
+
+def test_is_ready_polls_the_completion_status_with_parallel_compile(compiler_gl):
+    shader = Shader(vert='void main() {}', frag='void main() {}', lazy=True)
+    with mock.patch('ratcave.shader._parallel_compile_extension', return_value='GL_KHR_parallel_shader_compile'):
+        assert not shader.is_ready
+        shader.submit()
+        assert not shader.is_ready  # The mocked driver never reports completion.
+        compiler_gl.glGetProgramiv.assert_called_with(shader.id, GL_COMPLETION_STATUS, mock.ANY)
+
+
+def test_compile_and_link_failures_raise_structured_errors(compiler_gl):
+    compiler_gl.compiles = False
+    compiler_gl.log = b'0(12) : error C1008: undefined variable "normal"\n0(14) : error C0000: syntax error'
+    shader = Shader(vert='void main() {}', frag='void main() { normal; }', lazy=True)
+    with pytest.raises(ShaderCompileError) as error:
+        shader.load()
+    assert error.value.errors == [(12, '0(12) : error C1008: undefined variable "normal"'),
+                                  (14, '0(14) : error C0000: syntax error')]
+    assert not shader.is_linked
+
+    compiler_gl.compiles, compiler_gl.links = True, False
+    compiler_gl.log = b'error: vertex shader lacks main'
+    with pytest.raises(ShaderLinkError) as error:
+        shader.load()
+    assert error.value.stage == 'link' and error.value.errors == [(None, 'error: vertex shader lacks main')]
+
+
+def test_drawing_after_prewarm_compiles_nothing(compiler_gl):
+    frag = '\n'.join(['#version 120', '#ifdef HAS_TEXTUREMAP', '#endif'])
+    shader = Shader(vert='#version 120', frag=frag, lazy=True)
+    vertices = np.random.RandomState(39).rand(9, 3).astype(np.float32)
+    plain, textured = Mesh.from_incomplete_data(vertices=vertices), Mesh.from_incomplete_data(vertices=vertices)
+    textured.textures.append(mock.Mock())
+    textured.textures[0].name = 'TextureMap'
+    scene = Scene(meshes=[plain, textured])
+    with mock.patch('ratcave.shader._parallel_compile_extension', return_value=None), \
+         mock.patch('ratcave.scene.gl'), mock.patch('ratcave.vertex.Geometry.upload'):
+        scene.prewarm(shader)
+        assert shader.variant(textured.shader_features).is_linked
+        assert [call[0] for call in compiler_gl.method_calls].count('glLinkProgram') == 2
+
+        compiler_gl.reset_mock()
+        with mock.patch('ratcave.mesh.Mesh._draw_geometry'), shader:
+            for mesh in scene.meshes:
+                mesh.draw()
+    calls = [call[0] for call in compiler_gl.method_calls]
+    assert 'glCompileShader' not in calls and 'glLinkProgram' not in calls
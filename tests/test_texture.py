@@ -1,6 +1,11 @@
-from ratcave import texture
+from ratcave import texture, atlas
+import mock
+import numpy as np
 import pytest
 import os
+import ctypes
+import threading
+import time
 
 if not 'APPVEYOR' in os.environ:
     @pytest.fixture
@@ -33,26 +38,317 @@ if not 'APPVEYOR' in os.environ:
 
     def test_texture_default_uniform_names(tex, cubetex, depthtex):
         assert 'TextureMap' in tex.uniforms
-        assert 'TextureMap_isBound' in tex.uniforms
         assert 'CubeMap' in cubetex.uniforms
-        assert 'CubeMap_isBound' in cubetex.uniforms
         assert 'DepthMap' in depthtex.uniforms
-        assert 'DepthMap_isBound' in depthtex.uniforms
         assert 'CubeMap' not in tex.uniforms
-        assert 'CubeMap_isBound' not in tex.uniforms
         assert 'TextureMap' not in cubetex.uniforms
+        assert list(tex.uniforms) == ['TextureMap']
 
         newtex = texture.Texture(name='NewMap')
         assert newtex.name == 'NewMap'
         assert 'NewMap' in newtex.uniforms
-        assert 'NewMap_isBound' in newtex.uniforms
         assert 'TextureMap' not in newtex.uniforms
 
         newtex.name = 'Changed'
         assert newtex.name == 'Changed'
         assert 'Changed' in newtex.uniforms
-        assert 'Changed_isBound' in newtex.uniforms
         assert 'NewMap' not in newtex.uniforms
-        assert 'NewMap_isBound' not in newtex.uniforms
 
 
+    def test_texture_values_can_be_non_square():
+        values = np.random.RandomState(0).randint(0, 255, size=(64, 200, 4)).astype(np.uint8)
+        tex = texture.Texture(values=values)
+        assert (tex.width, tex.height) == (200, 64)
+        assert np.all(tex.values == values)
+        assert not tex.values.flags.writeable
+        assert values.flags.writeable
+        values[:] = 0
+        assert tex.values.any()
+
+        with pytest.raises(ValueError):
+            tex.values = values.transpose(1, 0, 2)
+
+
+    def test_texture_values_are_uploaded_without_copying():
+        values = np.zeros((3, 5, 4), dtype=np.uint8)
+        tex = texture.Texture(width=5, height=3, bgra=True)
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            tex.values = values
+        gl_mock.glPixelStorei.assert_any_call(gl_mock.GL_UNPACK_ALIGNMENT, 4)
+        args = gl_mock.glTexSubImage2D.call_args[0]
+        assert args[2:7] == (0, 0, 5, 3, tex.pixel_fmt)
+        assert args[-1] == values.ctypes.data
+        assert tex.pixel_fmt == texture.gl.GL_BGRA
+
+
+    def test_texture_formats():
+        gray = texture.GrayscaleTexture(values=np.ones((3, 5), dtype=np.uint8))
+        assert gray.values.shape == (3, 5, 1)
+        assert gray.nbytes == 15
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            gray.values = np.ones((3, 5))
+        gl_mock.glPixelStorei.assert_any_call(gl_mock.GL_UNPACK_ALIGNMENT, 1)
+
+        for dtype, internal_fmt, pixel_type in [(np.float16, texture.gl.GL_RGBA16F, texture.gl.GL_HALF_FLOAT),
+                                                (np.float32, texture.gl.GL_RGBA32F, texture.gl.GL_FLOAT)]:
+            tex = texture.Texture(values=np.zeros((4, 8, 4), dtype=dtype))
+            assert tex.dtype == dtype
+            assert (tex.internal_fmt, tex.pixel_type) == (internal_fmt, pixel_type)
+            assert tex.nbytes == 4 * 8 * 4 * np.dtype(dtype).itemsize
+
+        assert texture.GrayscaleTexture(width=4, height=4, dtype=np.float32).internal_fmt == texture.gl.GL_R32F
+        assert texture.Texture(values=np.zeros((4, 4, 4), dtype=int)).dtype == np.uint8
+        with pytest.raises(ValueError):
+            texture.GrayscaleTexture(bgra=True)
+        with pytest.raises(ValueError):
+            texture.DepthTexture(dtype=np.float32)
+
+
+    @pytest.mark.benchmark
+    def test_texture_upload_throughput():
+        tex = texture.Texture(width=1024, height=1024)
+        values = np.random.RandomState(0).randint(0, 255, size=tex.shape).astype(np.uint8)
+        durations = []
+        for _ in range(5):
+            start = time.perf_counter()
+            tex.values = values
+            durations.append(time.perf_counter() - start)
+        print('Texture upload: {:.0f} MB/s'.format(values.nbytes / min(durations) / 1e6))
+
+
+    def test_merge_rectangles():
+        assert texture.merge_rectangles([]) == []
+        assert texture.merge_rectangles([(0, 0, 2, 2), (5, 5, 1, 1)]) == [(0, 0, 2, 2), (5, 5, 1, 1)]
+        assert texture.merge_rectangles([(0, 0, 2, 2), (1, 1, 2, 2)]) == [(0, 0, 3, 3)]
+        assert texture.merge_rectangles([(0, 0, 2, 2), (4, 0, 2, 2), (2, 0, 2, 1)]) == [(0, 0, 6, 2)]
+
+
+    def test_texture_slices_are_uploaded_merged_when_bound():
+        tex = texture.Texture(values=np.zeros((16, 32, 4), dtype=np.uint8), mipmap=True)
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            tex[2:4, 3:6] = 255
+            tex[3:5, 5:8] = np.full((2, 3, 4), 7)
+            tex[10, :] = (1, 2, 3, 4)
+            gl_mock.glTexSubImage2D.assert_not_called()
+            gl_mock.glGenerateMipmap.assert_not_called()
+
+            tex.bind()
+        calls = [call[0][2:6] for call in gl_mock.glTexSubImage2D.call_args_list]
+        assert sorted(calls) == [(0, 10, 32, 1), (3, 2, 5, 3)]
+        gl_mock.glPixelStorei.assert_any_call(gl_mock.GL_UNPACK_ROW_LENGTH, 32)
+        assert gl_mock.glGenerateMipmap.call_count == 1
+        tex.unbind()
+
+        expected = np.zeros((16, 32, 4), dtype=np.uint8)
+        expected[2:4, 3:6] = 255
+        expected[3:5, 5:8] = 7
+        expected[10] = (1, 2, 3, 4)
+        assert np.all(tex.values == expected)
+        assert np.all(tex[3:5, 5:8] == 7)
+        with pytest.raises(ValueError):
+            tex.update((30, 0, 4, 4), 0)
+        with pytest.raises(IndexError):
+            tex[::2, :] = 0
+
+
+    def test_texture_updates_without_values_are_uploaded_separately():
+        tex = texture.GrayscaleTexture(width=8, height=8, residency='evict')
+        tex.update((0, 0, 2, 2), np.ones((2, 2)))
+        tex.update((1, 1, 2, 2), np.zeros((2, 2)))
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            tex.bind()
+        calls = gl_mock.glTexSubImage2D.call_args_list
+        assert [call[0][2:6] for call in calls] == [(0, 0, 2, 2), (1, 1, 2, 2)]
+        tex.unbind()
+
+
+    def test_streaming_texture_uploads_newest_frame_from_pixel_buffer():
+        tex = texture.StreamingTexture(width=8, height=4, buffers=2)
+        frames = np.random.RandomState(0).randint(0, 255, size=(3, 4, 8, 4)).astype(np.uint8)
+        for frame in frames:
+            tex.write(frame)
+        assert tex.dropped_frames == 1
+        with pytest.raises(ValueError):
+            tex.write(frames[0][:2])
+
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            tex.bind()
+        assert tex.dropped_frames == 2
+        assert gl_mock.glTexSubImage2D.call_count == 1
+        assert gl_mock.glTexSubImage2D.call_args[0][-1] == 0  # An offset into the bound pixel buffer.
+        gl_mock.glBufferSubData.assert_called_once()
+        target, offset, nbytes, pointer = gl_mock.glBufferSubData.call_args[0]
+        assert ctypes.string_at(pointer, nbytes) == frames[-1].tobytes()
+
+        with mock.patch('ratcave.texture.gl') as gl_mock:
+            tex.bind()
+        gl_mock.glTexSubImage2D.assert_not_called()
+        tex.unbind()
+
+
+    def test_streaming_texture_writes_into_mapped_buffers():
+        memory = []
+
+        def map_buffer(target, offset, nbytes, access):
+            memory.append(ctypes.create_string_buffer(nbytes))
+            return ctypes.addressof(memory[-1])
+
+        with mock.patch.object(texture.gl, 'glMapBufferRange', side_effect=map_buffer):
+            tex = texture.StreamingTexture(width=4, height=2, buffers=2, mapped=True)
+            assert len(memory) == 2
+            frame = np.arange(32, dtype=np.uint8).reshape(tex.shape)
+            tex.write(frame)
+            assert memory[0].raw == frame.tobytes()
+            with mock.patch.object(texture.gl, 'glUnmapBuffer') as unmap:
+                tex.bind()
+            unmap.assert_called_once()
+            assert len(memory) == 3  # Mapped again, to be written to.
+            tex.unbind()
+
+
+    def test_streaming_texture_from_producer_thread():
+        tex = texture.StreamingTexture(width=16, height=16, buffers=3)
+        n_frames = 200
+
+        def produce():
+            for idx in range(n_frames):
+                tex.write(np.full(tex.shape, idx % 256))
+
+        producer = threading.Thread(target=produce)
+        with mock.patch.object(texture.gl, 'glTexSubImage2D') as upload:
+            producer.start()
+            while producer.is_alive():
+                tex.bind()
+            tex.bind()
+        producer.join()
+        tex.unbind()
+        assert upload.call_count + tex.dropped_frames == n_frames
+
+
+    @pytest.mark.benchmark
+    def test_streaming_texture_throughput():
+        tex = texture.StreamingTexture(width=1920, height=1080)
+        frame = np.random.RandomState(0).randint(0, 255, size=tex.shape).astype(np.uint8)
+        durations = []
+        for _ in range(30):
+            start = time.perf_counter()
+            tex.write(frame)
+            tex.bind()
+            durations.append(time.perf_counter() - start)
+        frames_per_second = 1. / min(durations)
+        tex.unbind()
+        print('Streaming 1080p: {:.0f} frames/s ({:.0f} MB/s)'.format(frames_per_second,
+                                                                     frames_per_second * frame.nbytes / 1e6))
+
+
+    @pytest.fixture
+    def units(monkeypatch):
+        """Three texture units (1 to 3), so they run out quickly."""
+        units = texture.TextureUnits()
+        units._max_units = 4
+        monkeypatch.setattr(texture, 'texture_units', units)
+        return units
+
+
+    def test_textures_are_assigned_units_when_bound(units):
+        textures = [texture.Texture(width=4, height=4) for _ in range(1000)]
+        for tex in textures:
+            with tex:
+                assert tex.slot in (1, 2, 3)
+                assert tex.uniforms[tex.name] == tex.slot
+        assert sorted(tex.slot for tex in textures[-3:]) == [1, 2, 3]
+        assert textures[0].slot is None
+
+
+    def test_resident_textures_are_not_bound_again(units):
+        tex, other = texture.Texture(width=4, height=4), texture.Texture(width=4, height=4)  # Bound when made.
+        hits = units.hits
+        with mock.patch.object(texture.Texture, 'bindfun') as bindfun:
+            for _ in range(5):
+                with tex, other:
+                    pass
+        bindfun.assert_not_called()
+        assert units.hits - hits == 10
+
+
+    def test_least_recently_used_unit_of_the_same_target_is_reassigned(units):
+        first, second = texture.Texture(width=4, height=4), texture.Texture(width=4, height=4)
+        cube = texture.TextureCube(width=4, height=4)
+        for tex in [first, second, cube]:
+            with tex:
+                pass
+        with first:  # Now 'second' is the least recently used 2D texture.
+            pass
+        new = texture.Texture(width=4, height=4)
+        with new:
+            assert new.slot == 2
+        assert second.slot is None
+        assert cube.slot == 3 and first.slot == 1
+
+        textures = [texture.Texture(width=4, height=4) for _ in range(4)]
+        with textures[0], textures[1], textures[2]:
+            with pytest.raises(MemoryError):
+                textures[3].bind()
+
+
+    def test_released_textures_free_their_unit(units):
+        tex = texture.Texture(width=4, height=4)
+        with tex:
+            unit = tex.slot
+        tex.release()
+        assert tex.slot is None
+        assert units.unit_of(tex) is None
+        assert unit not in units._units
+
+
+    def test_rectangles_are_packed_without_overlapping():
+        sizes = [tuple(size) for size in np.random.RandomState(3).randint(1, 40, size=(50, 2))]
+        (width, height), positions = atlas.pack_rectangles(sizes)
+        assert width & (width - 1) == 0
+        taken = np.zeros((height, width), dtype=int)
+        for (x, y), (w, h) in zip(positions, sizes):
+            taken[y:y + h, x:x + w] += 1
+        assert taken.max() == 1
+        assert taken.sum() == sum(w * h for w, h in sizes)
+
+
+    def test_atlas_texcoords_are_remapped_into_padded_regions():
+        images = {'red': np.full((8, 16, 4), 10, dtype=np.uint8), 'blue': np.full((4, 4, 4), 20, dtype=np.uint8)}
+        tex_atlas = atlas.TextureAtlas(images, padding=2, residency='keep')
+        values = tex_atlas.texture.values
+        for key, image in images.items():
+            x, y, w, h = tex_atlas.regions[key]
+            assert (values[y - 2:y + h + 2, x - 2:x + w + 2] == image[0, 0]).all()
+            corners = tex_atlas.remap_texcoords([[0, 0], [1, 1]], key) * [tex_atlas.texture.width, tex_atlas.texture.height]
+            assert np.allclose(corners, [[x, y], [x + w, y + h]])
+
+
+    def test_texture_array_layers_are_uploaded_separately():
+        values = np.random.RandomState(5).randint(0, 255, size=(3, 8, 4, 4)).astype(np.uint8)
+        with mock.patch.object(texture.gl, 'glTexImage3D') as teximage:
+            tex = texture.TextureArray(values=values, residency='keep')
+        assert tex.shape == (3, 8, 4, 4)
+        assert tex.nbytes == values.nbytes
+        assert teximage.call_args[0][3:6] == (4, 8, 3)
+
+        with mock.patch.object(texture.gl, 'glTexSubImage3D') as subimage:
+            tex[1] = values[0]
+        assert subimage.call_args[0][2:8] == (0, 0, 1, 4, 8, 1)
+        assert (tex.values[1] == values[0]).all()
+        with pytest.raises(ValueError):
+            tex[2] = values[0, :4]
+
+
+    def test_texture_array_rectangles_are_updated_within_a_layer():
+        values = np.zeros((2, 8, 4, 4), dtype=np.uint8)
+        tex = texture.TextureArray(values=values, residency='keep')
+        patch = np.full((3, 2, 4), 7, dtype=np.uint8)
+        with mock.patch.object(texture.gl, 'glTexSubImage3D') as subimage:
+            tex.update((1, 4, 2, 3), patch, layer=1)
+        assert subimage.call_args[0][2:8] == (1, 4, 1, 2, 3, 1)
+        assert (tex.values[1, 4:7, 1:3] == 7).all()
+        assert tex.values.sum() == patch.sum()
+        with pytest.raises(ValueError):
+            tex.update((3, 0, 2, 2), patch[:2], layer=0)
+        with pytest.raises(IndexError):
+            tex.update((0, 0, 2, 3), patch, layer=2)
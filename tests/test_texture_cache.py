@@ -0,0 +1,93 @@
+from ratcave import Texture, WavefrontReader
+from ratcave.texture_cache import TextureCache
+import numpy as np
+import os
+import pytest
+import shutil
+
+rng = np.random.RandomState(49)
+
+
+@pytest.fixture
+def images(tmpdir, monkeypatch):
+    """Three 8x8 image files, and their pixels.  Images are 'decoded' by looking up the file's contents."""
+    images, decoded = {}, {}
+    for name in ['floor', 'wall', 'ceiling']:
+        pixels = rng.randint(0, 256, size=(8, 8, 4)).astype(np.uint8)
+        filename = str(tmpdir.join(name + '.png'))
+        with open(filename, 'wb') as f:
+            f.write(pixels.tobytes())
+        images[filename], decoded[pixels.tobytes()] = pixels, pixels
+    monkeypatch.setattr(Texture, 'load_image', staticmethod(lambda filename, file=None: decoded[file.read()]))
+    return images
+
+
+def test_textures_are_shared(images):
+    cache = TextureCache()
+    filename = sorted(images)[0]
+    texture = cache.get(filename)
+    assert (texture.values == images[filename]).all()
+    assert cache.get(filename) is texture
+    assert cache.get(filename, mipmap=True) is not texture
+    assert (cache.hits, cache.misses, len(cache)) == (1, 2, 2)
+    assert cache.nbytes == 2 * texture.nbytes
+
+
+def test_prefetched_images_are_decoded_in_threads(images):
+    cache = TextureCache()
+    cache.prefetch(images)
+    assert len(cache._decoding) == 3
+    for filename, pixels in images.items():
+        assert (cache.get(filename).values == pixels).all()
+    assert not cache._decoding
+    cache.prefetch(images)  # Already cached.
+    assert not cache._decoding
+
+
+def test_changed_files_are_loaded_again(images):
+    cache = TextureCache()
+    filename = sorted(images)[0]
+    texture = cache.get(filename)
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(filename) is not texture
+
+
+def test_copies_are_shared_by_content(images, tmpdir):
+    filename = sorted(images)[0]
+    copy = str(tmpdir.join('copy.png'))
+    shutil.copy(filename, copy)
+    assert TextureCache().get(filename) is not TextureCache().get(copy)
+    cache = TextureCache(by_content=True)
+    assert cache.get(filename) is cache.get(copy)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_textures_are_evicted_over_budget(images):
+    floor, wall, ceiling = sorted(images)
+    cache = TextureCache(budget=2 * 8 * 8 * 4)
+    kept = cache.get(floor)
+    cache.get(wall)
+    cache.get(floor)
+    cache.get(ceiling)  # 'wall' is the least recently used.
+    assert cache.evictions == 1 and len(cache) == 2
+    assert cache.nbytes <= cache.budget
+
+    assert cache.get(floor) is kept
+    misses = cache.misses
+    cache.get(wall)
+    assert cache.misses == misses + 1  # Made again, since nothing used it anymore.
+    assert cache.get(floor) is kept  # Evicted in turn, but put back because it's still used here.
+
+
+def test_readers_share_textures(images, tmpdir):
+    obj_file = tmpdir.join('triangle.obj')
+    obj_file.write('o A\nv 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nvt 1 0\nvt 0 1\nvn 0 0 1\nf 1/1/1 2/2/1 3/3/1\n')
+    cache = TextureCache()
+    meshes = []
+    for _ in range(3):
+        reader = WavefrontReader(str(obj_file), cache=cache)
+        reader.bodies['A']['material'] = {'map_Kd': sorted(images)[0]}
+        meshes.append(reader.get_mesh('A'))
+    assert len(set(mesh.textures[0] for mesh in meshes)) == 1
+    assert (cache.hits, cache.misses) == (2, 1)
@@ -0,0 +1,74 @@
+from ratcave.vertex import octahedral_encode, octahedral_decode, encode_attribute, Geometry, DeviceBuffer, VertexBuffer
+import numpy as np
+import pytest
+
+rng = np.random.RandomState(100)
+
+
+def test_octahedral_normals_roundtrip():
+    normals = rng.normal(size=(500, 3))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    encoded = octahedral_encode(normals)
+    assert encoded.shape == (500, 2)
+    assert np.all(np.abs(encoded) <= 1.)
+    assert np.isclose(octahedral_decode(encoded), normals, atol=1e-5).all()
+
+
+def test_encoded_attributes_are_padded_to_four_bytes():
+    verts = rng.uniform(-1, 1, size=(10, 3))
+    encoded = encode_attribute(verts, 'snorm16')
+    assert encoded.dtype == np.int16
+    assert encoded.shape == (10, 4)
+    assert np.isclose(encoded[:, :3] / 32767., verts, atol=1e-4).all()
+    assert encode_attribute(verts[:, :2], 'unorm16').shape == (10, 2)
+    assert encode_attribute(verts, 'float32').shape == (10, 3)
+
+
+def test_normalized_attributes_are_clipped():
+    encoded = encode_attribute(np.array([[-2., .5, 2.]]), 'unorm8')
+    assert encoded[0, :3].tolist() == [0, 128, 255]
+
+
+def test_unknown_attribute_format_raises_error():
+    with pytest.raises(KeyError):
+        encode_attribute(np.zeros((3, 3)), 'float64')
+
+
+def test_evicted_arrays_are_read_back_when_accessed():
+    verts = rng.uniform(-1, 1, size=(30, 3)).astype(np.float32)
+    geometry = Geometry(arrays=(verts,), reindex=False, residency='evict')
+    geometry.upload()
+    assert isinstance(geometry.arrays[0], DeviceBuffer)
+    assert np.isclose(geometry.vertices, verts).all()
+
+    geometry.vertices[0] = 5.
+    geometry.upload()
+    assert geometry.arrays[0]._values() is None  # dropped again once nothing references it
+    assert np.isclose(geometry.vertices[0], 5.).all()
+    geometry.release()
+
+
+def test_evicted_arrays_can_be_assigned_through_index_arrays():
+    verts = rng.uniform(-1, 1, size=(30, 3)).astype(np.float32)
+    geometry = Geometry(arrays=(verts,), reindex=False, residency='evict')
+    geometry.upload()
+    buffer = geometry.arrays[0]
+    buffer[np.array([1, 3])] = 7.
+    buffer[:] = np.asarray(buffer)  # Whole-buffer assignment still skips reading back.
+    values = np.asarray(buffer)
+    assert np.isclose(values[[1, 3]], 7.).all()
+    assert np.isclose(np.delete(values, [1, 3], axis=0), np.delete(verts, [1, 3], axis=0)).all()
+    geometry.release()
+
+
+def test_memmapped_arrays_are_file_backed():
+    verts = rng.uniform(-1, 1, size=(30, 3)).astype(np.float32)
+    geometry = Geometry(arrays=(verts,), reindex=False, residency='memmap')
+    geometry.upload()
+    assert isinstance(geometry.arrays[0], VertexBuffer)
+    assert isinstance(geometry.arrays[0].base, np.memmap)
+    assert np.isclose(geometry.vertices, verts).all()
+    geometry.release()
+
+    with pytest.raises(ValueError):
+        Geometry(arrays=(verts,), residency='swap')